@@ -0,0 +1,236 @@
+"""
+Нагрузочный тест сбора данных: реальный конвейер main.py против симулятора устройств.
+
+Симулятор (device_simulator.py) запускается отдельным процессом, чтобы его
+нагрузка не попадала в замеры. Шлюз работает в этом процессе во временной
+папке (своя БД и configs.yaml). Каждая строка симулятора несет время отправки
+в поле Humidity. Основная задержка считается до фиксации транзакции, в которой
+строка записана в БД; задержка до разбора (показание доступно в /latest и /ws)
+выводится отдельно.
+
+Затраты на один порт считаются как наклон между прогонами с разным числом
+портов (Δитог / Δпортов): итог одного прогона включает интерпретатор и
+постоянные расходы. Каждый прогон выполняется в отдельном процессе, так как
+пик RSS процесса не уменьшается.
+
+Пример:
+    python benchmark_ingestion.py --ports 8 --rate 20 --duration 30
+    python benchmark_ingestion.py --ports 2 8 16 --rate 20 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+STAMP_FIELD = "Humidity"
+TEMPLATE_NAME = "indoor_sensor"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def slope(xs: Sequence[float], ys: Sequence[float]) -> float:
+    """Наклон прямой, проведенной методом наименьших квадратов"""
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    return (sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+            / sum((x - mean_x) ** 2 for x in xs))
+
+
+def start_simulator(ports: int, rate: float, boot_delay: float):
+    """Запускает симулятор и возвращает (процесс, список портов)"""
+    process = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "device_simulator.py"),
+         "--ports", str(ports), "--rate", str(rate),
+         "--boot-delay", str(boot_delay), "--stamp-field", STAMP_FIELD],
+        stdout=subprocess.PIPE, text=True, cwd=BASE_DIR
+    )
+    line = process.stdout.readline().split()
+    if not line or line[0] != "SIMULATOR_PORTS":
+        process.kill()
+        raise RuntimeError("Симулятор не сообщил список портов")
+    return process, line[1:]
+
+
+def create_data_manager(on_commit):
+    """DataManager, который сообщает о каждом зафиксированном пакете: on_commit(время, пакет)"""
+    from core.database.data_manager import DataManager
+
+    class CommitTimedDataManager(DataManager):
+        def _write_batch(self, template_name, sensors, attempt, requeue=True):
+            written = super()._write_batch(template_name, sensors, attempt, requeue)
+            if written:
+                on_commit(time.time(), sensors)
+            return written
+
+    return CommitTimedDataManager()
+
+
+async def run_pipeline(port_templates, duration: float, poll_interval: float, on_reading, on_commit):
+    """Запускает data_processing_loop на duration секунд"""
+    import main
+    from core.live.hub import reading_hub
+
+    reading_hub.add_sink(on_reading)
+    data_manager = create_data_manager(on_commit)
+    try:
+        await asyncio.wait_for(
+            main.data_processing_loop(port_templates, data_manager=data_manager,
+                                      poll_interval=poll_interval),
+            duration
+        )
+    except asyncio.TimeoutError:
+        # data_processing_loop при отмене дописывает буфер (data_manager.close)
+        pass
+
+
+def run_series(args):
+    """Запускает по прогону на каждое число портов и выводит затраты на порт (наклон)"""
+    results: List[Dict[str, float]] = []
+    for ports in args.ports:
+        report = Path(tempfile.mkstemp(prefix="ingestion_bench_", suffix=".json")[1])
+        command = [sys.executable, __file__, '--ports', str(ports),
+                   '--rate', str(args.rate), '--duration', str(args.duration),
+                   '--poll-interval', str(args.poll_interval), '--boot-delay', str(args.boot_delay),
+                   '--report', str(report)]
+        if args.workdir:
+            command += ['--workdir', str(Path(args.workdir) / f"ports_{ports}")]
+        subprocess.run(command, check=True)
+        results.append(json.loads(report.read_text()))
+        report.unlink()
+
+    counts = [r['ports'] for r in results]
+    print()
+    print("=" * 60)
+    print("Портов | показаний/с | CPU, % ядра | пик RSS, МБ")
+    for r in results:
+        print(f"{r['ports']:6d} | {r['readings_per_second']:11.1f} | {r['cpu_percent']:11.1f} | {r['rss_mb']:11.1f}")
+    print(f"На один порт (наклон по {len(results)} прогонам): "
+          f"CPU {slope(counts, [r['cpu_percent'] for r in results]):.2f}% ядра, "
+          f"память {slope(counts, [r['rss_mb'] for r in results]):.2f} МБ")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сбора данных")
+    parser.add_argument('--ports', type=int, nargs='+', default=[4],
+                        help='Число портов; несколько значений - серия прогонов с расчетом затрат на порт')
+    parser.add_argument('--rate', type=float, default=10.0, help='Строк в секунду на устройство')
+    parser.add_argument('--duration', type=float, default=20.0, help='Длительность замера, секунды')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Пауза цикла опроса, как в main.py')
+    parser.add_argument('--boot-delay', type=float, default=0.0)
+    parser.add_argument('--workdir', default=None,
+                        help='Папка для БД и configs.yaml (по умолчанию временная)')
+    parser.add_argument('--report', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if len(set(args.ports)) > 1:
+        run_series(args)
+        return
+    args.ports = args.ports[0]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingestion_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+
+    from config import settings  # noqa: F401 - порядок импортов как в main.py
+    import main as gateway
+
+    gateway.setup_databases()
+    simulator, ports = start_simulator(args.ports, args.rate, args.boot_delay)
+    port_templates = {port: TEMPLATE_NAME for port in ports}
+
+    latencies: List[float] = []
+    commit_latencies: List[float] = []
+    per_port = {port: 0 for port in ports}
+    first_reading_at = []
+
+    def on_reading(reading):
+        # Время отправки есть только у датчика 0x76
+        stamp = reading['values'].get(STAMP_FIELD.lower())
+        if stamp is None:
+            return
+        now = time.time()
+        if not first_reading_at:
+            first_reading_at.append(now)
+        latencies.append(now - stamp)
+        per_port[reading['port_name']] = per_port.get(reading['port_name'], 0) + 1
+
+    def on_commit(committed_at, sensors):
+        # Вызывается из потока записи DataManager
+        for sensor, rows in sensors.items():
+            if STAMP_FIELD.lower() not in sensor.columns:
+                continue
+            index = sensor.columns.index(STAMP_FIELD.lower())
+            commit_latencies.extend(committed_at - row[index] for row in rows if row[index] is not None)
+
+    cpu_start = time.process_time()
+    wall_start = time.time()
+    try:
+        asyncio.run(run_pipeline(port_templates, args.duration, args.poll_interval, on_reading, on_commit))
+    finally:
+        simulator.terminate()
+        simulator.wait(5)
+    wall = time.time() - wall_start
+    cpu = time.process_time() - cpu_start
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if sys.platform == "darwin":
+        rss_mb /= 1024  # На macOS ru_maxrss в байтах
+
+    measured = wall - (first_reading_at[0] - wall_start) if first_reading_at else wall
+    readings = len(latencies)
+    db_path = Path(workdir) / "databases" / "weather_station.db"
+    with sqlite3.connect(db_path) as conn:
+        rows_written = conn.execute("SELECT count(*) FROM indoor_sensor").fetchone()[0]
+
+    print()
+    print("=" * 60)
+    print(f"Портов: {args.ports}, частота: {args.rate} строк/с на порт, опрос каждые {args.poll_interval} с")
+    print(f"Папка замера: {workdir}")
+    print(f"Показаний: {readings} за {measured:.1f} с -> {readings / measured:.1f} показаний/с "
+          f"(ожидалось {args.ports * args.rate:.1f})")
+    print(f"Записано строк в БД (indoor_sensor): {rows_written}")
+    for title, values in (("записи в БД (commit)", commit_latencies), ("разбора", latencies)):
+        print(f"Задержка от отправки до {title}, мс ({len(values)} показаний): "
+              f"p50={percentile(values, 50) * 1000:.1f} "
+              f"p95={percentile(values, 95) * 1000:.1f} "
+              f"p99={percentile(values, 99) * 1000:.1f} "
+              f"max={max(values, default=float('nan')) * 1000:.1f}")
+    # Затраты на один порт по одному прогону не измерить: в итог входят интерпретатор
+    # и постоянные расходы. Их дает серия прогонов: --ports 2 8 16
+    print(f"CPU: {cpu / wall * 100:.1f}% ядра всего")
+    print(f"Память (пик RSS процесса): {rss_mb:.1f} МБ всего")
+    for port, count in per_port.items():
+        print(f"  {port}: {count} показаний")
+    print("=" * 60)
+
+    if args.report:
+        Path(args.report).write_text(json.dumps({
+            'ports': args.ports,
+            'readings_per_second': readings / measured,
+            'cpu_percent': cpu / wall * 100,
+            'rss_mb': rss_mb,
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,43 @@
 from sqlalchemy import insert, select
-from typing import Dict, Any, List, Optional
+from sqlalchemy.exc import OperationalError
+from typing import Dict, Any, List, Optional, Tuple
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
 
 from core.database.schemas import TemplateConfig
 from core.database.db_manager import DatabaseManager
-from core.utils.parsing import parse_sensor_data
+from core.database.db_configs import DatabaseConfigs
+from core.database.write_buffer import WriteBehindBuffer
+from core.utils.parsing import (parse_sensor_data, compile_template, CompiledTemplate, 
+                                CompiledSensor, BASE_COLUMNS)
+from core.live.latest_cache import LatestValueCache, latest_values
+from core.live.hub import ReadingHub, reading_hub
+from core.utils.metrics import (LINES_RECEIVED, PARSE_FAILURES, LAST_READING, QUEUE_DEPTH,
+                                FLUSH_DURATION, BATCH_ROWS, ROWS_WRITTEN, ROWS_LOST)
 
 class DataManager:
-    def __init__(self):
+    def __init__(self, batch_size: Optional[int] = None, 
+                 flush_interval: Optional[float] = None,
+                 latest_cache: Optional[LatestValueCache] = None,
+                 hub: Optional[ReadingHub] = None,
+                 max_retries: int = 5):
         self.db_manager = DatabaseManager()
+        self.latest_values = latest_cache or latest_values
+        self.hub = hub or reading_hub
+        self.write_buffer = WriteBehindBuffer(
+            batch_size or DatabaseConfigs.batch_size(),
+            flush_interval or DatabaseConfigs.flush_interval()
+        )
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        # Запись в БД идет в отдельном потоке: ожидание блокировки SQLite
+        # (например, пока обновляются агрегаты) не останавливает опрос портов и API
+        self.max_retries = max_retries
+        self._batches: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
     
     # async def insert_sensor_data(self, template_config: TemplateConfig, 
     #                            port_name: str, raw_data: str) -> bool:
@@ -71,68 +99,212 @@ class DataManager:
     #     except Exception as e:
     #         logging.error(f"Ошибка записи в БД: {e}")
     #         return False
+    def _get_compiled(self, template_config: TemplateConfig) -> CompiledTemplate:
+        """Возвращает скомпилированный шаблон, перекомпилируя его только при замене объекта шаблона"""
+        compiled = self._compiled.get(template_config.template_name)
+        if compiled is None or compiled.template is not template_config:
+            compiled = compile_template(template_config)
+            self._compiled[template_config.template_name] = compiled
+        return compiled
+
+    def get_frame_spec(self, template_config: TemplateConfig):
+        """Скомпилированное описание бинарного кадра шаблона"""
+        return self._get_compiled(template_config).frame
+
     def insert_sensor_data(self, template_config: TemplateConfig, 
                         port_name: str, raw_data: str) -> bool:
-        """Вставляет данные датчика в БД"""
+        """Разбирает строку датчика и ставит её в буфер отложенной записи"""
         try:
-            # Получаем движок для этого шаблона
-            engine = self.db_manager.get_engine(template_config.template_name)
-            if not engine:
-                logging.error(f"Движок для шаблона {template_config.template_name} не найден")
-                return False
-            
-            # Парсим данные
-            parsed_data = parse_sensor_data(raw_data, template_config)
-            if not parsed_data:
+            compiled = self._get_compiled(template_config)
+            LINES_RECEIVED.inc(port=port_name, template=compiled.template_name)
+            rows = compiled.parse_rows(raw_data, datetime.now(), port_name)
+            if not rows:
+                PARSE_FAILURES.inc(port=port_name, template=compiled.template_name)
                 logging.warning(f"Не удалось распарсить данные: {raw_data}")
                 return False
             
-            # Используем синхронное подключение
-            with engine.connect() as conn:
-                with conn.begin():
-                    for sensor_id, sensor_data in parsed_data.items():
-                        # Находим конфигурацию сенсора
-                        sensor_config = next(
-                            (s for s in template_config.sensors if s.sensor_id == sensor_id), 
-                            None
-                        )
-                        if not sensor_config:
-                            logging.warning(f"Неизвестный сенсор {sensor_id}")
-                            continue
-                        
-                        # Получаем таблицу через db_manager
-                        table = self.db_manager.get_table(sensor_config.table_name)
-                        logging.info(f"{sensor_config} \n\n\n {sensor_config.table_name}")
-                        # Подготавливаем данные для вставки
-                        insert_data = {
-                            'timestamp': datetime.now(),
-                            'sensor_id': sensor_id,
-                            # 'port_name': "COM5"
-                        }
-                        
-                        # Добавляем данные полей
-                        for field_config in sensor_config.fields:
-                            if field_config.source in sensor_data:
-                                insert_data[field_config.name] = sensor_data[field_config.source]
-                            else:
-                                insert_data[field_config.name] = None
-                        
-                        # Вставляем данные
-                        logging.info(f"Добавление данных в таблицу {sensor_config.table_name}")
-                        
-                        stmt = insert(table).values(**insert_data)
-                        conn.execute(stmt)
+            self._enqueue_rows(compiled, rows, port_name)
+            logging.debug(f"Данные с порта {port_name} поставлены в очередь записи")
+            return True
+            
+        except Exception as e:
+            # Трассировка попадает в ту же запись лога
+            logging.exception(f"Ошибка записи в БД: {e}")
+            return False
+
+    def insert_sensor_burst(self, template_config: TemplateConfig, port_name: str,
+                            burst: List[Tuple[datetime, str]]) -> bool:
+        """Разбирает пачку строк (время приема, строка) и ставит её в буфер одним пакетом"""
+        try:
+            compiled = self._get_compiled(template_config)
+            LINES_RECEIVED.inc(len(burst), port=port_name, template=compiled.template_name)
+            rows = []
+            for received_at, raw_data in burst:
+                line_rows = compiled.parse_rows(raw_data, received_at, port_name)
+                if not line_rows:
+                    PARSE_FAILURES.inc(port=port_name, template=compiled.template_name)
+                    logging.warning(f"Не удалось распарсить данные: {raw_data}")
+                rows.extend(line_rows)
+            if not rows:
+                return False
             
-            logging.debug(f"Данные с порта {port_name} успешно записаны в БД")
+            self._enqueue_rows(compiled, rows, port_name)
+            logging.debug(f"Строк с порта {port_name} поставлено в очередь записи: {len(burst)}")
             return True
             
         except Exception as e:
             logging.error(f"Ошибка записи в БД: {e}")
-            import traceback
-            logging.error(f"Трассировка: {traceback.format_exc()}")
             return False
 
-    
+    def insert_sensor_frames(self, template_config: TemplateConfig, port_name: str,
+                             frames: List[Tuple[datetime, bytes]]) -> bool:
+        """Разбирает бинарные кадры (время приема, нагрузка) и ставит их в буфер отложенной записи"""
+        try:
+            compiled = self._get_compiled(template_config)
+            LINES_RECEIVED.inc(len(frames), port=port_name, template=compiled.template_name)
+            rows = compiled.parse_frames(frames, port_name)
+            if not rows:
+                return False
+            
+            self._enqueue_rows(compiled, rows, port_name)
+            logging.debug(f"Кадров с порта {port_name} поставлено в очередь записи: {len(frames)}")
+            return True
+            
+        except Exception as e:
+            logging.error(f"Ошибка разбора кадров с порта {port_name}: {e}")
+            return False
+
+    def _enqueue_rows(self, compiled: CompiledTemplate, rows: List[tuple], port_name: str):
+        """Кладет разобранные строки в буфер записи, кэш последних значений и рассылку"""
+        # Время приема передается вместе с показанием: процесс API, прочитавший его
+        # из общего буфера позже (например, после перезапуска), не должен считать его свежим
+        received_at = time.time()
+        for sensor, row in rows:
+            self.write_buffer.add(sensor, row)
+            values = dict(zip(sensor.columns[len(BASE_COLUMNS):], row[len(BASE_COLUMNS):]))
+            self.latest_values.update(compiled.template_name, sensor.sensor_id,
+                                      values, row[0], port_name, received_at)
+            if self.hub.has_subscribers:
+                self.hub.publish({
+                    'template_name': compiled.template_name,
+                    'sensor_id': sensor.sensor_id,
+                    'port_name': port_name,
+                    'timestamp': row[0],
+                    'received_at': received_at,
+                    'values': values,
+                })
+        
+        LAST_READING.touch(port=port_name, template=compiled.template_name)
+        QUEUE_DEPTH.set(self.write_buffer.pending)
+        if self.write_buffer.is_due():
+            self.submit()
+
+    def submit(self) -> int:
+        """Передает накопленное потоку записи, не дожидаясь БД; возвращает число строк"""
+        batches = self.write_buffer.drain()
+        QUEUE_DEPTH.set(0)
+        if not batches:
+            return 0
+        
+        # Группируем датчики по шаблону, чтобы писать одной транзакцией на БД
+        by_template: Dict[str, Dict[CompiledSensor, List[tuple]]] = {}
+        for sensor, rows in batches.items():
+            by_template.setdefault(sensor.template_name, {})[sensor] = rows
+        for template_name, sensors in by_template.items():
+            self._batches.put((template_name, sensors, 0))
+        self._ensure_writer()
+        return sum(len(rows) for rows in batches.values())
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            item = self._batches.get()
+            if item is None:
+                return
+            self._write_batch(*item)
+
+    def _write_batch(self, template_name: str, sensors: Dict[CompiledSensor, List[tuple]],
+                     attempt: int, requeue: bool = True) -> int:
+        """
+        Пишет строки одного шаблона одной транзакцией. Временная ошибка SQLite
+        (БД заблокирована) возвращает пакет в очередь, пока не исчерпаны попытки
+        """
+        rows_count = sum(len(rows) for rows in sensors.values())
+        try:
+            engine = self.db_manager.get_engine(template_name)
+            if not engine:
+                ROWS_LOST.inc(rows_count, template=template_name)
+                logging.error(f"Движок для шаблона {template_name} не найден, "
+                              f"потеряно строк: {rows_count}")
+                return 0
+            
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                for sensor, rows in sensors.items():
+                    conn.exec_driver_sql(sensor.insert_sql, rows)
+            FLUSH_DURATION.observe(time.perf_counter() - started, template=template_name)
+            BATCH_ROWS.observe(rows_count, template=template_name)
+            ROWS_WRITTEN.inc(rows_count, template=template_name)
+            logging.debug(f"Записано строк в БД {template_name}: {rows_count}")
+            return rows_count
+        except OperationalError as e:
+            if requeue and attempt < self.max_retries:
+                delay = min(0.5 * 2 ** attempt, 5.0)
+                logging.warning(f"БД {template_name} недоступна для записи ({e}), "
+                                f"повтор через {delay:.1f} с, строк: {rows_count}")
+                time.sleep(delay)
+                self._batches.put((template_name, sensors, attempt + 1))
+                return 0
+            ROWS_LOST.inc(rows_count, template=template_name)
+            logging.error(f"Ошибка пакетной записи в БД {template_name}: {e}, "
+                          f"потеряно строк: {rows_count}")
+            return 0
+        except Exception as e:
+            ROWS_LOST.inc(rows_count, template=template_name)
+            logging.error(f"Ошибка пакетной записи в БД {template_name}: {e}, "
+                          f"потеряно строк: {rows_count}")
+            return 0
+
+    def flush(self) -> int:
+        """
+        Синхронно записывает буфер и пакеты, ожидающие потока записи.
+        Блокирует вызывающий поток, поэтому из цикла событий не вызывается
+        """
+        self.submit()
+        written = 0
+        while True:
+            try:
+                item = self._batches.get_nowait()
+            except queue.Empty:
+                return written
+            if item is not None:
+                template_name, sensors, attempt = item
+                written += self._write_batch(template_name, sensors, attempt, requeue=False)
+
+    def flush_if_due(self) -> int:
+        """Передает буфер потоку записи, если достигнут порог по размеру или времени"""
+        if self.write_buffer.is_due():
+            return self.submit()
+        return 0
+
+    def close(self):
+        """Дописывает всё накопленное перед остановкой"""
+        self.submit()
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            # Поток дописывает очередь до сигнала остановки
+            self._batches.put(None)
+            writer.join()
+        # Пакеты, вернувшиеся в очередь для повтора после сигнала остановки
+        written = self.flush()
+        if written:
+            logging.info(f"При остановке дописано строк в БД: {written}")
+
     async def get_last_sensor_data(self, template_config: TemplateConfig, 
                                  sensor_id: str, limit: int = 10) -> List[Dict]:
         """Получает последние данные сенсора"""
@@ -149,11 +321,14 @@ class DataManager:
                 return []
             
             with engine.connect() as conn:
-                table = self.db_manager.metadata.tables[sensor_config.table_name]
+                table = self.db_manager.get_table(template_config.template_name, 
+                                                  sensor_config.table_name)
+                if table is None:
+                    return []
                 stmt = select(table).order_by(table.c.timestamp.desc()).limit(limit)
                 result = conn.execute(stmt)
                 
-                return [dict(row) for row in result]
+                return [dict(row._mapping) for row in result]
                 
         except Exception as e:
             logging.error(f"Ошибка чтения из БД: {e}")
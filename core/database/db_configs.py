@@ -0,0 +1,30 @@
+from typing import Dict, Any
+
+from core.logger.logger import _Configs
+
+
+class DatabaseConfigs(_Configs):
+    _config_name = 'database'
+
+    @classmethod
+    def batch_size(cls) -> int:
+        return int(cls._option('batch_size'))
+
+    @classmethod
+    def flush_interval(cls) -> float:
+        return float(cls._option('flush_interval'))
+
+    @classmethod
+    def rollup_interval(cls) -> float:
+        return float(cls._option('rollup_interval'))
+
+    @classmethod
+    def startup_manifest(cls) -> str:
+        return str(cls._option('startup_manifest'))
+
+    @classmethod
+    def sqlite_profile(cls) -> Dict[str, Any]:
+        """Параметры PRAGMA для SQLite; не указанные в configs.yaml берутся по умолчанию"""
+        profile = dict(cls._default_configs[cls._config_name]['sqlite'])
+        profile.update(cls._option('sqlite') or {})
+        return profile
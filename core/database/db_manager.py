@@ -1,22 +1,60 @@
 from sqlalchemy import create_engine, Table, Column, MetaData, inspect
-from sqlalchemy import Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Integer, String, Float, DateTime, Boolean, Index, and_, or_, func, text
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Any, Tuple, Iterator
+import base64
+import calendar
+import json
+from datetime import datetime
 import logging
 import os
 from core.parser.template_manager import TemplateManager, TemplateConfig
+from core.database.engines import get_sqlite_engine
+from core.database.schema_registry import SchemaRegistry
+from core.database.rollup import find_rollups, ROLLUP_STATE_TABLE
+from core.database.schema_migrator import SchemaMigrator
 from starlette.responses import JSONResponse
 
 from sqlalchemy import create_engine, MetaData, Table, select, inspect
-from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, Integer, String, Float, DateTime
 
 
+
+# Служебные колонки таблиц датчиков (не являются измеряемыми полями)
+SERVICE_COLUMNS = ('id', 'timestamp', 'sensor_id', 'port_name')
+
+
+def timestamp_index_name(table_name: str) -> str:
+    """Имя индекса (timestamp, id) таблицы датчика"""
+    return f"ix_{table_name}_timestamp_id"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Кодирует позицию (timestamp, id) в токен следующей страницы"""
+    payload = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Декодирует токен страницы, ValueError при некорректном токене"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+# Реестр схем на процесс: одна БД отражается один раз для всех менеджеров
+schema_registry = SchemaRegistry()
+
+
 class DatabaseManager:
     def __init__(self, databases_dir: Path = Path("databases")):
         self.databases_dir = databases_dir
         self.databases_dir.mkdir(exist_ok=True)
-        self.metadata = MetaData()
+        # Схемы БД общие для всех экземпляров менеджера в процессе
+        self.schemas = schema_registry
+        self._indexed_tables = set()
         self.engines: Dict[str, any] = {}  # Храним движки для каждой БД
         self._load_existing_databases()
     
@@ -32,12 +70,10 @@ class DatabaseManager:
                 template_name = db_name  # Предполагаем, что имя файла = имя шаблона
                 
                 # Создаем движок для существующей БД
-                engine = create_engine(f"sqlite:///{db_file}")
+                engine = get_sqlite_engine(db_file)
                 self.engines[template_name] = engine
                 
-                # Отражаем метаданные из БД
-                self.metadata.reflect(bind=engine)
-                
+                # Схема отражается лениво, при первом обращении к таблице
                 logging.info(f"Загружена существующая БД: {template_name}")
                 
         except Exception as e:
@@ -47,17 +83,18 @@ class DatabaseManager:
         """Создает базу данных и таблицы по шаблону"""
         try:
             db_path = self.databases_dir / template_config.database.db_name
-            engine = create_engine(f"sqlite:///{db_path}")
-            
-            # Создаем таблицы для каждого датчика
-            for sensor_config in template_config.sensors:
-                self._create_sensor_table(sensor_config, template_config)
+            engine = get_sqlite_engine(db_path)
+            metadata = self.build_metadata(template_config)
             
-            # Создаем все таблицы
-            self.metadata.create_all(engine)
+            # Создаем все таблицы; индексы существующих таблиц create_all не трогает
+            metadata.create_all(engine)
+            for table in metadata.tables.values():
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
             
-            # Сохраняем движок
+            # Сохраняем движок и сбрасываем кэш схемы после миграции
             self.engines[template_config.template_name] = engine
+            self.schemas.refresh(template_config.template_name)
             
             logging.info(f"База данных {template_config.database.db_name} создана")
             return True
@@ -66,11 +103,31 @@ class DatabaseManager:
             logging.error(f"Ошибка создания БД: {e}")
             return False
     
+    def build_metadata(self, template_config: TemplateConfig) -> MetaData:
+        """Схема БД шаблона: таблицы датчиков в отдельном MetaData"""
+        metadata = MetaData()
+        for sensor_config in template_config.sensors:
+            self._create_sensor_table(sensor_config, template_config, metadata)
+        return metadata
+    
+    def migrate_database(self, template_config: TemplateConfig, changes: List[Dict]) -> bool:
+        """Применяет к существующим таблицам изменения схемы (новые колонки, смена типов)"""
+        try:
+            db_path = self.databases_dir / template_config.database.db_name
+            migrator = SchemaMigrator(get_sqlite_engine(db_path))
+            if not migrator.apply(changes, self.build_metadata(template_config)):
+                return False
+            self.schemas.refresh(template_config.template_name)
+            return True
+        except Exception as e:
+            logging.error(f"Ошибка миграции БД: {e}")
+            return False
+    
     def create_engine(self, template_config: TemplateConfig):
         """Создает и возвращает движок для базы данных"""
         try:
             db_path = self.databases_dir / template_config.database.db_name
-            engine = create_engine(f"sqlite:///{db_path}")
+            engine = get_sqlite_engine(db_path)
             self.engines[template_config.template_name] = engine
             return engine
         except Exception as e:
@@ -86,10 +143,8 @@ class DatabaseManager:
         db_path = self.databases_dir / f"{template_name}.db"
         if db_path.exists():
             try:
-                engine = create_engine(f"sqlite:///{db_path}")
+                engine = get_sqlite_engine(db_path)
                 self.engines[template_name] = engine
-                # Отражаем метаданные
-                self.metadata.reflect(bind=engine)
                 return engine
             except Exception as e:
                 logging.error(f"Ошибка загрузки движка для {template_name}: {e}")
@@ -102,7 +157,7 @@ class DatabaseManager:
         
         return None
     
-    def _create_sensor_table(self, sensor_config, template_config):
+    def _create_sensor_table(self, sensor_config, template_config, metadata: MetaData):
         """Создает таблицу для датчика"""
         columns = [
             Column('id', Integer, primary_key=True, autoincrement=True),
@@ -116,11 +171,12 @@ class DatabaseManager:
             column_type = self._get_column_type(field_config.db_type)
             columns.append(Column(field_config.name, column_type))
         
-        # Создаем таблицу
+        # Создаем таблицу с индексом для выборок по времени (keyset-пагинация)
         Table(
             sensor_config.table_name,
-            self.metadata,
-            *columns
+            metadata,
+            *columns,
+            Index(timestamp_index_name(sensor_config.table_name), 'timestamp', 'id')
         )
     
     def _get_column_type(self, db_type: str):
@@ -136,19 +192,15 @@ class DatabaseManager:
         }
         return type_mapping.get(db_type.upper(), String(255))
     
-    def get_table(self, table_name: str):
-        """Возвращает таблицу по имени"""
-        if table_name in self.metadata.tables:
-            return self.metadata.tables[table_name]
-        
-        # Если таблицы нет, пытаемся отразить её из БД
+    def get_table(self, template_name: str, table_name: str) -> Optional[Table]:
+        """Возвращает таблицу из БД шаблона (схема кэшируется до изменения schema_version)"""
         try:
-            for engine in self.engines.values():
-                self.metadata.reflect(bind=engine)
-                if table_name in self.metadata.tables:
-                    return self.metadata.tables[table_name]
+            engine = self.get_engine(template_name)
+            if not engine:
+                return None
+            return self.schemas.get_table(template_name, table_name, engine)
         except Exception as e:
-            logging.error(f"Ошибка отражения таблицы {table_name}: {e}")
+            logging.error(f"Ошибка отражения таблицы {table_name} ({template_name}): {e}")
         
         return None
 
@@ -299,6 +351,9 @@ class DatabaseManager:
         
     def get_all_table_data_orm(self, template_name: str, table_name: str):
         """Возвращает все данные из таблицы с использованием ORM"""
+        # ORM нужен только здесь - не загружаем его при старте
+        from sqlalchemy.orm import sessionmaker, declarative_base
+        
         try:
             engine = self.get_engine(template_name)
             if not engine:
@@ -341,4 +396,253 @@ class DatabaseManager:
                 
         except Exception as e:
             # logging.error(f"ORM ошибка: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def ensure_timestamp_index(self, template_name: str, table_name: str):
+        """Создает индекс (timestamp, id) для таблиц, созданных до его появления"""
+        key = (template_name, table_name)
+        if key in self._indexed_tables:
+            return
+        table = self.get_table(template_name, table_name)
+        if table is None:
+            return
+        index_name = timestamp_index_name(table_name)
+        if not any(index.name == index_name for index in table.indexes):
+            logging.info(f"Создание индекса {index_name} в БД {template_name}")
+            Index(index_name, table.c.timestamp, table.c.id).create(
+                self.get_engine(template_name), checkfirst=True
+            )
+        self._indexed_tables.add(key)
+
+    def _filter_conditions(self, table: Table, date_from: Optional[datetime],
+                           date_to: Optional[datetime], sensor_id: Optional[str]) -> List:
+        """Условия выборки по диапазону времени [date_from, date_to) и датчику"""
+        conditions = []
+        if date_from is not None:
+            conditions.append(table.c.timestamp >= date_from)
+        if date_to is not None:
+            conditions.append(table.c.timestamp < date_to)
+        if sensor_id is not None:
+            conditions.append(table.c.sensor_id == sensor_id)
+        return conditions
+
+    def get_table_data_page(self, template_name: str, table_name: str,
+                            date_from: Optional[datetime] = None,
+                            date_to: Optional[datetime] = None,
+                            sensor_id: Optional[str] = None,
+                            limit: int = 100,
+                            cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает страницу данных таблицы (новые записи первыми) с keyset-пагинацией
+        по (timestamp, id). None, если таблица не найдена
+        """
+        table = self.get_table(template_name, table_name)
+        if table is None:
+            return None
+        self.ensure_timestamp_index(template_name, table_name)
+        
+        conditions = self._filter_conditions(table, date_from, date_to, sensor_id)
+        if cursor:
+            cursor_timestamp, cursor_id = decode_cursor(cursor)
+            conditions.append(or_(
+                table.c.timestamp < cursor_timestamp,
+                and_(table.c.timestamp == cursor_timestamp, table.c.id < cursor_id)
+            ))
+        
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        stmt = (
+            select(table)
+            .where(*conditions)
+            .order_by(table.c.timestamp.desc(), table.c.id.desc())
+            .limit(limit + 1)
+        )
+        with self.get_engine(template_name).connect() as conn:
+            rows = conn.execute(stmt).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.timestamp, last.id)
+        
+        data = []
+        for row in rows:
+            row_dict = dict(row._mapping)
+            for key, value in row_dict.items():
+                if hasattr(value, 'isoformat'):
+                    row_dict[key] = value.isoformat()
+            data.append(row_dict)
+        
+        return {'data': data, 'next_cursor': next_cursor}
+
+    def iter_table_rows(self, template_name: str, table_name: str,
+                        date_from: Optional[datetime] = None,
+                        date_to: Optional[datetime] = None,
+                        sensor_id: Optional[str] = None,
+                        chunk_size: int = 1000) -> Iterator[List[Tuple]]:
+        """
+        Генератор пачек строк таблицы в порядке (timestamp, id).
+        Курсор потоковый, строки забираются через fetchmany - память не зависит от размера таблицы
+        """
+        table = self.get_table(template_name, table_name)
+        if table is None:
+            return
+        self.ensure_timestamp_index(template_name, table_name)
+        
+        stmt = (
+            select(table)
+            .where(*self._filter_conditions(table, date_from, date_to, sensor_id))
+            .order_by(table.c.timestamp, table.c.id)
+        )
+        with self.get_engine(template_name).connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(stmt)
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+    def aggregate_table_data(self, template_name: str, table_name: str,
+                             bucket_seconds: int,
+                             fields: Optional[List[str]] = None,
+                             date_from: Optional[datetime] = None,
+                             date_to: Optional[datetime] = None,
+                             sensor_id: Optional[str] = None,
+                             use_rollups: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """
+        Агрегирует данные по интервалам времени: min/max/avg/count на интервал.
+        Группировка выполняется в SQLite; если есть подходящая таблица агрегатов
+        (rollup), запрос идет к ней, а строки моложе последнего прохода RollupEngine
+        досчитываются по сырым данным в том же запросе.
+        None, если таблица не найдена
+        """
+        table = self.get_table(template_name, table_name)
+        if table is None:
+            return None
+        self.ensure_timestamp_index(template_name, table_name)
+        
+        value_columns = [c.name for c in table.columns if c.name not in SERVICE_COLUMNS]
+        fields = fields or value_columns
+        unknown = [field for field in fields if field not in value_columns]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        
+        # Начало интервала в секундах Unix; timestamp хранится строкой 'YYYY-MM-DD HH:MM:SS.ffffff'
+        epoch = func.cast(func.strftime('%s', table.c.timestamp), Integer)
+        bucket = (epoch // bucket_seconds * bucket_seconds).label('bucket')
+        
+        # Сумма и количество вместо avg - так же, как в ветке с агрегатами
+        aggregates = [func.count().label('count')]
+        for field in fields:
+            column = table.c[field]
+            aggregates += [
+                func.min(column).label(f"{field}__min"),
+                func.max(column).label(f"{field}__max"),
+                func.sum(column).label(f"{field}__sum"),
+                func.count(column).label(f"{field}__count"),
+            ]
+        
+        stmt = (
+            select(func.datetime(bucket, 'unixepoch').label('bucket'), *aggregates)
+            .where(table.c.timestamp.is_not(None),
+                   *self._filter_conditions(table, date_from, date_to, sensor_id))
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        with self.get_engine(template_name).connect() as conn:
+            rollup = None
+            if use_rollups:
+                rollup = self._pick_rollup(conn, table_name, bucket_seconds, fields, date_from, date_to)
+            if rollup:
+                rollup_stmt, params = self._rollup_aggregate_query(table_name, rollup, bucket_seconds, fields,
+                                                                   date_from, date_to, sensor_id)
+                logging.debug(f"Агрегаты {table_name} берутся из {rollup}")
+                rows = conn.execute(rollup_stmt, params).fetchall()
+            else:
+                rows = conn.execute(stmt).fetchall()
+        
+        result = []
+        for row in rows:
+            item = {'bucket': row.bucket, 'count': row.count}
+            for field in fields:
+                values_count = row._mapping[f"{field}__count"]
+                item[field] = {
+                    'min': row._mapping[f"{field}__min"],
+                    'max': row._mapping[f"{field}__max"],
+                    'avg': row._mapping[f"{field}__sum"] / values_count if values_count else None,
+                }
+            result.append(item)
+        return result
+
+    def _pick_rollup(self, conn, table_name: str, bucket_seconds: int, fields: List[str],
+                     date_from: Optional[datetime], date_to: Optional[datetime]) -> Optional[str]:
+        """Выбирает самую крупную таблицу агрегатов, интервал которой делит bucket и границы выборки"""
+        for rollup_table, interval in find_rollups(conn, table_name):
+            if bucket_seconds % interval:
+                continue
+            if any(bound is not None and (calendar.timegm(bound.timetuple()) % interval or bound.microsecond)
+                   for bound in (date_from, date_to)):
+                continue
+            columns = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{rollup_table}")')}
+            if all(f"{field}_sum" in columns for field in fields):
+                return rollup_table
+        return None
+
+    def _rollup_aggregate_query(self, table_name: str, rollup_table: str, bucket_seconds: int,
+                                fields: List[str], date_from: Optional[datetime],
+                                date_to: Optional[datetime], sensor_id: Optional[str]):
+        """
+        Запрос агрегатов поверх таблицы rollup (те же колонки результата, что и по сырым данным).
+        Строки с id больше last_id агрегата еще не учтены в нем - они добавляются из сырой
+        таблицы. Оба источника читаются одним запросом, то есть из одного снимка БД:
+        проход RollupEngine между ними не может учесть строку дважды или пропустить ее
+        """
+        rollup_selects = [
+            f"datetime(CAST(strftime('%s', bucket) AS INTEGER) / {bucket_seconds} * {bucket_seconds}, "
+            "'unixepoch') AS bucket",
+            'count',
+        ]
+        raw_selects = [
+            f"datetime(CAST(strftime('%s', timestamp) AS INTEGER) / {bucket_seconds} * {bucket_seconds}, "
+            "'unixepoch') AS bucket",
+            '1 AS count',
+        ]
+        selects = ['bucket', 'sum(count) AS count']
+        for field in fields:
+            rollup_selects += [f'"{field}_min"', f'"{field}_max"', f'"{field}_sum"', f'"{field}_count"']
+            raw_selects += [f'"{field}"', f'"{field}"', f'"{field}"', f'"{field}" IS NOT NULL']
+            selects += [
+                f'min("{field}_min") AS "{field}__min"',
+                f'max("{field}_max") AS "{field}__max"',
+                f'sum("{field}_sum") AS "{field}__sum"',
+                f'sum("{field}_count") AS "{field}__count"',
+            ]
+
+        rollup_conditions = ['1 = 1']
+        raw_conditions = [
+            'timestamp IS NOT NULL',
+            f'id > coalesce((SELECT last_id FROM "{ROLLUP_STATE_TABLE}" WHERE rollup_table = :rollup_table), 0)',
+        ]
+        params = {'rollup_table': rollup_table}
+        if date_from is not None:
+            rollup_conditions.append('bucket >= :date_from')
+            raw_conditions.append('timestamp >= :date_from')
+            params['date_from'] = date_from.strftime('%Y-%m-%d %H:%M:%S')
+        if date_to is not None:
+            rollup_conditions.append('bucket < :date_to')
+            raw_conditions.append('timestamp < :date_to')
+            params['date_to'] = date_to.strftime('%Y-%m-%d %H:%M:%S')
+        if sensor_id is not None:
+            rollup_conditions.append('sensor_id = :sensor_id')
+            raw_conditions.append('sensor_id = :sensor_id')
+            params['sensor_id'] = sensor_id
+        stmt = text(
+            f'SELECT {", ".join(selects)} FROM ('
+            f'SELECT {", ".join(rollup_selects)} FROM "{rollup_table}" '
+            f'WHERE {" AND ".join(rollup_conditions)} '
+            'UNION ALL '
+            f'SELECT {", ".join(raw_selects)} FROM "{table_name}" '
+            f'WHERE {" AND ".join(raw_conditions)}'
+            ') GROUP BY bucket ORDER BY bucket'
+        )
+        return stmt, params
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, Float, DateTime, Text
 from sqlalchemy.orm import declared_attr
-from config.settings import Base
+from config.db_factory import Base
 from core.parser.template_manager import TemplateConfig
 from datetime import datetime
 from typing import Dict, Type
@@ -1,7 +1,7 @@
 from typing import List
 from starlette import HTTPException
 
-from config.settings import DatabaseFactory
+from config.db_factory import DatabaseFactory
 from config.asgi import router
 
 from core.database.schemas import (TemplateCreate, 
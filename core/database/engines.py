@@ -0,0 +1,73 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from core.database.db_configs import DatabaseConfigs
+
+# Один движок на файл БД для всего процесса
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    """Применяет профиль производительности к каждому новому соединению SQLite"""
+    profile = DatabaseConfigs.sqlite_profile()
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in profile.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+
+def _engine_key(db_path: Path) -> str:
+    return str(Path(db_path).resolve())
+
+
+def get_sqlite_engine(db_path: Path, **kwargs) -> Engine:
+    """
+    Возвращает общий синхронный движок для файла БД с профилем SQLite.
+    Параметры kwargs учитываются только при первом создании движка
+    """
+    key = _engine_key(db_path)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(f"sqlite:///{db_path}", **kwargs)
+            event.listen(engine, "connect", _apply_sqlite_profile)
+            _engines[key] = engine
+            logging.debug(f"Создан движок SQLite для {db_path}")
+    return engine
+
+
+def get_async_sqlite_engine(db_path: Path, **kwargs):
+    """Возвращает общий асинхронный (aiosqlite) движок для файла БД с профилем SQLite"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    key = _engine_key(db_path)
+    with _lock:
+        engine = _async_engines.get(key)
+        if engine is None:
+            engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", **kwargs)
+            event.listen(engine.sync_engine, "connect", _apply_sqlite_profile)
+            _async_engines[key] = engine
+    return engine
+
+
+async def dispose_engines():
+    """Закрывает пулы соединений всех движков, синхронных и асинхронных, при остановке процесса"""
+    with _lock:
+        engines = list(_engines.values())
+        async_engines = list(_async_engines.values())
+        _engines.clear()
+        _async_engines.clear()
+    for engine in engines:
+        engine.dispose()
+    for engine in async_engines:
+        # Соединения aiosqlite закрываются только в цикле событий
+        await engine.dispose()
@@ -18,32 +18,55 @@ class MigrationManager:
         template_str = json.dumps(template_config.dict(), sort_keys=True)
         return hashlib.md5(template_str.encode()).hexdigest()
     
-    def get_last_migration_hash(self, template_name: str) -> Optional[str]:
-        """Получает последний хеш миграции для шаблона"""
+    def get_last_migration_file(self, template_name: str) -> Optional[Path]:
+        """Файл последней миграции шаблона"""
         migration_files = list(self.migrations_dir.glob(f"{template_name}_*.json"))
         if not migration_files:
             return None
         
         # Берем самую свежую миграцию
-        latest_migration = max(migration_files, key=lambda x: x.stat().st_mtime)
+        return max(migration_files, key=lambda x: x.stat().st_mtime)
+    
+    def get_last_migration(self, template_name: str) -> Optional[Dict]:
+        """Получает последнюю миграцию шаблона"""
+        latest_migration = self.get_last_migration_file(template_name)
+        if latest_migration is None:
+            return None
         
         try:
             with open(latest_migration, 'r', encoding='utf-8') as f:
-                migration_data = json.load(f)
-                return migration_data.get('template_hash')
+                return json.load(f)
         except:
             return None
     
+    def get_last_migration_hash(self, template_name: str) -> Optional[str]:
+        """Получает последний хеш миграции для шаблона"""
+        migration_data = self.get_last_migration(template_name)
+        return migration_data.get('template_hash') if migration_data else None
+    
+    def get_last_template(self, template_name: str) -> Optional[TemplateConfig]:
+        """Шаблон, сохраненный в последней миграции (в миграциях старого формата его нет)"""
+        migration_data = self.get_last_migration(template_name)
+        if not migration_data or not migration_data.get('template'):
+            return None
+        try:
+            return TemplateConfig(**migration_data['template'])
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать шаблон из миграции {template_name}: {e}")
+            return None
+    
     def create_migration(self, template_config: TemplateConfig, 
-                        changes: List[Dict], action: str) -> bool:
-        """Создает файл миграции"""
+                        changes: List[Dict], action: str) -> Optional[Path]:
+        """Создает файл миграции и возвращает путь к нему (None при ошибке)"""
         migration_data = {
             'timestamp': datetime.now().isoformat(),
             'template_name': template_config.template_name,
             'template_hash': self.calculate_template_hash(template_config),
             'action': action,
             'changes': changes,
-            'template_version': template_config.template_version
+            'template_version': template_config.template_version,
+            # Полный шаблон нужен для сравнения при следующем изменении
+            'template': template_config.dict()
         }
         
         migration_file = self.migrations_dir / f"{template_config.template_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -51,10 +74,10 @@ class MigrationManager:
         try:
             with open(migration_file, 'w', encoding='utf-8') as f:
                 json.dump(migration_data, f, indent=2, ensure_ascii=False)
-            return True
+            return migration_file
         except Exception as e:
             logging.error(f"Ошибка создания миграции: {e}")
-            return False
+            return None
     
     def check_template_changes(self, template_name: str) -> Dict:
         """Проверяет изменения в шаблоне"""
@@ -63,13 +86,15 @@ class MigrationManager:
             return {'has_changes': False, 'error': 'Template not found'}
         
         current_hash = self.calculate_template_hash(template)
-        last_hash = self.get_last_migration_hash(template_name)
+        # Файлы миграций называются по template_name из шаблона, а не по имени файла
+        last_hash = self.get_last_migration_hash(template.template_name)
         
         if last_hash is None:
             return {'has_changes': True, 'action': 'create', 'template': template}
         
         if current_hash != last_hash:
-            return {'has_changes': True, 'action': 'update', 'template': template}
+            return {'has_changes': True, 'action': 'update', 'template': template,
+                    'old_template': self.get_last_template(template.template_name)}
         
         return {'has_changes': False, 'template': template}
     
@@ -78,19 +103,83 @@ class MigrationManager:
         """Валидирует изменения шаблона"""
         changes = []
         
+        new_tables = self._table_fields(template)
+        
         if old_template is None:
-            # Новая таблица
-            changes.append({
-                'type': 'create_table',
-                'table_name': template.database.db_name,
-                'sensors_count': len(template.sensors)
-            })
-        else:
-            # TODO: Реализовать детект изменений
+            # Новая БД или миграция старого формата без шаблона:
+            # существующие таблицы сверяются со схемой при применении
+            for table_name in new_tables:
+                changes.append({'type': 'create_table', 'table_name': table_name})
+            return changes
+        
+        if old_template.database.db_name != template.database.db_name:
             changes.append({
-                'type': 'update_table',
-                'table_name': template.database.db_name,
-                'changes': 'Template updated'
+                'type': 'rename_database',
+                'old_name': old_template.database.db_name,
+                'new_name': template.database.db_name
             })
         
-        return changes
\ No newline at end of file
+        old_tables = self._table_fields(old_template)
+        renamed = self._find_renamed_tables(old_tables, new_tables)
+        for table_name, fields in new_tables.items():
+            if table_name in renamed:
+                changes.append({'type': 'rename_table', 'old_name': renamed[table_name],
+                                'table_name': table_name})
+                continue
+            old_fields = old_tables.get(table_name)
+            if old_fields is None:
+                changes.append({'type': 'create_table', 'table_name': table_name})
+                continue
+            for name, db_type in fields.items():
+                if name not in old_fields:
+                    changes.append({'type': 'add_column', 'table_name': table_name,
+                                    'column': name, 'db_type': db_type})
+                elif old_fields[name].upper() != db_type.upper():
+                    changes.append({'type': 'change_column_type', 'table_name': table_name,
+                                    'column': name, 'old_type': old_fields[name], 'new_type': db_type})
+            for name in old_fields:
+                if name not in fields:
+                    changes.append({'type': 'drop_column', 'table_name': table_name, 'column': name})
+        
+        renamed_from = set(renamed.values())
+        for table_name in old_tables:
+            if table_name not in new_tables and table_name not in renamed_from:
+                changes.append({'type': 'drop_table', 'table_name': table_name})
+        
+        if not changes:
+            # Изменены описание, разбор или хранение - схема БД прежняя
+            changes.append({'type': 'no_schema_changes', 'table_name': None})
+        
+        return changes
+    
+    @staticmethod
+    def _find_renamed_tables(old_tables: Dict[str, Dict[str, str]],
+                             new_tables: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+        """
+        Переименованные таблицы: новая таблица с теми же полями и типами,
+        что у исчезнувшей из шаблона. Возвращает new_name -> old_name
+        """
+        def signature(fields: Dict[str, str]):
+            return sorted((name, db_type.upper()) for name, db_type in fields.items())
+
+        dropped = [name for name in old_tables if name not in new_tables]
+        renamed = {}
+        for table_name, fields in new_tables.items():
+            if table_name in old_tables:
+                continue
+            for old_name in dropped:
+                if signature(old_tables[old_name]) == signature(fields):
+                    renamed[table_name] = old_name
+                    dropped.remove(old_name)
+                    break
+        return renamed
+
+    @staticmethod
+    def _table_fields(template: TemplateConfig) -> Dict[str, Dict[str, str]]:
+        """Поля шаблона по таблицам: table_name -> {field: db_type}"""
+        tables: Dict[str, Dict[str, str]] = {}
+        for sensor in template.sensors:
+            fields = tables.setdefault(sensor.table_name, {})
+            for field in sensor.fields:
+                fields.setdefault(field.name, field.db_type)
+        return tables
\ No newline at end of file
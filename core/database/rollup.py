@@ -0,0 +1,213 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from core.parser.template_manager import TemplateConfig
+from core.utils.parsing import parse_interval, format_interval, TIMESTAMP_FORMAT
+
+ROLLUP_STATE_TABLE = "_rollup_state"
+
+# Типы полей, для которых считаются агрегаты
+NUMERIC_TYPES = ('REAL', 'FLOAT', 'INTEGER')
+
+# Выражение начала интервала в секундах Unix для колонки timestamp
+BUCKET_EPOCH = "CAST(strftime('%s', timestamp) AS INTEGER) / {interval} * {interval}"
+
+
+def rollup_table_name(table_name: str, interval_seconds: int) -> str:
+    """Имя таблицы агрегатов, например indoor_sensor_rollup_1h"""
+    return f"{table_name}_rollup_{format_interval(interval_seconds)}"
+
+
+def rollup_fields(template: TemplateConfig) -> Dict[str, List[str]]:
+    """Числовые поля шаблона по таблицам: table_name -> [field, ...]"""
+    tables: Dict[str, List[str]] = {}
+    for sensor in template.sensors:
+        fields = tables.setdefault(sensor.table_name, [])
+        for field in sensor.fields:
+            if field.db_type.upper() in NUMERIC_TYPES and field.name not in fields:
+                fields.append(field.name)
+    return tables
+
+
+def find_rollups(conn, table_name: str) -> List[Tuple[str, int]]:
+    """Агрегаты таблицы (rollup_table, interval_seconds) от крупных к мелким"""
+    try:
+        rows = conn.execute(
+            text(f'SELECT rollup_table, interval_seconds FROM "{ROLLUP_STATE_TABLE}" '
+                 'WHERE source_table = :table ORDER BY interval_seconds DESC'),
+            {'table': table_name}
+        ).fetchall()
+    except OperationalError:
+        # Таблицы состояния еще нет - агрегаты не создавались
+        return []
+    return [(row.rollup_table, row.interval_seconds) for row in rows]
+
+
+class RollupEngine:
+    """
+    Инкрементально поддерживает таблицы агрегатов (count/min/max/sum по интервалам)
+    и удаляет сырые строки старше срока хранения из шаблона
+    """
+
+    def __init__(self, db_manager, batch_size: int = 50000, delete_batch_size: int = 5000):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.delete_batch_size = delete_batch_size
+        self._prepared: Set[Tuple[str, str]] = set()
+
+    def run_once(self, template: TemplateConfig) -> Dict[str, int]:
+        """Обновляет агрегаты и применяет срок хранения для одного шаблона"""
+        stats = {'rolled_up': 0, 'pruned': 0}
+        retention = template.retention
+        if not retention.rollups and not retention.raw_max_age:
+            return stats
+
+        engine = self.db_manager.get_engine(template.template_name)
+        if not engine:
+            return stats
+
+        intervals = sorted({parse_interval(value) for value in retention.rollups})
+        for table_name, fields in rollup_fields(template).items():
+            for interval in intervals:
+                stats['rolled_up'] += self._rollup(engine, template.template_name,
+                                                   table_name, fields, interval)
+            if retention.raw_max_age:
+                stats['pruned'] += self._prune(engine, table_name,
+                                               parse_interval(retention.raw_max_age))
+
+        if stats['rolled_up'] or stats['pruned']:
+            logging.info(f"Агрегаты {template.template_name}: обработано строк {stats['rolled_up']}, "
+                         f"удалено по сроку хранения {stats['pruned']}")
+        return stats
+
+    def _prepare(self, conn, template_name: str, table_name: str,
+                 fields: List[str], interval: int):
+        """Создает таблицу состояния и таблицу агрегатов, добавляет новые поля"""
+        rollup_table = rollup_table_name(table_name, interval)
+        key = (template_name, rollup_table)
+        if key in self._prepared:
+            return
+
+        conn.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS "{ROLLUP_STATE_TABLE}" ('
+            'rollup_table VARCHAR(100) PRIMARY KEY, '
+            'source_table VARCHAR(100) NOT NULL, '
+            'interval_seconds INTEGER NOT NULL, '
+            'last_id INTEGER NOT NULL DEFAULT 0)'
+        )
+        conn.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS "{rollup_table}" ('
+            'bucket DATETIME NOT NULL, '
+            "sensor_id VARCHAR(50) NOT NULL DEFAULT '', "
+            'count INTEGER NOT NULL, '
+            'UNIQUE (bucket, sensor_id))'
+        )
+        existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{rollup_table}")')}
+        for field in fields:
+            for suffix, column_type in (('min', 'FLOAT'), ('max', 'FLOAT'),
+                                        ('sum', 'FLOAT'), ('count', 'INTEGER')):
+                column = f"{field}_{suffix}"
+                if column not in existing:
+                    conn.exec_driver_sql(f'ALTER TABLE "{rollup_table}" ADD COLUMN "{column}" {column_type}')
+        conn.execute(
+            text(f'INSERT OR IGNORE INTO "{ROLLUP_STATE_TABLE}" '
+                 '(rollup_table, source_table, interval_seconds, last_id) '
+                 'VALUES (:rollup_table, :source_table, :interval, 0)'),
+            {'rollup_table': rollup_table, 'source_table': table_name, 'interval': interval}
+        )
+        self._prepared.add(key)
+
+    def _upsert_sql(self, table_name: str, rollup_table: str,
+                    fields: List[str], interval: int) -> str:
+        columns = ['bucket', 'sensor_id', 'count']
+        selects = [
+            f"datetime({BUCKET_EPOCH.format(interval=interval)}, 'unixepoch')",
+            "coalesce(sensor_id, '')",
+            "count(*)",
+        ]
+        updates = ['count = count + excluded.count']
+        for field in fields:
+            columns += [f'"{field}_min"', f'"{field}_max"', f'"{field}_sum"', f'"{field}_count"']
+            selects += [f'min("{field}")', f'max("{field}")', f'sum("{field}")', f'count("{field}")']
+            updates += [
+                f'"{field}_min" = coalesce(min("{field}_min", excluded."{field}_min"), '
+                f'"{field}_min", excluded."{field}_min")',
+                f'"{field}_max" = coalesce(max("{field}_max", excluded."{field}_max"), '
+                f'"{field}_max", excluded."{field}_max")',
+                f'"{field}_sum" = coalesce("{field}_sum", 0) + coalesce(excluded."{field}_sum", 0)',
+                f'"{field}_count" = coalesce("{field}_count", 0) + excluded."{field}_count"',
+            ]
+        return (
+            f'INSERT INTO "{rollup_table}" ({", ".join(columns)}) '
+            f'SELECT {", ".join(selects)} FROM "{table_name}" '
+            'WHERE id > :low AND id <= :high AND timestamp IS NOT NULL '
+            'GROUP BY 1, 2 '
+            f'ON CONFLICT (bucket, sensor_id) DO UPDATE SET {", ".join(updates)}'
+        )
+
+    def _rollup(self, engine, template_name: str, table_name: str,
+                fields: List[str], interval: int) -> int:
+        """Досчитывает агрегаты по строкам, добавленным после последнего запуска"""
+        rollup_table = rollup_table_name(table_name, interval)
+        processed = 0
+        try:
+            with engine.begin() as conn:
+                self._prepare(conn, template_name, table_name, fields, interval)
+                max_id = conn.exec_driver_sql(f'SELECT max(id) FROM "{table_name}"').scalar() or 0
+            upsert = text(self._upsert_sql(table_name, rollup_table, fields, interval))
+
+            # Пачками по batch_size строк, каждая в своей транзакции, чтобы не держать блокировку
+            while True:
+                with engine.begin() as conn:
+                    last_id = conn.execute(
+                        text(f'SELECT last_id FROM "{ROLLUP_STATE_TABLE}" WHERE rollup_table = :name'),
+                        {'name': rollup_table}
+                    ).scalar()
+                    if last_id >= max_id:
+                        break
+                    high = min(max_id, last_id + self.batch_size)
+                    conn.execute(upsert, {'low': last_id, 'high': high})
+                    conn.execute(
+                        text(f'UPDATE "{ROLLUP_STATE_TABLE}" SET last_id = :high WHERE rollup_table = :name'),
+                        {'high': high, 'name': rollup_table}
+                    )
+                processed += high - last_id
+        except Exception as e:
+            logging.error(f"Ошибка обновления агрегатов {rollup_table}: {e}")
+        return processed
+
+    def _prune(self, engine, table_name: str, max_age_seconds: int) -> int:
+        """Удаляет сырые строки старше срока хранения, уже учтенные во всех агрегатах"""
+        cutoff = (datetime.now() - timedelta(seconds=max_age_seconds)).strftime(TIMESTAMP_FORMAT)
+        deleted = 0
+        try:
+            with engine.connect() as conn:
+                rollups = find_rollups(conn, table_name)
+                watermark: Optional[int] = None
+                if rollups:
+                    watermark = conn.execute(
+                        text(f'SELECT min(last_id) FROM "{ROLLUP_STATE_TABLE}" WHERE source_table = :table'),
+                        {'table': table_name}
+                    ).scalar()
+
+            condition = 'timestamp < :cutoff'
+            if watermark is not None:
+                condition += ' AND id <= :watermark'
+            delete = text(
+                f'DELETE FROM "{table_name}" WHERE id IN '
+                f'(SELECT id FROM "{table_name}" WHERE {condition} LIMIT :limit)'
+            )
+            while True:
+                with engine.begin() as conn:
+                    result = conn.execute(delete, {'cutoff': cutoff, 'watermark': watermark,
+                                                   'limit': self.delete_batch_size})
+                deleted += result.rowcount
+                if result.rowcount < self.delete_batch_size:
+                    break
+        except Exception as e:
+            logging.error(f"Ошибка очистки таблицы {table_name} по сроку хранения: {e}")
+        return deleted
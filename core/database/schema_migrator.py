@@ -0,0 +1,196 @@
+import logging
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import Column, MetaData, Table, inspect, text
+from sqlalchemy.engine import Engine
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SchemaMigrator:
+    """
+    Применяет изменения схемы из MigrationManager.validate_changes к БД шаблона.
+
+    Переименованная таблица переименовывается в БД (ALTER TABLE RENAME TO),
+    строки и их id сохраняются.
+    Новые колонки добавляются через ALTER TABLE ADD COLUMN одной транзакцией
+    (в SQLite это меняет только схему, строки не переписываются).
+    Смена типа колонки требует пересборки таблицы: строки копируются в новую
+    таблицу пачками по batch_size, каждая пачка в своей транзакции, поэтому
+    запись в таблицу не блокируется на время копирования. Строки, добавленные
+    за это время, докопируются в той же транзакции, что и замена таблицы
+    """
+
+    def __init__(self, engine: Engine, batch_size: int = 50000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def _column_types(self, table_name: str) -> Dict[str, str]:
+        """Колонки таблицы в БД: имя -> тип SQL; пустой словарь, если таблицы нет"""
+        inspector = inspect(self.engine)
+        if not inspector.has_table(table_name):
+            return {}
+        return {column['name']: str(column['type']).upper() for column in inspector.get_columns(table_name)}
+
+    def _sql_type(self, column: Column) -> str:
+        return column.type.compile(dialect=self.engine.dialect).upper()
+
+    def apply(self, changes: List[Dict], metadata: MetaData) -> bool:
+        """
+        Приводит таблицы БД к схеме metadata по списку изменений.
+        Повторный запуск безопасен: уже примененные изменения пропускаются
+        """
+        additions: List[Column] = []
+        rebuilds: Set[str] = set()
+        renames: List[Tuple[str, Table]] = []
+
+        for change in changes:
+            change_type = change['type']
+            table_name = change.get('table_name')
+            table = metadata.tables.get(table_name)
+
+            if change_type == 'create_table' and table is not None:
+                # Таблица могла существовать до появления миграций - сверяем ее с шаблоном
+                additions_count = len(additions)
+                self._plan_reconcile(table, additions, rebuilds)
+                if len(additions) > additions_count or table_name in rebuilds:
+                    logging.info(f"Таблица {table_name} уже существует, схема будет приведена к шаблону")
+            elif change_type == 'add_column' and table is not None:
+                live = self._column_types(table_name)
+                if live and change['column'] not in live:
+                    additions.append(table.c[change['column']])
+            elif change_type == 'change_column_type' and table is not None:
+                live = self._column_types(table_name)
+                column = table.c[change['column']]
+                if live.get(column.name) not in (None, self._sql_type(column)):
+                    rebuilds.add(table_name)
+            elif change_type == 'rename_table' and table is not None:
+                renames.append((change['old_name'], table))
+            elif change_type in ('drop_column', 'drop_table'):
+                # Данные не удаляются автоматически: колонка или таблица остаются в БД
+                target = f"{table_name}.{change['column']}" if change_type == 'drop_column' else table_name
+                logging.warning(f"{target} удалено из шаблона, данные сохранены в БД")
+            elif change_type == 'rename_database':
+                logging.warning(f"БД шаблона переименована: {change['old_name']} -> {change['new_name']}, "
+                                f"данные старой БД не переносятся")
+
+        try:
+            # Переименования - первыми: остальные изменения ссылаются на новые имена
+            for old_name, table in renames:
+                self.rename_table(old_name, table)
+            # Таблицы, которые будут пересобраны, получат новые колонки при пересборке
+            additions = [column for column in additions if column.table.name not in rebuilds]
+            if additions:
+                self.add_columns(additions)
+            for table_name in sorted(rebuilds):
+                self.rebuild_table(metadata.tables[table_name])
+            return True
+        except Exception as e:
+            logging.error(f"Ошибка применения миграции: {e}")
+            return False
+
+    def _plan_reconcile(self, table: Table, additions: List[Column], rebuilds: Set[str]):
+        """Сравнивает существующую таблицу со схемой шаблона"""
+        live = self._column_types(table.name)
+        if not live:
+            return
+        for column in table.columns:
+            if column.name not in live:
+                additions.append(column)
+            elif live[column.name] != self._sql_type(column):
+                rebuilds.add(table.name)
+
+    def rename_table(self, old_name: str, table: Table):
+        """
+        Переименовывает таблицу. Пустая таблица с новым именем (создана до миграции)
+        заменяется; если в ней уже есть строки, переименование пропускается.
+        Индексы со старыми именами заменяются индексами схемы
+        """
+        inspector = inspect(self.engine)
+        if not inspector.has_table(old_name):
+            return
+        old_indexes = [index['name'] for index in inspector.get_indexes(old_name)]
+
+        with self.engine.begin() as conn:
+            if inspector.has_table(table.name):
+                if conn.execute(text(f"SELECT 1 FROM {_quote(table.name)} LIMIT 1")).first():
+                    logging.warning(f"Таблица {old_name} не переименована: в {table.name} уже есть данные")
+                    return
+                conn.execute(text(f"DROP TABLE {_quote(table.name)}"))
+            conn.execute(text(f"ALTER TABLE {_quote(old_name)} RENAME TO {_quote(table.name)}"))
+            # Индексы переезжают вместе с таблицей, но со старыми именами
+            schema_indexes = {index.name for index in table.indexes}
+            for index_name in old_indexes:
+                if index_name not in schema_indexes:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {_quote(index_name)}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        logging.info(f"Таблица {old_name} переименована в {table.name}")
+
+    def add_columns(self, columns: List[Column]):
+        """Добавляет колонки одной транзакцией"""
+        with self.engine.begin() as conn:
+            for column in columns:
+                conn.execute(text(
+                    f"ALTER TABLE {_quote(column.table.name)} "
+                    f"ADD COLUMN {_quote(column.name)} {self._sql_type(column)}"
+                ))
+                logging.info(f"Добавлена колонка {column.table.name}.{column.name} ({self._sql_type(column)})")
+
+    def rebuild_table(self, table: Table):
+        """
+        Пересобирает таблицу по схеме table с копированием строк пачками.
+        Колонки, которых нет в схеме, сохраняются со своим типом
+        """
+        live_table = Table(table.name, MetaData(), autoload_with=self.engine)
+        temp_name = f"{table.name}__rebuild"
+
+        # Индексы не копируются: их имена заняты старой таблицей, они создаются после замены
+        columns = [Column(column.name, column.type, primary_key=column.primary_key,
+                          autoincrement=column.autoincrement) for column in table.columns]
+        retained = [Column(column.name, column.type) for column in live_table.columns
+                    if column.name not in table.c]
+        temp_table = Table(temp_name, MetaData(), *columns, *retained)
+        copied = [name for name in temp_table.c.keys() if name in live_table.c]
+        column_list = ", ".join(_quote(name) for name in copied)
+        copy_sql = text(
+            f"INSERT INTO {_quote(temp_name)} ({column_list}) "
+            f"SELECT {column_list} FROM {_quote(table.name)} WHERE id > :low AND id <= :high"
+        )
+
+        # Остатки прерванной пересборки
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_quote(temp_name)}"))
+        temp_table.create(self.engine)
+
+        with self.engine.connect() as conn:
+            max_id = conn.execute(text(f"SELECT max(id) FROM {_quote(table.name)}")).scalar() or 0
+        logging.info(f"Пересборка таблицы {table.name}: строки до id {max_id} копируются пачками по {self.batch_size}")
+
+        low = 0
+        while low < max_id:
+            high = low + self.batch_size
+            with self.engine.begin() as conn:
+                conn.execute(copy_sql, {'low': low, 'high': high})
+            low = high
+
+        self._swap_table(table, temp_name, column_list)
+        logging.info(f"Таблица {table.name} пересобрана")
+
+    def _swap_table(self, table: Table, temp_name: str, column_list: str):
+        """Докопирует строки, записанные во время копирования, и заменяет таблицу одной транзакцией"""
+        with self.engine.begin() as conn:
+            # Граница - последний скопированный id, а не граница пачки: строки,
+            # вставленные после последней пачки, могут иметь id меньше нее
+            conn.execute(text(
+                f"INSERT INTO {_quote(temp_name)} ({column_list}) "
+                f"SELECT {column_list} FROM {_quote(table.name)} "
+                f"WHERE id > (SELECT coalesce(max(id), 0) FROM {_quote(temp_name)})"
+            ))
+            conn.execute(text(f"DROP TABLE {_quote(table.name)}"))
+            conn.execute(text(f"ALTER TABLE {_quote(temp_name)} RENAME TO {_quote(table.name)}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
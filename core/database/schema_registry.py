@@ -0,0 +1,60 @@
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import MetaData, Table
+
+
+class SchemaRegistry:
+    """
+    Реестр схем: отдельный MetaData на каждую БД шаблона.
+    Схема БД отражается при первом обращении, объекты Table кэшируются по (шаблон, таблица).
+    Кэш сверяется с PRAGMA schema_version при каждом обращении: схему может изменить
+    другой процесс (миграции и новые таблицы делает процесс сбора данных)
+    """
+
+    def __init__(self):
+        self._metadata: Dict[str, MetaData] = {}
+        self._tables: Dict[Tuple[str, str], Table] = {}
+        # Шаблон -> (адрес БД, schema_version) на момент отражения
+        self._versions: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _schema_version(engine) -> Tuple[str, int]:
+        with engine.connect() as conn:
+            return str(engine.url), conn.exec_driver_sql("PRAGMA schema_version").scalar()
+
+    def get_table(self, template_name: str, table_name: str, engine) -> Optional[Table]:
+        """Возвращает таблицу БД шаблона; схема отражается заново, если она изменилась"""
+        key = (template_name, table_name)
+        version = self._schema_version(engine)
+
+        with self._lock:
+            if self._versions.get(template_name) != version:
+                if template_name in self._versions:
+                    logging.info(f"Схема БД {template_name} изменилась, кэш схемы обновлен")
+                self._drop(template_name)
+                metadata = MetaData()
+                metadata.reflect(bind=engine)
+                self._metadata[template_name] = metadata
+                self._versions[template_name] = version
+                logging.debug(f"Схема БД {template_name} отражена: {list(metadata.tables)}")
+
+            table = self._tables.get(key)
+            if table is None:
+                table = self._metadata[template_name].tables.get(table_name)
+                if table is not None:
+                    self._tables[key] = table
+        return table
+
+    def _drop(self, template_name: str):
+        self._metadata.pop(template_name, None)
+        self._versions.pop(template_name, None)
+        for key in [key for key in self._tables if key[0] == template_name]:
+            del self._tables[key]
+
+    def refresh(self, template_name: str):
+        """Сбрасывает кэш схемы БД шаблона (после миграции)"""
+        with self._lock:
+            self._drop(template_name)
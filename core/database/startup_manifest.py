@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+def db_fingerprint(db_path: Path) -> Optional[int]:
+    """
+    Отпечаток схемы БД - PRAGMA schema_version (меняется при любом изменении схемы).
+    None, если файла БД нет
+    """
+    if not db_path.exists():
+        return None
+    try:
+        # Без SQLAlchemy: при неизменной схеме движок на старте не нужен
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return conn.execute("PRAGMA schema_version").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+class StartupManifest:
+    """
+    Состояние шаблонов и БД после последней успешной настройки:
+    сигнатура файла шаблона (mtime_ns, размер), хеш, версия шаблона,
+    последняя миграция и отпечаток схемы БД. Если все совпадает,
+    шаблон на старте не читается, не хешируется и миграции не ищутся
+    """
+
+    def __init__(self, path: str, databases_dir: Path = Path("databases"),
+                 migrations_dir: Path = Path("migrations")):
+        self.path = Path(path)
+        self.databases_dir = databases_dir
+        self.migrations_dir = migrations_dir
+        self._entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f).get('templates', {})
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception as e:
+            logging.warning(f"Манифест запуска {self.path} не прочитан: {e}")
+            self._entries = {}
+
+    def is_unchanged(self, template_name: str, file_signature: Optional[Tuple[int, int]]) -> bool:
+        """Совпадают ли файл шаблона, миграция и схема БД с записанными в манифесте"""
+        entry = self._entries.get(template_name)
+        if entry is None or file_signature is None:
+            return False
+        if tuple(entry['file_signature']) != tuple(file_signature):
+            return False
+        if not (self.migrations_dir / entry['migration']).exists():
+            return False
+        fingerprint = db_fingerprint(self.databases_dir / entry['db_name'])
+        return fingerprint is not None and fingerprint == entry['schema_version']
+
+    def record(self, template_name: str, file_signature: Tuple[int, int], template_hash: str,
+               template_version: str, db_name: str, migration: str):
+        """Запоминает состояние шаблона после успешной настройки БД"""
+        self._entries[template_name] = {
+            'file_signature': list(file_signature),
+            'template_hash': template_hash,
+            'template_version': template_version,
+            'migration': migration,
+            'db_name': db_name,
+            'schema_version': db_fingerprint(self.databases_dir / db_name),
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._dirty = True
+
+    def save(self):
+        """Атомарно записывает манифест, если он изменился"""
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'templates': self._entries}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            logging.error(f"Ошибка сохранения манифеста запуска {self.path}: {e}")
@@ -0,0 +1,40 @@
+import time
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи: копит разобранные строки по ключу назначения
+    (например, скомпилированному датчику) и сообщает, когда их пора сбросить в БД (по количеству строк или по времени)
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows: Dict[Hashable, List[tuple]] = defaultdict(list)
+        self._oldest_row_at: Optional[float] = None
+        self.pending = 0
+
+    def add(self, key: Hashable, row: tuple):
+        """Добавляет строку в буфер назначения key"""
+        if self._oldest_row_at is None:
+            self._oldest_row_at = time.monotonic()
+        self._rows[key].append(row)
+        self.pending += 1
+
+    def is_due(self) -> bool:
+        """Пора ли сбрасывать буфер"""
+        if not self.pending:
+            return False
+        if self.pending >= self.batch_size:
+            return True
+        return time.monotonic() - self._oldest_row_at >= self.flush_interval
+
+    def drain(self) -> Dict[Hashable, List[tuple]]:
+        """Забирает всё накопленное и очищает буфер"""
+        rows = self._rows
+        self._rows = defaultdict(list)
+        self._oldest_row_at = None
+        self.pending = 0
+        return rows
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class Subscription:
+    """
+    Подписка клиента на показания: ограниченная очередь,
+    при переполнении отбрасываются самые старые показания
+    """
+
+    def __init__(self, template_name: Optional[str] = None,
+                 sensor_id: Optional[str] = None, maxsize: int = 100):
+        self.template_name = template_name
+        self.sensor_id = sensor_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = 0
+
+    def matches(self, reading: Dict[str, Any]) -> bool:
+        if self.template_name is not None and reading['template_name'] != self.template_name:
+            return False
+        if self.sensor_id is not None and reading['sensor_id'] != self.sensor_id:
+            return False
+        return True
+
+    def put(self, reading: Dict[str, Any]):
+        """Кладет показание в очередь, вытесняя самое старое при переполнении"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(reading)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Следующее показание или None, если за timeout ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ReadingHub:
+    """
+    Рассылка разобранных показаний подписчикам (WebSocket/SSE).
+    Наполняется циклом сбора данных, медленный клиент не тормозит остальных
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscriptions: Set[Subscription] = set()
+        self._sinks: List[Callable[[Dict[str, Any]], Any]] = []
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions or self._sinks)
+
+    def add_sink(self, sink: Callable[[Dict[str, Any]], Any]):
+        """Добавляет синхронного получателя всех показаний (например, общий кольцевой буфер)"""
+        self._sinks.append(sink)
+
+    def subscribe(self, template_name: Optional[str] = None,
+                  sensor_id: Optional[str] = None) -> Subscription:
+        """Создает подписку; вызывается из цикла событий клиента"""
+        subscription = Subscription(template_name, sensor_id, self.queue_size)
+        self._subscriptions.add(subscription)
+        logging.debug(f"Новый подписчик на показания (шаблон: {template_name}, "
+                      f"датчик: {sensor_id}), всего: {len(self._subscriptions)}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+        if subscription.dropped:
+            logging.info(f"Подписчик отключен, отброшено показаний из-за переполнения: "
+                         f"{subscription.dropped}")
+
+    def publish(self, reading: Dict[str, Any]):
+        """Передает показание всем подходящим подписчикам"""
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+
+        for sink in self._sinks:
+            try:
+                sink(reading)
+            except Exception as e:
+                logging.error(f"Ошибка передачи показания получателю: {e}")
+
+        for subscription in list(self._subscriptions):
+            if not subscription.matches(reading):
+                continue
+            if subscription.loop is current_loop:
+                subscription.put(reading)
+            elif not subscription.loop.is_closed():
+                # Публикация из другого потока: очередь asyncio не потокобезопасна
+                subscription.loop.call_soon_threadsafe(subscription.put, reading)
+
+
+# Общий для цикла сбора данных и API, запущенных в одном процессе
+reading_hub = ReadingHub()
@@ -0,0 +1,55 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LatestValueCache:
+    """
+    Последние известные значения по (шаблон, sensor_id).
+    Заполняется циклом сбора данных и отдается API без обращения к SQLite
+    """
+
+    def __init__(self, stale_after: float = 10.0):
+        self.stale_after = stale_after
+        self._values: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def update(self, template_name: str, sensor_id: str, values: Dict[str, Any],
+               timestamp: str, port_name: Optional[str] = None,
+               received_at: Optional[float] = None):
+        """
+        Запоминает новое показание датчика. received_at - время приема показания
+        процессом сбора данных (секунды Unix), по нему считается устаревание
+        """
+        self._values[(template_name, sensor_id)] = {
+            'template_name': template_name,
+            'sensor_id': sensor_id,
+            'port_name': port_name,
+            'timestamp': timestamp,
+            'values': values,
+            'received_at': time.time() if received_at is None else received_at,
+        }
+
+    def snapshot(self, template_name: Optional[str] = None,
+                 sensor_id: Optional[str] = None,
+                 stale_after: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Возвращает последние показания с возрастом и признаком устаревания"""
+        stale_after = self.stale_after if stale_after is None else stale_after
+        now = time.time()
+        result = []
+        for (entry_template, entry_sensor), entry in list(self._values.items()):
+            if template_name is not None and entry_template != template_name:
+                continue
+            if sensor_id is not None and entry_sensor != sensor_id:
+                continue
+            age = now - entry['received_at']
+            item = {key: value for key, value in entry.items() if key != 'received_at'}
+            item['age'] = round(age, 3)
+            item['stale'] = age > stale_after
+            result.append(item)
+        return result
+
+    def clear(self):
+        self._values.clear()
+
+
+# Кэш процесса: общий для цикла сбора данных и API, запущенных в одном процессе
+latest_values = LatestValueCache()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import struct
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+# Заголовок: номер последней записи, вместимость, размер слота
+HEADER = struct.Struct('<QII')
+# Слот: номер записи (0 - запись в процессе), длина данных
+SLOT_HEADER = struct.Struct('<QI')
+
+
+class SharedRingBuffer:
+    """
+    Кольцевой буфер показаний в общей памяти: один процесс пишет, любые читают.
+    Каждый слот помечен номером записи; читатель сверяет номер до и после
+    копирования данных и пропускает слоты, перезаписанные во время чтения
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        _, self.capacity, self.slot_size = HEADER.unpack_from(shm.buf, 0)
+        self.payload_size = self.slot_size - SLOT_HEADER.size
+
+    @classmethod
+    def create(cls, capacity: int = 4096, slot_size: int = 1024,
+               name: Optional[str] = None) -> 'SharedRingBuffer':
+        """Создает буфер; создатель отвечает за его удаление (unlink)"""
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=HEADER.size + capacity * slot_size)
+        HEADER.pack_into(shm.buf, 0, 0, capacity, slot_size)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedRingBuffer':
+        """Подключается к буферу, созданному другим процессом"""
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def head(self) -> int:
+        """Номер последней записи"""
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def _slot_offset(self, sequence: int) -> int:
+        return HEADER.size + (sequence % self.capacity) * self.slot_size
+
+    def write(self, reading: Dict[str, Any]) -> bool:
+        """Записывает показание; слишком большое показание пропускается"""
+        payload = json.dumps(reading, ensure_ascii=False, default=str).encode('utf-8')
+        if len(payload) > self.payload_size:
+            return False
+
+        sequence = self.head + 1
+        offset = self._slot_offset(sequence)
+        buf = self.shm.buf
+        SLOT_HEADER.pack_into(buf, offset, 0, len(payload))
+        start = offset + SLOT_HEADER.size
+        buf[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(buf, offset, sequence, len(payload))
+        HEADER.pack_into(buf, 0, sequence, self.capacity, self.slot_size)
+        return True
+
+    def read_since(self, last_sequence: int) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        Читает записи после last_sequence.
+        Возвращает (показания, новый last_sequence, число потерянных записей)
+        """
+        head = self.head
+        if head <= last_sequence:
+            return [], last_sequence, 0
+
+        # Записи старше вместимости уже перезаписаны
+        first = max(last_sequence + 1, head - self.capacity + 1)
+        lost = first - last_sequence - 1
+        readings = []
+        buf = self.shm.buf
+        for sequence in range(first, head + 1):
+            offset = self._slot_offset(sequence)
+            slot_sequence, length = SLOT_HEADER.unpack_from(buf, offset)
+            if slot_sequence != sequence or length > self.payload_size:
+                lost += 1
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = bytes(buf[start:start + length])
+            if SLOT_HEADER.unpack_from(buf, offset)[0] != sequence:
+                # Слот перезаписан, пока мы его читали
+                lost += 1
+                continue
+            readings.append(json.loads(payload))
+        return readings, head, lost
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+async def follow_ring(ring: SharedRingBuffer, latest_cache, hub, interval: float = 0.05):
+    """
+    Переносит показания из общего буфера в кэш последних значений и рассылку процесса.
+    При старте прогревает кэш всем содержимым буфера
+    """
+    last_sequence = max(0, ring.head - ring.capacity)
+    while True:
+        readings, last_sequence, lost = ring.read_since(last_sequence)
+        if lost:
+            logging.warning(f"Пропущено показаний из общего буфера: {lost}")
+        for reading in readings:
+            latest_cache.update(reading['template_name'], reading['sensor_id'],
+                                reading['values'], reading['timestamp'], reading.get('port_name'),
+                                reading.get('received_at'))
+            if hub.has_subscribers:
+                hub.publish(reading)
+        await asyncio.sleep(interval)
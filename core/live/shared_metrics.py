@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional
+
+# Общая память со снимком метрик процесса сбора данных
+METRICS_SHM_NAME = "gateway_metrics"
+
+# Заголовок: номер снимка (нечетный - запись в процессе), длина данных
+HEADER = struct.Struct('<QI')
+
+# Запущен ли resource_tracker этим процессом, а не унаследован при fork от создателя области
+_own_tracker: Optional[bool] = None
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Подключается к чужой области. Собственный resource_tracker процесса удалил бы
+    ее при выходе, поэтому область снимается с его учета. Трекер, унаследованный
+    при fork от создателя, не трогаем: область снимет с учета unlink создателя
+    """
+    global _own_tracker
+    if _own_tracker is None and os.name == 'posix':
+        # Проверяем до первого подключения: оно само запускает трекер
+        _own_tracker = getattr(resource_tracker._resource_tracker, '_fd', None) is None
+    shm = shared_memory.SharedMemory(name=name)
+    if _own_tracker:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedMetricsSnapshot:
+    """
+    Снимок реестра метрик в общей памяти: процесс сбора данных периодически
+    публикует registry.dump(), процессы API объединяют его со своими метриками.
+    Читатель сверяет номер снимка до и после копирования и повторяет чтение,
+    если снимок перезаписан во время чтения
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False):
+        self.shm = shm
+        self.owner = owner
+        self.payload_size = shm.size - HEADER.size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def create(cls, name: str = METRICS_SHM_NAME, size: int = 1024 * 1024) -> 'SharedMetricsSnapshot':
+        """Создает область; создатель отвечает за ее удаление (unlink)"""
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Осталась от аварийно завершенного процесса - пересоздаем
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str = METRICS_SHM_NAME) -> 'SharedMetricsSnapshot':
+        """Подключается к области, созданной другим процессом"""
+        return cls(_attach_untracked(name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def publish(self, registry) -> bool:
+        """Записывает снимок реестра; слишком большой снимок пропускается"""
+        payload = json.dumps({'published_at': time.time(), 'metrics': registry.dump()},
+                             ensure_ascii=False).encode('utf-8')
+        if len(payload) > self.payload_size:
+            logging.warning(f"Снимок метрик {len(payload)} байт не помещается в общую память")
+            return False
+
+        buf = self.shm.buf
+        sequence = HEADER.unpack_from(buf, 0)[0]
+        HEADER.pack_into(buf, 0, sequence + 1, len(payload))
+        buf[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(buf, 0, sequence + 2, len(payload))
+        return True
+
+    def read(self, max_age: float = 10.0, attempts: int = 3) -> Optional[Dict[str, List[list]]]:
+        """
+        Последний снимок метрик или None, если его нет или он старше max_age секунд
+        (процесс сбора данных остановлен)
+        """
+        buf = self.shm.buf
+        for _ in range(attempts):
+            sequence, length = HEADER.unpack_from(buf, 0)
+            if sequence == 0:
+                return None
+            if sequence % 2 or length > self.payload_size:
+                time.sleep(0.001)
+                continue
+            payload = bytes(buf[HEADER.size:HEADER.size + length])
+            if HEADER.unpack_from(buf, 0)[0] != sequence:
+                continue
+            snapshot = json.loads(payload)
+            if time.time() - snapshot['published_at'] > max_age:
+                return None
+            return snapshot['metrics']
+        return None
+
+    def start_publishing(self, registry, interval: float = 1.0):
+        """Публикует снимок реестра из фонового потока каждые interval секунд"""
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.publish(registry)
+                except Exception as e:
+                    logging.error(f"Ошибка публикации метрик: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="metrics-publisher", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(5)
+            self._thread = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedMetricsReader:
+    """
+    Читатель снимка для /metrics. Подключается при первом запросе и
+    переподключается, если снимок устарел: процесс сбора данных мог быть
+    перезапущен и создать область заново
+    """
+
+    def __init__(self, name: str = METRICS_SHM_NAME, max_age: float = 10.0):
+        self.name = name
+        self.max_age = max_age
+        self._snapshot: Optional[SharedMetricsSnapshot] = None
+
+    def read(self) -> Optional[Dict[str, List[list]]]:
+        if self._snapshot is None:
+            try:
+                self._snapshot = SharedMetricsSnapshot.attach(self.name)
+            except FileNotFoundError:
+                return None
+        try:
+            metrics = self._snapshot.read(self.max_age)
+        except Exception as e:
+            logging.warning(f"Снимок метрик не прочитан: {e}")
+            metrics = None
+        if metrics is None:
+            self._snapshot.close()
+            self._snapshot = None
+        return metrics
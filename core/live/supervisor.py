@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Callable, Dict, Set, Tuple
+
+from core.logger.logger import shutdown as logger_shutdown
+
+
+def _run_worker(target: Callable, args: tuple):
+    """Точка входа рабочего процесса: SIGTERM обрабатывается как Ctrl+C, чтобы дописать буферы"""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        target(*args)
+    finally:
+        # Процесс выходит через os._exit без atexit - дописываем хвост очереди логов
+        logger_shutdown()
+
+
+class ProcessSupervisor:
+    """
+    Запускает рабочие процессы и перезапускает упавшие.
+    Задержка перед перезапуском растет при частых падениях и сбрасывается,
+    если процесс проработал дольше stable_after секунд.
+    Процесс, завершившийся с кодом 0, закончил работу штатно и не перезапускается
+    """
+
+    def __init__(self, restart_delay: float = 1.0, max_restart_delay: float = 30.0,
+                 stable_after: float = 60.0, check_interval: float = 0.5):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.check_interval = check_interval
+        self._workers: Dict[str, Tuple[Callable, tuple]] = {}
+        self._processes: Dict[str, multiprocessing.Process] = {}
+        self._started_at: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._restart_at: Dict[str, float] = {}
+        self._finished: Set[str] = set()
+        self._running = False
+
+    def add(self, name: str, target: Callable, *args):
+        """Регистрирует рабочий процесс"""
+        self._workers[name] = (target, args)
+        self._failures[name] = 0
+
+    def _spawn(self, name: str):
+        target, args = self._workers[name]
+        process = multiprocessing.Process(target=_run_worker, args=(target, args), name=name)
+        process.start()
+        self._processes[name] = process
+        self._started_at[name] = time.monotonic()
+        logging.info(f"Запущен процесс {name} (pid {process.pid})")
+
+    def _check(self):
+        """Перезапускает завершившиеся процессы с нарастающей задержкой"""
+        now = time.monotonic()
+        for name in self._workers:
+            if name in self._finished:
+                continue
+            restart_at = self._restart_at.get(name)
+            if restart_at is not None:
+                if now >= restart_at:
+                    del self._restart_at[name]
+                    self._spawn(name)
+                continue
+
+            process = self._processes.get(name)
+            if process is None or process.is_alive():
+                continue
+
+            process.join()
+            if process.exitcode == 0:
+                logging.info(f"Процесс {name} завершил работу, перезапуск не требуется")
+                del self._processes[name]
+                self._finished.add(name)
+                continue
+            if now - self._started_at[name] >= self.stable_after:
+                self._failures[name] = 0
+            delay = min(self.restart_delay * 2 ** self._failures[name], self.max_restart_delay)
+            self._failures[name] += 1
+            self._restart_at[name] = now + delay
+            logging.warning(f"Процесс {name} завершился с кодом {process.exitcode}, "
+                            f"перезапуск через {delay:.1f} с")
+
+    def run(self):
+        """Запускает все процессы и следит за ними до остановки"""
+        self._running = True
+        # Остановка по SIGTERM (systemd, docker stop) так же корректна, как по Ctrl+C
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, '_running', False))
+        for name in self._workers:
+            self._spawn(name)
+        try:
+            while self._running and len(self._finished) < len(self._workers):
+                time.sleep(self.check_interval)
+                self._check()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 5.0):
+        """Останавливает все процессы: сначала SIGTERM, по таймауту - kill"""
+        self._running = False
+        self._restart_at.clear()
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for name, process in self._processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"Процесс {name} не завершился за {timeout} с, принудительная остановка")
+                process.kill()
+                process.join()
+        self._processes.clear()
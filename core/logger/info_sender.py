@@ -0,0 +1,74 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+
+from core.logger.write_log_in_db import get_log_engine, log_records
+
+
+def parse_level(value: Optional[str]) -> Optional[int]:
+    """Минимальный уровень из параметра запроса: имя (WARNING) или число (30)"""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Неизвестный уровень журнала: {value}")
+    return level
+
+
+class LogReader:
+    """Поиск по журналу в SQLite с постраничной выдачей от новых записей к старым"""
+
+    def __init__(self, db_path: str):
+        self.engine = get_log_engine(db_path)
+
+    def query(self, level: Optional[int] = None, module: Optional[str] = None,
+              port: Optional[str] = None, template: Optional[str] = None,
+              search: Optional[str] = None,
+              date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+              limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Возвращает страницу записей и next_cursor для следующей страницы.
+        level - минимальный уровень, search - подстрока сообщения
+        """
+        query = select(log_records)
+        if level is not None:
+            query = query.where(log_records.c.levelno >= level)
+        if module:
+            query = query.where(log_records.c.module == module)
+        if port:
+            query = query.where(log_records.c.port == port)
+        if template:
+            query = query.where(log_records.c.template == template)
+        if date_from:
+            query = query.where(log_records.c.timestamp >= date_from)
+        if date_to:
+            query = query.where(log_records.c.timestamp <= date_to)
+        if search:
+            query = query.where(log_records.c.message.contains(search, autoescape=True))
+        if cursor:
+            try:
+                last_id = int(cursor)
+            except ValueError as e:
+                raise ValueError(f"Некорректный курсор: {cursor}") from e
+            query = query.where(log_records.c.id < last_id)
+
+        # id растет вместе со временем записи, поэтому курсор - id последней записи страницы
+        query = query.order_by(log_records.c.id.desc()).limit(limit + 1)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1].id)
+
+        data = []
+        for row in rows:
+            record = dict(row._mapping)
+            record['timestamp'] = record['timestamp'].isoformat()
+            data.append(record)
+        return {'data': data, 'next_cursor': next_cursor}
@@ -1,5 +1,11 @@
 import sys, os
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
+from contextvars import ContextVar
+from typing import Optional
 import colorlog
 import yaml
 
@@ -9,7 +15,37 @@ class _Configs:
         'logging': {
             'console': 2,  # По умолчанию и в файл и в консоль
             'file': 'logs/app.log',
-            'level': 'INFO'
+            'level': 'INFO',
+            'queue': True,  # Запись в файл и консоль из отдельного потока, без блокировки цикла событий
+            'max_bytes': 10485760,  # Ротация файла по размеру (10 МБ), 0 - без ротации по размеру
+            'when': None,  # Ротация по времени: 'midnight', 'H' и т.п. (вместо ротации по размеру)
+            'backup_count': 5,
+            'rate_limit': 20,  # Не больше N сообщений с одной строки кода за окно, 0 - без ограничения
+            'rate_limit_window': 10,  # Окно ограничения, секунды
+            'db': 'logs/logs.db',  # Журнал в SQLite для поиска через /logs, None - отключен
+            'db_level': 'INFO',
+            'db_batch_size': 200,
+            'db_flush_interval': 1.0,
+            'db_retention_days': 7
+        },
+        'database': {
+            'batch_size': 500,  # Сброс буфера записи по количеству строк
+            'flush_interval': 1.0,  # ...или по времени, секунды
+            'rollup_interval': 60,  # Период обновления агрегатов и очистки по сроку хранения, секунды
+            'startup_manifest': 'databases/startup_manifest.json',  # Состояние шаблонов и БД для быстрого старта
+            'sqlite': {
+                'journal_mode': 'WAL',  # Читатели API не блокируют запись
+                'synchronous': 'NORMAL',
+                'mmap_size': 268435456,  # 256 МБ
+                'cache_size': -65536,  # Отрицательное значение - размер в КБ (64 МБ)
+                'temp_store': 'MEMORY',
+                'busy_timeout': 5000  # мс
+            }
+        },
+        'serial': {
+            'detect_deadline': 30,  # Общий лимит на автоопределение шаблонов всех портов, секунды
+            'port_cache': 'databases/port_templates.json',  # Привязки шаблонов к USB-устройствам
+            'rescan_interval': 30  # Повторный поиск портов, пока не найден ни один, секунды
         }
     }
 
@@ -36,6 +72,14 @@ class _Configs:
             cls._configs = cls._default_configs
             logging.error(f"Ошибка при загрузке конфигурации: {e}. Используется стандартная конфигурация.")
 
+    @classmethod
+    def _option(cls, key: str):
+        """Возвращает параметр секции, а при его отсутствии в configs.yaml - значение по умолчанию"""
+        if cls._configs is None:
+            cls._init_configs()
+        section = cls._configs.get(cls._config_name) or {}
+        return section.get(key, cls._default_configs[cls._config_name][key])
+
 
 class LoggerConfigs(_Configs):
     _config_name = 'logging'
@@ -58,8 +102,157 @@ class LoggerConfigs(_Configs):
             cls._init_configs()
         return cls._configs[cls._config_name]['level']
 
+    @classmethod
+    def use_queue(cls) -> bool:
+        return bool(cls._option('queue'))
+
+    @classmethod
+    def rotation(cls) -> dict:
+        return {
+            'max_bytes': int(cls._option('max_bytes') or 0),
+            'when': cls._option('when'),
+            'backup_count': int(cls._option('backup_count') or 0),
+        }
+
+    @classmethod
+    def rate_limit(cls) -> tuple:
+        """(сообщений, окно в секундах)"""
+        return int(cls._option('rate_limit') or 0), float(cls._option('rate_limit_window'))
+
+    @classmethod
+    def db_file(cls):
+        return cls._option('db')
+
+    @classmethod
+    def db_level(cls) -> str:
+        return str(cls._option('db_level'))
+
+    @classmethod
+    def db_batching(cls) -> tuple:
+        """(строк в пакете, интервал сброса в секундах)"""
+        return int(cls._option('db_batch_size')), float(cls._option('db_flush_interval'))
+
+    @classmethod
+    def db_retention_days(cls) -> float:
+        return float(cls._option('db_retention_days') or 0)
+
+
+# Порт и шаблон, которые обрабатывает текущая задача asyncio (или поток)
+_log_context: ContextVar[dict] = ContextVar('log_context', default={})
+
+
+def set_log_context(port: Optional[str] = None, template: Optional[str] = None):
+    """Привязывает порт и шаблон к записям журнала текущей задачи"""
+    _log_context.set({'port': port, 'template': template})
+
+
+class ContextFilter(logging.Filter):
+    """Дописывает в запись порт и шаблон из контекста задачи, если они не переданы через extra"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if getattr(record, 'port', None) is None:
+            record.port = context.get('port')
+        if getattr(record, 'template', None) is None:
+            record.template = context.get('template')
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает повторяющиеся сообщения: не больше max_messages записей
+    с одной строки кода за window секунд. Число подавленных записей
+    дописывается к первому сообщению следующего окна
+    """
+
+    def __init__(self, max_messages: int, window: float):
+        super().__init__()
+        self.max_messages = max_messages
+        self.window = window
+        # (модуль, строка) -> [начало окна, записей в окне, подавлено]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            # Ошибки не подавляются
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            state = self._sites.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.getMessage()} (подавлено повторов: {suppressed})"
+                    record.args = None
+                return True
+            if state[1] < self.max_messages:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+# Поток записи логов в режиме очереди
+_listener = None
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def shutdown():
+    """
+    Дописывает очередь логов и закрывает обработчики корневого логгера.
+    Рабочие процессы супервизора завершаются через os._exit, где atexit не срабатывает,
+    поэтому они вызывают shutdown явно
+    """
+    _stop_listener()
+    logger = logging.getLogger()
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def _create_file_handler(log_file_path: str) -> logging.Handler:
+    """Файловый обработчик с ротацией по размеру или по времени"""
+    rotation = LoggerConfigs.rotation()
+    if rotation['when']:
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file_path, when=rotation['when'], backupCount=rotation['backup_count'], encoding='utf-8')
+    if rotation['max_bytes']:
+        return logging.handlers.RotatingFileHandler(
+            log_file_path, maxBytes=rotation['max_bytes'], backupCount=rotation['backup_count'],
+            encoding='utf-8')
+    return logging.FileHandler(log_file_path, encoding='utf-8')
+
+
+def _create_db_handler() -> Optional[logging.Handler]:
+    """Обработчик пакетной записи журнала в SQLite или None, если журнал в БД отключен"""
+    if not LoggerConfigs.db_file():
+        return None
+    try:
+        from core.logger.write_log_in_db import DatabaseLogHandler
+
+        batch_size, flush_interval = LoggerConfigs.db_batching()
+        return DatabaseLogHandler(
+            LoggerConfigs.db_file(), batch_size=batch_size, flush_interval=flush_interval,
+            retention_days=LoggerConfigs.db_retention_days())
+    except Exception as e:
+        print(f"Ошибка при создании журнала в БД: {e}")
+        return None
+
 
 def start():
+    global _listener
+
     # Сначала создаем временный консольный логгер для вывода служебных сообщений
     temp_logger = logging.getLogger()
     temp_handler = logging.StreamHandler(sys.stdout)
@@ -86,11 +279,17 @@ def start():
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
+    # Создается до очистки обработчиков: при подключении к БД пишутся служебные сообщения,
+    # а logging без обработчиков у корневого логгера добавил бы свой обработчик stderr
+    db_handler = _create_db_handler()
+
     logger = logging.getLogger()
     
     # Очищаем все существующие обработчики
+    _stop_listener()
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+        handler.close()
     
     # Преобразуем строковый уровень в числовой
     level_mapping = {
@@ -110,7 +309,7 @@ def start():
     try:
         log_file_path = LoggerConfigs.file()
         os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
-        file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
+        file_handler = _create_file_handler(log_file_path)
         file_handler.setLevel(log_level)
         file_formatter = logging.Formatter(
             '[%(asctime)s] %(levelname)s: %(message)s',
@@ -131,12 +330,39 @@ def start():
     if not handlers:
         raise ValueError('Unexpected value for log out')
 
-    for handler in handlers:
-        logger.addHandler(handler)
+    # Журнал в SQLite пишется пакетами в дополнение к файлу и консоли
+    if db_handler is not None:
+        db_handler.setLevel(max(log_level, level_mapping.get(LoggerConfigs.db_level(), logging.INFO)))
+        handlers.append(db_handler)
+
+    max_messages, window = LoggerConfigs.rate_limit()
+    rate_limit = RateLimitFilter(max_messages, window) if max_messages > 0 else None
+
+    if LoggerConfigs.use_queue():
+        # Цикл событий только кладет запись в очередь, файл и консоль пишет отдельный поток
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        # Контекст задачи читается до передачи записи в поток записи
+        queue_handler.addFilter(ContextFilter())
+        if rate_limit:
+            queue_handler.addFilter(rate_limit)
+        logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            handler.addFilter(ContextFilter())
+            if rate_limit:
+                handler.addFilter(rate_limit)
+            logger.addHandler(handler)
     
     # Теперь все сообщения будут идти через настроенный логгер
     logging.info("Логгер успешно инициализирован")
     logging.debug("Режим отладки активен")
     logging.warning("Это предупреждение")
     logging.error("Это ошибка\n")
-    
\ No newline at end of file
+    
+
+
+# Дописываем очередь логов при завершении процесса
+atexit.register(shutdown)
@@ -0,0 +1,173 @@
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, DateTime, Index
+
+from core.database.engines import get_sqlite_engine
+
+LOG_TABLE = "log_records"
+
+log_metadata = MetaData()
+
+log_records = Table(
+    LOG_TABLE, log_metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('timestamp', DateTime, nullable=False),
+    Column('level', String(10), nullable=False),
+    Column('levelno', Integer, nullable=False),
+    Column('module', String(100), nullable=False),
+    Column('port', String(100)),
+    Column('template', String(100)),
+    Column('message', Text, nullable=False),
+)
+
+# Индексы под фильтры /logs: выборка идет по фильтру и диапазону времени
+Index('ix_log_records_timestamp', log_records.c.timestamp)
+Index('ix_log_records_levelno_timestamp', log_records.c.levelno, log_records.c.timestamp)
+Index('ix_log_records_module_timestamp', log_records.c.module, log_records.c.timestamp)
+Index('ix_log_records_port_timestamp', log_records.c.port, log_records.c.timestamp)
+Index('ix_log_records_template_timestamp', log_records.c.template, log_records.c.timestamp)
+
+
+def get_log_engine(db_path: str):
+    """Движок БД журнала; таблица и индексы создаются при первом обращении"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    engine = get_sqlite_engine(Path(db_path))
+    log_metadata.create_all(engine)
+    return engine
+
+
+def record_to_row(record: logging.LogRecord) -> dict:
+    """Преобразует запись logging в строку таблицы журнала"""
+    message = record.getMessage()
+    if record.exc_info and not record.exc_text:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+    if record.exc_text:
+        message = f"{message}\n{record.exc_text}"
+    return {
+        'timestamp': datetime.fromtimestamp(record.created),
+        'level': record.levelname,
+        'levelno': record.levelno,
+        'module': record.module,
+        'port': getattr(record, 'port', None),
+        'template': getattr(record, 'template', None),
+        'message': message,
+    }
+
+
+# Открытые обработчики процесса - для сброса их состояния в дочернем процессе после fork
+_handlers = weakref.WeakSet()
+
+
+def _reset_handlers_after_fork():
+    for handler in list(_handlers):
+        handler._reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_handlers_after_fork)
+
+
+class DatabaseLogHandler(logging.Handler):
+    """
+    Обработчик logging, который копит записи и пишет их в SQLite пакетами
+    из отдельного потока: по batch_size записей или раз в flush_interval секунд.
+    Записи старше retention_days удаляются раз в час
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 200, flush_interval: float = 1.0,
+                 retention_days: float = 7, cleanup_interval: float = 3600):
+        super().__init__()
+        self.engine = get_log_engine(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.cleanup_interval = cleanup_interval
+        self._rows: List[dict] = []
+        self._rows_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._last_cleanup = 0.0
+        self._start_writer()
+        _handlers.add(self)
+
+    def _start_writer(self):
+        self._thread = threading.Thread(target=self._run, name="log-db-writer", daemon=True)
+        self._thread.start()
+
+    def _reset_after_fork(self):
+        """
+        В дочернем процессе: несохраненные записи принадлежат родителю и будут записаны им,
+        соединения пула - тоже родительские. Поток записи после fork не существует
+        """
+        self.createLock()
+        self._rows = []
+        self._rows_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.engine.dispose(close=False)
+        if not self._stopped.is_set():
+            self._start_writer()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            row = record_to_row(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._rows_lock:
+            self._rows.append(row)
+            is_full = len(self._rows) >= self.batch_size
+        if is_full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if self.retention_days and time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+                self._last_cleanup = time.monotonic()
+                self.delete_expired()
+
+    def flush(self):
+        """Записывает накопленные записи одной вставкой"""
+        with self._rows_lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+        with self._write_lock:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(log_records.insert(), rows)
+            except Exception as e:
+                # Не через logging: ошибка записи журнала не должна снова попасть в журнал
+                print(f"Ошибка записи журнала в БД ({len(rows)} записей потеряно): {e}", file=sys.stderr)
+
+    def delete_expired(self) -> Optional[int]:
+        """Удаляет записи старше срока хранения"""
+        border = datetime.now() - timedelta(days=self.retention_days)
+        with self._write_lock:
+            try:
+                with self.engine.begin() as conn:
+                    result = conn.execute(log_records.delete().where(log_records.c.timestamp < border))
+                return result.rowcount
+            except Exception as e:
+                print(f"Ошибка очистки журнала в БД: {e}", file=sys.stderr)
+                return None
+
+    def close(self):
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join(5)
+            self.flush()
+        super().close()
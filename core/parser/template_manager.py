@@ -1,6 +1,6 @@
 import yaml
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel, Field
 import logging
 from config.settings import BASE_DIR
@@ -21,9 +21,21 @@ class DatabaseConfig(BaseModel):
     db_name: str
     driver: str = "sqlite"
 
+class BinaryFrameConfig(BaseModel):
+    sync_word: str = "AA55"  # Маркер начала кадра в hex
+    byte_order: str = "<"  # Порядок байт для struct: "<" little-endian, ">" big-endian
+    crc: str = "crc16"  # crc16 (CCITT-FALSE) или none
+    sensors: Dict[str, str] = {}  # sensor_id -> формат struct полей датчика по порядку, например "fff"
+
 class ParsingConfig(BaseModel):
+    format: str = "text"  # text - строки "Sensor:0x76;Temperature:23.4;", binary - кадры
     delimiter: str = ";"
     key_value_separator: str = ":"
+    binary: Optional[BinaryFrameConfig] = None
+
+class RetentionConfig(BaseModel):
+    rollups: List[str] = []  # Интервалы агрегатов, например ["1m", "1h", "1d"]
+    raw_max_age: Optional[str] = None  # Срок хранения сырых строк, например "30d"
 
 class TemplateConfig(BaseModel):
     template_name: str
@@ -32,12 +44,15 @@ class TemplateConfig(BaseModel):
     database: DatabaseConfig
     sensors: List[SensorConfig]
     parsing: ParsingConfig = ParsingConfig()
+    retention: RetentionConfig = RetentionConfig()
 
 class TemplateManager:
     def __init__(self, templates_dir: Path = BASE_DIR / "templates"):
         self.templates_dir = templates_dir
         self.templates_dir.mkdir(exist_ok=True)
+        # Кэш шаблонов по имени и сигнатуры файлов (mtime_ns, size) для инвалидации
         self.templates: Dict[str, TemplateConfig] = {}
+        self._template_stats: Dict[str, Tuple[int, int]] = {}
         
     # def load_template(self, template_name: str) -> Optional[TemplateConfig]:
     #     """Загружает шаблон из YAML файла"""
@@ -54,30 +69,70 @@ class TemplateManager:
     #         logging.error(f"Ошибка загрузки шаблона {template_name}: {e}")
         
     #     return None
-    def load_template(self, template_name: str) -> Optional[TemplateConfig]:
-        """Загружает шаблон из YAML файла"""
-        # Если хотите всегда использовать indoor_sensor.yaml
-        template_path = self.templates_dir / "indoor_sensor.yaml"
-        
-        # Или сделать маппинг имен
+    def _template_path(self, template_name: str) -> Path:
+        """Возвращает путь к файлу шаблона с учетом маппинга имен"""
         template_mapping = {
             "weather_station": "indoor_sensor.yaml",
             # другие маппинги...
         }
         filename = template_mapping.get(template_name, f"{template_name}.yaml")
-        template_path = self.templates_dir / filename
+        return self.templates_dir / filename
+
+    def load_template(self, template_name: str) -> Optional[TemplateConfig]:
+        """
+        Возвращает шаблон из кэша; файл перечитывается только если
+        изменились его mtime или размер
+        """
+        template_path = self._template_path(template_name)
+        signature = self.file_signature(template_name)
+        if signature is None:
+            self.invalidate(template_name)
+            return None
+        
+        if self._template_stats.get(template_name) == signature:
+            return self.templates[template_name]
         
-        logging.info(f"template_manager path {template_path}")
+        return self._read_template(template_name, template_path, signature)
+
+    def file_signature(self, template_name: str) -> Optional[Tuple[int, int]]:
+        """Сигнатура файла шаблона (mtime_ns, размер) или None, если файла нет"""
         try:
-            if template_path.exists():
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    template_data = yaml.safe_load(f)
-                    logging.info(f"template_manager data {template_data}")
-                    return TemplateConfig(**template_data)
+            stat = self._template_path(template_name).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_template(self, template_name: str) -> Optional[TemplateConfig]:
+        """Принудительно перечитывает шаблон с диска"""
+        self.invalidate(template_name)
+        return self.load_template(template_name)
+
+    def invalidate(self, template_name: Optional[str] = None):
+        """Сбрасывает кэш одного шаблона или всех шаблонов"""
+        if template_name is None:
+            self.templates.clear()
+            self._template_stats.clear()
+        else:
+            self.templates.pop(template_name, None)
+            self._template_stats.pop(template_name, None)
+
+    def _read_template(self, template_name: str, template_path: Path,
+                       signature: Tuple[int, int]) -> Optional[TemplateConfig]:
+        """Читает и валидирует YAML шаблона, кладет результат в кэш"""
+        logging.info(f"Загрузка шаблона {template_name} из {template_path}")
+        try:
+            with open(template_path, 'r', encoding='utf-8') as f:
+                template_data = yaml.safe_load(f)
+                logging.debug(f"template_manager data {template_data}")
+                template = TemplateConfig(**template_data)
         except Exception as e:
             logging.error(f"Ошибка загрузки шаблона {template_name}: {e}")
+            self.invalidate(template_name)
+            return None
         
-        return None
+        self.templates[template_name] = template
+        self._template_stats[template_name] = signature
+        return template
     
     def save_template(self, template_config: TemplateConfig) -> bool:
         """Сохраняет шаблон в YAML файл"""
@@ -87,6 +142,7 @@ class TemplateManager:
             with open(template_path, 'w', encoding='utf-8') as f:
                 yaml.dump(template_config.dict(), f, allow_unicode=True, sort_keys=False)
             
+            self.invalidate(template_config.template_name)
             logging.info(f"Шаблон {template_config.template_name} сохранен")
             return True
             
@@ -104,6 +160,7 @@ class TemplateManager:
             template_path = self.templates_dir / f"{template_name}.yaml"
             if template_path.exists():
                 template_path.unlink()
+                self.invalidate(template_name)
                 return True
         except Exception as e:
             logging.error(f"Ошибка удаления шаблона {template_name}: {e}")
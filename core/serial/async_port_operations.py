@@ -1,80 +1,72 @@
 import logging
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 import asyncio
-from .port_devices_functions import open_port, read_line_from_port, close_port
+from .port_session import get_port_session, AsyncPortSession
+from .async_serial import native_async_supported
 
 async def async_read_with_handshake(port_name: str, baudrate: int = 115200,
                                   timeout: int = 1, handshake_timeout: int = 3) -> Optional[str]:
-    """Читает данные с выполнением рукопожатия и ожиданием реальных данных"""
+    """Запрашивает данные через постоянную сессию порта (рукопожатие выполняется один раз)"""
     try:
-        # Открываем порт с рукопожатием
-        ser = open_port(port_name, baudrate, timeout, handshake_timeout)
-        if not ser:
-            return None
-        
-        # Даем время Arduino отправить данные после handshake
-        await asyncio.sleep(1)
-        
-        # Читаем несколько строк, пропуская handshake сообщения
-        max_attempts = 5
-        for attempt in range(max_attempts):
-            data, success = read_line_from_port(ser)
-            
-            if success:
-                try:
-                    decoded_data = data.decode('utf-8', errors='ignore').strip()
-                    if decoded_data and not any(x in decoded_data for x in ['HANDSHAKE', 'ARDUINO_READY']):
-                        close_port(ser)
-                        return decoded_data
-                    else:
-                        logging.debug(f"Пропускаем служебное сообщение: {decoded_data}")
-                except UnicodeDecodeError:
-                    pass
-            
-            await asyncio.sleep(0.5)
-        
-        close_port(ser)
-        return None
-        
+        if native_async_supported():
+            session = get_port_session(port_name, baudrate, timeout, handshake_timeout,
+                                       session_class=AsyncPortSession)
+            return await session.read_data_async()
+
+        # Без поддержки add_reader блокирующие вызовы pyserial выполняются вне цикла событий
+        session = get_port_session(port_name, baudrate, timeout, handshake_timeout)
+        return await asyncio.to_thread(session.read_data)
+
     except Exception as e:
         logging.error(f"Ошибка чтения с рукопожатием из порта {port_name}: {e}")
-        try:
-            close_port(ser)
-        except:
-            pass
         return None
 
+async def async_read_burst(port_name: str, baudrate: int = 115200,
+                           timeout: int = 1, handshake_timeout: int = 3) -> List[Tuple[datetime, str]]:
+    """Запрашивает данные и забирает все накопленные в порту строки с временем приема"""
+    try:
+        if native_async_supported():
+            session = get_port_session(port_name, baudrate, timeout, handshake_timeout,
+                                       session_class=AsyncPortSession)
+            return await session.read_burst_async()
+
+        session = get_port_session(port_name, baudrate, timeout, handshake_timeout)
+        return await asyncio.to_thread(session.read_burst)
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения с рукопожатием из порта {port_name}: {e}")
+        return []
+
 async def async_read_after_handshake(port_name: str, baudrate: int = 115200,
                                    timeout: int = 1) -> Optional[str]:
-    """Читает данные после уже выполненного handshake"""
+    """Читает данные, которые устройство отправляет само после выполненного handshake"""
     try:
-        ser = open_port(port_name, baudrate, timeout)
-        if not ser:
-            return None
-        
-        # Читаем несколько строк, пропуская handshake сообщения
-        max_attempts = 3
-        for attempt in range(max_attempts):
-            data, success = read_line_from_port(ser)
-            
-            if success:
-                try:
-                    decoded_data = data.decode('utf-8', errors='ignore').strip()
-                    if decoded_data and not any(x in decoded_data for x in ['HANDSHAKE', 'ARDUINO_READY']):
-                        close_port(ser)
-                        return decoded_data
-                except UnicodeDecodeError:
-                    pass
-            
-            await asyncio.sleep(0.5)
-        
-        close_port(ser)
-        return None
-        
+        if native_async_supported():
+            session = get_port_session(port_name, baudrate, timeout,
+                                       session_class=AsyncPortSession)
+            return await session.read_data_async(request=False, max_attempts=3)
+
+        session = get_port_session(port_name, baudrate, timeout)
+        return await asyncio.to_thread(session.read_data, request=False, max_attempts=3)
+
     except Exception as e:
         logging.error(f"Ошибка чтения из порта {port_name}: {e}")
-        try:
-            close_port(ser)
-        except:
-            pass
-        return None
\ No newline at end of file
+        return None
+
+
+async def async_read_frames(port_name: str, frame_spec, baudrate: int = 115200,
+                            timeout: int = 1, handshake_timeout: int = 3) -> List[Tuple[datetime, bytes]]:
+    """Запрашивает бинарные кадры через постоянную сессию порта вместе с временем их приема"""
+    try:
+        if native_async_supported():
+            session = get_port_session(port_name, baudrate, timeout, handshake_timeout,
+                                       session_class=AsyncPortSession)
+            return await session.read_frames_async(frame_spec)
+
+        session = get_port_session(port_name, baudrate, timeout, handshake_timeout)
+        return await asyncio.to_thread(session.read_frames, frame_spec)
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения кадров из порта {port_name}: {e}")
+        return []
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import os
+import select
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Tuple
+import serial
+
+from core.serial.port_devices_functions import HandshakeStatus
+
+
+def native_async_supported() -> bool:
+    """
+    Проверяет, можно ли ждать данные порта через готовность дескриптора.
+    На Windows (ProactorEventLoop) add_reader недоступен - там используется пул потоков
+    """
+    return sys.platform != "win32"
+
+
+class AsyncSerialStream:
+    """
+    Неблокирующий reader/writer поверх файлового дескриптора serial.Serial.
+    Ожидание данных выполняется через loop.add_reader/add_writer, без опроса
+    in_waiting, sleep-циклов и потоков исполнителя.
+
+    Каждая строка получает время приема своего последнего фрагмента. После
+    start_listening дескриптор читается сразу по готовности, а не при опросе
+    порта, поэтому строки, накопленные между опросами, сохраняют свое время
+    """
+
+    def __init__(self, ser: serial.Serial, chunk_size: int = 4096):
+        self.serial = ser
+        self.chunk_size = chunk_size
+        self._fd = ser.fileno()
+        self._buffer = bytearray()
+        # Время приема каждой полной строки буфера, по порядку строк
+        self._line_times: Deque[datetime] = deque()
+        # (время приема, размер) фрагментов, из которых состоит буфер
+        self._chunk_times: Deque[Tuple[datetime, int]] = deque()
+        self._listening = False
+        self._data_ready: Optional[asyncio.Event] = None
+        self._error: Optional[Exception] = None
+
+    async def _wait_fd(self, add, remove, timeout: Optional[float]):
+        """Ждёт готовности дескриптора на чтение или запись"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def _on_ready():
+            if not ready.done():
+                ready.set_result(None)
+
+        add(self._fd, _on_ready)
+        try:
+            await asyncio.wait_for(ready, timeout)
+        finally:
+            remove(self._fd)
+
+    def _read_available(self):
+        """Забирает из дескриптора всё, что уже пришло, и отмечает время приема завершенных строк"""
+        try:
+            chunk = os.read(self._fd, self.chunk_size)
+        except BlockingIOError:
+            return
+        if not chunk:
+            # Дескриптор готов к чтению, но данных нет - устройство отключено
+            raise serial.SerialException(f"Устройство на {self.serial.port} отключено")
+        self._buffer.extend(chunk)
+        received_at = datetime.now()
+        self._line_times.extend([received_at] * chunk.count(b'\n'))
+        self._chunk_times.append((received_at, len(chunk)))
+
+    def start_listening(self):
+        """Читает дескриптор по готовности в цикле событий, не дожидаясь вызова readline"""
+        if self._listening:
+            return
+        self._data_ready = asyncio.Event()
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        self._listening = True
+
+    def _stop_listening(self):
+        if self._listening:
+            self._listening = False
+            try:
+                asyncio.get_running_loop().remove_reader(self._fd)
+            except RuntimeError:
+                # Цикл событий уже остановлен - вместе с ним снят и обработчик
+                pass
+
+    def _on_readable(self):
+        try:
+            self._read_available()
+        except (serial.SerialException, OSError) as e:
+            # Ошибка передается следующему чтению; без снятия обработчика цикл крутился бы вхолостую
+            self._error = e
+            self._stop_listening()
+        self._data_ready.set()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def _wait_data(self, timeout: float):
+        """Ждет новых данных в буфере (в режиме прослушивания) или готовности дескриптора"""
+        if self._listening:
+            self._data_ready.clear()
+            await asyncio.wait_for(self._data_ready.wait(), timeout)
+            self._raise_error()
+        else:
+            loop = asyncio.get_running_loop()
+            await self._wait_fd(loop.add_reader, loop.remove_reader, timeout)
+            self._read_available()
+
+    def _pop_line(self) -> Optional[Tuple[datetime, bytes]]:
+        newline = self._buffer.find(b'\n')
+        if newline < 0:
+            return None
+        line = bytes(self._buffer[:newline + 1])
+        del self._buffer[:newline + 1]
+        self._forget_chunks(len(line))
+        return self._line_times.popleft(), line
+
+    def _forget_chunks(self, size: int):
+        """Снимает с учета фрагментов size байт, забранных из начала буфера"""
+        while size and self._chunk_times:
+            received_at, length = self._chunk_times[0]
+            if length > size:
+                self._chunk_times[0] = (received_at, length - size)
+                return
+            size -= length
+            self._chunk_times.popleft()
+
+    async def read_stamped_line(self, timeout: float) -> Optional[Tuple[datetime, bytes]]:
+        """Возвращает (время приема, строка с \\n) или None, если за timeout строка не пришла"""
+        self._raise_error()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            stamped = self._pop_line()
+            if stamped is not None:
+                return stamped
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await self._wait_data(remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    async def readline(self, timeout: float) -> Optional[bytes]:
+        """Возвращает одну строку (с \\n) или None, если за timeout строка не пришла"""
+        stamped = await self.read_stamped_line(timeout)
+        return stamped[1] if stamped else None
+
+    async def read_stamped_chunks(self, timeout: float) -> List[Tuple[datetime, bytes]]:
+        """
+        Возвращает все принятые байты фрагментами [(время приема, байты), ...],
+        дождавшись хотя бы одного, или [], если за timeout ничего не пришло.
+        Для бинарных потоков без деления на строки
+        """
+        self._raise_error()
+        if not self._buffer:
+            try:
+                await self._wait_data(timeout)
+            except asyncio.TimeoutError:
+                return []
+        chunks = []
+        offset = 0
+        for received_at, length in self._chunk_times:
+            chunks.append((received_at, bytes(self._buffer[offset:offset + length])))
+            offset += length
+        self._buffer.clear()
+        self._line_times.clear()
+        self._chunk_times.clear()
+        return chunks
+
+    def drain_lines(self) -> List[Tuple[datetime, bytes]]:
+        """Забирает без ожидания все полные строки, уже пришедшие в порт, со временем их приема"""
+        self._raise_error()
+        # Читаем только пока дескриптор готов: пустое чтение готового дескриптора - отключение
+        while select.select([self._fd], [], [], 0)[0]:
+            self._read_available()
+
+        lines = []
+        stamped = self._pop_line()
+        while stamped is not None:
+            lines.append(stamped)
+            stamped = self._pop_line()
+        return lines
+
+    async def write(self, data: bytes):
+        """Записывает данные целиком, дожидаясь готовности дескриптора к записи"""
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._fd, view)
+            except BlockingIOError:
+                written = 0
+            view = view[written:]
+            if view:
+                await self._wait_fd(loop.add_writer, loop.remove_writer, None)
+
+    def reset_input_buffer(self):
+        """Очищает входной буфер порта и внутренний буфер строк"""
+        self.serial.reset_input_buffer()
+        self._buffer.clear()
+        self._line_times.clear()
+        self._chunk_times.clear()
+
+    def close(self):
+        self._stop_listening()
+        self._buffer.clear()
+        self._line_times.clear()
+        self._chunk_times.clear()
+        self.serial.close()
+
+
+async def async_perform_handshake(stream: AsyncSerialStream, timeout: float = 3) -> str:
+    """Выполняет тройное рукопожатие без блокировки цикла событий"""
+    try:
+        stream.reset_input_buffer()
+        await stream.write("HANDSHAKE_REQ\n".encode('utf-8'))
+        logging.debug("Отправлен запрос рукопожатия")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            line = await stream.readline(remaining)
+            if line is None:
+                break
+
+            response = line.decode('utf-8', errors='ignore').strip()
+            logging.debug(f"Получен ответ: {response}")
+            if response == "HANDSHAKE_ACK":
+                await stream.write("HANDSHAKE_CONFIRM\n".encode('utf-8'))
+                logging.info("Рукопожатие успешно завершено")
+                return HandshakeStatus.SUCCESS
+            elif response == "ARDUINO_READY":
+                logging.info("Устройство готово к работе")
+                return HandshakeStatus.SUCCESS
+            elif response:
+                logging.debug(f"Получен неожиданный ответ: {response}")
+
+        logging.warning("Таймаут рукопожатия")
+        return HandshakeStatus.TIMEOUT
+
+    except (serial.SerialException, OSError) as e:
+        logging.error(f"Ошибка рукопожатия: {e}")
+        return HandshakeStatus.NO_RESPONSE
+
+
+async def async_open_port(port_name: str, baudrate: int = 115200,
+                          handshake_timeout: float = 3,
+                          init_delay: float = 2) -> Optional[AsyncSerialStream]:
+    """Открывает порт, выполняет рукопожатие и возвращает асинхронный поток"""
+    logging.info(f"Пытаемся подключиться к {port_name}")
+    try:
+        ser = serial.Serial(
+            port=port_name,
+            baudrate=baudrate,
+            timeout=0,
+            write_timeout=0,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE
+        )
+    except serial.SerialException as e:
+        logging.error(f"Ошибка открытия порта {port_name}: {e}")
+        return None
+
+    logging.info(f"Порт {port_name} успешно открыт (baudrate: {baudrate})")
+    stream = AsyncSerialStream(ser)
+
+    # Даем устройству время на инициализацию, не блокируя другие порты
+    await asyncio.sleep(init_delay)
+
+    handshake_result = await async_perform_handshake(stream, handshake_timeout)
+    if handshake_result == HandshakeStatus.SUCCESS:
+        logging.info(f"Успешное рукопожатие с {port_name}")
+        return stream
+
+    logging.warning(f"Рукопожатие не удалось: {handshake_result}")
+    stream.close()
+    return None
@@ -1,5 +1,11 @@
+import json
 import logging
-from typing import Dict, Optional, List
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, Optional, List, Set, Tuple
 import serial.tools.list_ports
 
 from core.parser.template_manager import TemplateConfig
@@ -7,10 +13,126 @@ from core.parser.template_manager import TemplateManager
 from core.serial.port_devices_functions import open_port, read_line_from_port, close_port
 import time
 
+def hardware_id(port_info) -> Optional[str]:
+    """Устойчивый идентификатор USB-устройства (VID:PID:серийный номер) или None"""
+    if port_info.vid is None or not port_info.serial_number:
+        return None
+    return f"{port_info.vid:04X}:{port_info.pid:04X}:{port_info.serial_number}"
+
+
+class PortMappingCache:
+    """
+    Сохраненные привязки шаблонов к устройствам по их USB-идентификатору.
+    Устройство узнается и после переподключения в другой порт
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except Exception as e:
+            logging.warning(f"Кэш привязок портов {self.path} не прочитан: {e}")
+            self._entries = {}
+
+    def get(self, hw_id: Optional[str]) -> Optional[str]:
+        if hw_id is None:
+            return None
+        entry = self._entries.get(hw_id)
+        return entry['template'] if entry else None
+
+    def set(self, hw_id: str, port_name: str, template_name: str):
+        self._entries[hw_id] = {
+            'template': template_name,
+            'port': port_name,
+            'detected_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def save(self):
+        """Атомарно записывает кэш на диск"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Ошибка сохранения кэша привязок портов {self.path}: {e}")
+
+
+class TemplateSignatureIndex:
+    """
+    Инвертированный индекс сигнатур шаблонов: ключ строки данных → шаблоны с этим ключом.
+    Сигнатура шаблона - источники полей и маркеры датчиков (Sensor=0x76).
+    Оцениваются только шаблоны, у которых есть хотя бы один общий ключ со строкой
+    """
+
+    def __init__(self):
+        self.signatures: Dict[str, Set[str]] = {}
+        self._index: Dict[str, Set[str]] = defaultdict(set)
+        # Уникальные пары (разделитель, разделитель ключ-значение) среди шаблонов
+        self._separators: Set[Tuple[str, str]] = set()
+
+    def add(self, template_name: str, template: TemplateConfig):
+        signature = {f"Sensor={sensor.sensor_id}" for sensor in template.sensors}
+        for sensor in template.sensors:
+            signature.update(field.source for field in sensor.fields)
+        self.signatures[template_name] = signature
+        for key in signature:
+            self._index[key].add(template_name)
+        self._separators.add((template.parsing.delimiter, template.parsing.key_value_separator))
+
+    @staticmethod
+    def line_keys(data_line: str, delimiter: str, key_value_sep: str) -> Set[str]:
+        """Ключи строки данных в том же виде, что и сигнатура шаблона"""
+        keys = set()
+        for part in data_line.split(delimiter):
+            key, found, value = part.partition(key_value_sep)
+            key = key.strip()
+            if not found or not key:
+                continue
+            keys.add(f"Sensor={value.strip()}" if key == "Sensor" else key)
+        return keys
+
+    def scores(self, sample_data: List[str]) -> Dict[str, float]:
+        """Средний по строкам коэффициент Жаккара для шаблонов-кандидатов"""
+        totals: Dict[str, float] = defaultdict(float)
+        lines_analyzed = 0
+        for data_line in sample_data:
+            if not data_line:
+                continue
+            lines_analyzed += 1
+            # При нескольких вариантах разбора строки для шаблона берется лучший
+            line_scores: Dict[str, float] = {}
+            for delimiter, key_value_sep in self._separators:
+                keys = self.line_keys(data_line, delimiter, key_value_sep)
+                common: Dict[str, int] = defaultdict(int)
+                for key in keys:
+                    for template_name in self._index.get(key, ()):
+                        common[template_name] += 1
+                for template_name, count in common.items():
+                    union = len(keys) + len(self.signatures[template_name]) - count
+                    line_scores[template_name] = max(line_scores.get(template_name, 0.0),
+                                                     count / union)
+            for template_name, score in line_scores.items():
+                totals[template_name] += score
+        if not lines_analyzed:
+            return {}
+        return {name: total / lines_analyzed for name, total in totals.items()}
+
+
 class PortTemplateManager:
     def __init__(self):
         self.template_manager = TemplateManager()
         self.port_templates: Dict[str, str] = {}  # port -> template_name
+        self._signature_index: Optional[TemplateSignatureIndex] = None
+        self._indexed_templates: Set[str] = set()
     
     def auto_detect_port_template(self, port_name: str, read_timeout: int = 5) -> Optional[str]:
         """Автоматически определяет подходящий шаблон для порта"""
@@ -59,60 +181,79 @@ class PortTemplateManager:
             logging.error(f"Ошибка детекта шаблона для {port_name}: {e}")
             return None
     
-    def _find_matching_template(self, sample_data: List[str]) -> Optional[str]:
-        """Ищет подходящий шаблон для данных"""
-        best_match = None
-        best_score = 0
-        
-        for template_name in self.template_manager.list_templates():
-            template = self.template_manager.load_template(template_name)
-            if template:
-                score = self._calculate_match_score(sample_data, template)
-                if score > best_score:
-                    best_score = score
-                    best_match = template_name
+    def detect_port_templates(self, ports: List, deadline: float,
+                              cache: Optional[PortMappingCache] = None) -> Dict[str, str]:
+        """
+        Определяет шаблоны для всех портов параллельно с общим лимитом времени.
+        Устройства из кэша с тем же USB-идентификатором не опрашиваются повторно
+        """
+        port_templates: Dict[str, str] = {}
+        known_templates = set(self.template_manager.list_templates())
+        to_detect = []
         
-        # Минимальный порог совпадения - 30%
-        return best_match if best_score >= 0.3 else None
-    
-    def _calculate_match_score(self, sample_data: List[str], template: TemplateConfig) -> float:
-        """Вычисляет score совпадения данных с шаблоном"""
-        if not sample_data:
-            return 0.0
+        for port_info in ports:
+            hw_id = hardware_id(port_info)
+            cached_template = cache.get(hw_id) if cache else None
+            if cached_template in known_templates:
+                port_templates[port_info.device] = cached_template
+                logging.info(f"Порт {port_info.device} → Шаблон: {cached_template} (устройство {hw_id} из кэша)")
+            else:
+                to_detect.append(port_info)
         
-        # Собираем все expected поля из шаблона
-        expected_fields = set()
-        for sensor in template.sensors:
-            for field in sensor.fields:
-                expected_fields.add(field.source)
+        if not to_detect:
+            return port_templates
         
-        if not expected_fields:
-            return 0.0
+        logging.info(f"Автоопределение шаблонов для портов: {[p.device for p in to_detect]}")
+        executor = ThreadPoolExecutor(max_workers=len(to_detect), thread_name_prefix="detect")
+        futures = {executor.submit(self.auto_detect_port_template, p.device): p for p in to_detect}
+        done, not_done = wait(futures, timeout=deadline)
+        # Не дожидаемся зависших портов: они закроются сами по своему таймауту чтения
+        executor.shutdown(wait=False, cancel_futures=True)
         
-        # Анализируем каждую строку данных
-        total_score = 0.0
-        lines_analyzed = 0
+        for future in not_done:
+            logging.warning(f"Порт {futures[future].device} не определился за {deadline} с")
         
-        for data_line in sample_data:
-            if not data_line:
+        for future in done:
+            port_info = futures[future]
+            template_name = future.result()
+            if not template_name:
                 continue
-                
-            line_score = 0.0
-            found_fields = 0
-            
-            # Проверяем наличие expected полей в строке
-            for field in expected_fields:
-                if field in data_line:
-                    found_fields += 1
-            
-            # Score для этой строки
-            if expected_fields:
-                line_score = found_fields / len(expected_fields)
-            
-            total_score += line_score
-            lines_analyzed += 1
+            port_templates[port_info.device] = template_name
+            hw_id = hardware_id(port_info)
+            if cache and hw_id:
+                cache.set(hw_id, port_info.device, template_name)
+        
+        if cache:
+            cache.save()
+        return port_templates
+    
+    def _get_signature_index(self) -> TemplateSignatureIndex:
+        """Индекс сигнатур; перестраивается только при изменении набора шаблонов"""
+        template_names = set(self.template_manager.list_templates())
+        if self._signature_index is None or template_names != self._indexed_templates:
+            index = TemplateSignatureIndex()
+            for template_name in template_names:
+                template = self.template_manager.load_template(template_name)
+                if template:
+                    index.add(template_name, template)
+            self._signature_index = index
+            self._indexed_templates = template_names
+            logging.debug(f"Индекс сигнатур построен для шаблонов: {sorted(template_names)}")
+        return self._signature_index
+    
+    def invalidate_signature_index(self):
+        """Сбрасывает индекс сигнатур (после изменения содержимого шаблона)"""
+        self._signature_index = None
+    
+    def _find_matching_template(self, sample_data: List[str]) -> Optional[str]:
+        """Ищет подходящий шаблон для данных по индексу сигнатур"""
+        scores = self._get_signature_index().scores(sample_data)
+        if not scores:
+            return None
         
-        return total_score / lines_analyzed if lines_analyzed > 0 else 0.0
+        best_match = max(scores, key=scores.get)
+        # Минимальный порог совпадения - 30%
+        return best_match if scores[best_match] >= 0.3 else None
     
     def assign_template_to_port(self, port_name: str, template_name: str) -> bool:
         """Привязывает шаблон к порту"""
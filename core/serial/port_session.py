@@ -0,0 +1,456 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Type
+import serial
+
+from core.serial.port_devices_functions import (
+    open_port,
+    close_port,
+    perform_handshake,
+    HandshakeStatus,
+)
+from core.utils.metrics import HANDSHAKES, FRAME_ERRORS
+from core.serial.async_serial import (
+    AsyncSerialStream,
+    async_open_port,
+    async_perform_handshake,
+)
+
+DATA_REQUEST = "DATA_REQUEST\n"
+CONNECTION_LOST = "CONNECTION_LOST"
+
+# Служебные сообщения скетча, которые не являются данными датчиков
+SERVICE_MESSAGES = ('HANDSHAKE', 'ARDUINO_READY', 'ARDUINO_WAITING', 'PONG')
+
+
+class PortSession:
+    """
+    Долгоживущее соединение с устройством на одном порту.
+    Порт открывается и проходит рукопожатие один раз, затем сессия
+    обслуживает повторные запросы DATA_REQUEST на том же объекте serial.Serial.
+    Повторное рукопожатие выполняется только после CONNECTION_LOST или ошибки ввода-вывода.
+    """
+
+    def __init__(self, port_name: str, baudrate: int = 115200,
+                 timeout: int = 1, handshake_timeout: int = 3):
+        self.port_name = port_name
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.handshake_timeout = handshake_timeout
+        self.serial: Optional[serial.Serial] = None
+        self.handshake_required = True
+        # Непрочитанный хвост бинарного потока между вызовами read_frames
+        self._frame_buffer = bytearray()
+        # Чтение выполняется в пуле потоков; после таймаута предыдущий вызов
+        # может ещё работать, поэтому доступ к порту сериализуется
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self.serial) and self.serial.is_open
+
+    def open(self) -> bool:
+        """Открывает порт и выполняет рукопожатие"""
+        ser = open_port(self.port_name, self.baudrate, self.timeout, self.handshake_timeout)
+        HANDSHAKES.inc(port=self.port_name, kind="open", result="ok" if ser else "failed")
+        if not ser:
+            self.serial = None
+            return False
+        self.serial = ser
+        self.handshake_required = False
+        return True
+
+    def handshake(self) -> bool:
+        """Повторяет рукопожатие на уже открытом порту"""
+        logging.info(f"Повторное рукопожатие с {self.port_name}")
+        result = perform_handshake(self.serial, self.handshake_timeout)
+        HANDSHAKES.inc(port=self.port_name, kind="retry", result=str(result))
+        if result == HandshakeStatus.SUCCESS:
+            self.handshake_required = False
+            return True
+        logging.warning(f"Повторное рукопожатие с {self.port_name} не удалось: {result}")
+        self.close()
+        return False
+
+    def ensure_ready(self) -> bool:
+        """Гарантирует, что порт открыт и рукопожатие выполнено"""
+        if not self.is_open:
+            return self.open()
+        if self.handshake_required:
+            return self.handshake()
+        return True
+
+    def close(self):
+        """Закрывает порт, следующий запрос откроет его заново"""
+        if self.serial:
+            close_port(self.serial)
+        self.serial = None
+        self.handshake_required = True
+        self._frame_buffer.clear()
+
+    def _classify_line(self, raw_line: bytes) -> Optional[str]:
+        """Возвращает строку данных или None для служебных сообщений"""
+        decoded_data = raw_line.decode('utf-8', errors='ignore').strip()
+        if not decoded_data:
+            return None
+        if decoded_data == CONNECTION_LOST:
+            logging.warning(f"Устройство на {self.port_name} сообщило о потере соединения")
+            self.handshake_required = True
+            return None
+        if any(x in decoded_data for x in SERVICE_MESSAGES):
+            logging.debug(f"Пропускаем служебное сообщение: {decoded_data}")
+            return None
+        return decoded_data
+
+    def _discard_stale_input(self):
+        """
+        Отбрасывает то, что пришло до запроса: иначе read_data вернул бы старую строку
+        вместо ответа на DATA_REQUEST. CONNECTION_LOST среди отброшенного учитывается
+        """
+        waiting = self.serial.in_waiting
+        stale = self.serial.read(waiting) if waiting else b''
+        if CONNECTION_LOST.encode('utf-8') in stale:
+            logging.warning(f"Устройство на {self.port_name} сообщило о потере соединения")
+            self.handshake_required = True
+
+    def _read_data_once(self, request: bool, max_attempts: int) -> Optional[str]:
+        if request:
+            self._discard_stale_input()
+            if self.handshake_required:
+                return None
+            self.serial.write(DATA_REQUEST.encode('utf-8'))
+
+        for attempt in range(max_attempts):
+            raw_line = self.serial.readline()
+            if not raw_line:
+                continue
+            data = self._classify_line(raw_line)
+            if data:
+                return data
+            if self.handshake_required:
+                return None
+        return None
+
+    def _collect_lines(self, raw_lines: List[bytes], received_at: datetime,
+                       burst: List[Tuple[datetime, str]]):
+        """Добавляет в пачку строки данных с временем приема, пропуская служебные"""
+        for raw_line in raw_lines:
+            data = self._classify_line(raw_line)
+            if data:
+                burst.append((received_at, data))
+
+    def _read_burst_once(self, request: bool, max_attempts: int) -> List[Tuple[datetime, str]]:
+        if request:
+            self.serial.write(DATA_REQUEST.encode('utf-8'))
+
+        burst: List[Tuple[datetime, str]] = []
+        # Ждем первую строку данных...
+        for attempt in range(max_attempts):
+            raw_line = self.serial.readline()
+            if raw_line:
+                self._collect_lines([raw_line], datetime.now(), burst)
+            if burst or self.handshake_required:
+                break
+        # ...затем забираем всё, что устройство успело накопить в буфере порта
+        while burst and not self.handshake_required and self.serial.in_waiting:
+            raw_line = self.serial.readline()
+            if not raw_line:
+                break
+            self._collect_lines([raw_line], datetime.now(), burst)
+        return burst
+
+    def read_burst(self, request: bool = True, max_attempts: int = 5) -> List[Tuple[datetime, str]]:
+        """
+        Как read_data, но возвращает все накопленные в порту строки данных
+        вместе со временем их приема: [(время, строка), ...].
+        Ограничение синхронного пути (Windows, пул потоков): порт читается только
+        во время опроса, поэтому строки, накопленные между опросами, получают время
+        их вычитывания из буфера порта, а не прихода. Точное время по приходу дает
+        AsyncPortSession.read_burst_async
+        """
+        with self._lock:
+            for retry in range(2):
+                if not self.ensure_ready():
+                    return []
+                try:
+                    burst = self._read_burst_once(request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if burst or not self.handshake_required:
+                    return burst
+            return []
+
+    def read_data(self, request: bool = True, max_attempts: int = 5) -> Optional[str]:
+        """
+        Запрашивает у устройства строку данных (DATA_REQUEST) и возвращает её.
+        При потере соединения или ошибке ввода-вывода восстанавливает сессию
+        и повторяет запрос один раз.
+        """
+        with self._lock:
+            for retry in range(2):
+                if not self.ensure_ready():
+                    return None
+                try:
+                    data = self._read_data_once(request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if data or not self.handshake_required:
+                    return data
+            return None
+
+
+    def _extract_frames(self, frame_spec, chunk: bytes, received_at: datetime,
+                        frames: List[Tuple[datetime, bytes]]):
+        """
+        Добавляет принятые байты в буфер кадров, а нагрузки завершенных ими кадров -
+        в frames с временем приема фрагмента, которым кадр завершился
+        """
+        self._frame_buffer.extend(chunk)
+        errors = {}
+        payloads, noise = frame_spec.extract(self._frame_buffer, errors)
+        for reason, count in errors.items():
+            FRAME_ERRORS.inc(count, port=self.port_name, reason=reason)
+        if CONNECTION_LOST.encode('utf-8') in noise:
+            logging.warning(f"Устройство на {self.port_name} сообщило о потере соединения")
+            self.handshake_required = True
+            self._frame_buffer.clear()
+            return
+        frames.extend((received_at, payload) for payload in payloads)
+
+    def _read_frames_once(self, frame_spec, request: bool,
+                          max_attempts: int) -> List[Tuple[datetime, bytes]]:
+        if request:
+            self.serial.write(DATA_REQUEST.encode('utf-8'))
+
+        frames: List[Tuple[datetime, bytes]] = []
+        for attempt in range(max_attempts):
+            # Ждем хотя бы один байт (таймаут порта), затем забираем всё, что уже пришло
+            chunk = self.serial.read(max(1, self.serial.in_waiting))
+            if not chunk:
+                continue
+            self._extract_frames(frame_spec, chunk, datetime.now(), frames)
+            if frames or self.handshake_required:
+                break
+        return frames
+
+    def read_frames(self, frame_spec, request: bool = True,
+                    max_attempts: int = 5) -> List[Tuple[datetime, bytes]]:
+        """
+        Запрашивает у устройства бинарные кадры и возвращает их нагрузки
+        со временем приема: [(время, нагрузка), ...].
+        Текстовые служебные сообщения между кадрами отбрасываются.
+        Как и в read_burst, время приема - момент вычитывания из буфера порта
+        """
+        with self._lock:
+            for retry in range(2):
+                if not self.ensure_ready():
+                    return []
+                try:
+                    frames = self._read_frames_once(frame_spec, request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if frames or not self.handshake_required:
+                    return frames
+            return []
+
+
+class AsyncPortSession(PortSession):
+    """
+    Сессия порта для цикла событий: рукопожатие, запись DATA_REQUEST и чтение
+    строк выполняются через AsyncSerialStream без потоков исполнителя
+    """
+
+    def __init__(self, port_name: str, baudrate: int = 115200,
+                 timeout: int = 1, handshake_timeout: int = 3):
+        super().__init__(port_name, baudrate, timeout, handshake_timeout)
+        self.stream: Optional[AsyncSerialStream] = None
+        self._async_lock = asyncio.Lock()
+
+    async def open_async(self) -> bool:
+        """Открывает порт и выполняет рукопожатие"""
+        self.stream = await async_open_port(self.port_name, self.baudrate, self.handshake_timeout)
+        HANDSHAKES.inc(port=self.port_name, kind="open", result="ok" if self.stream else "failed")
+        if not self.stream:
+            self.serial = None
+            return False
+        self.serial = self.stream.serial
+        self.handshake_required = False
+        self.stream.start_listening()
+        return True
+
+    async def handshake_async(self) -> bool:
+        """Повторяет рукопожатие на уже открытом порту"""
+        logging.info(f"Повторное рукопожатие с {self.port_name}")
+        result = await async_perform_handshake(self.stream, self.handshake_timeout)
+        HANDSHAKES.inc(port=self.port_name, kind="retry", result=str(result))
+        if result == HandshakeStatus.SUCCESS:
+            self.handshake_required = False
+            return True
+        logging.warning(f"Повторное рукопожатие с {self.port_name} не удалось: {result}")
+        self.close()
+        return False
+
+    async def ensure_ready_async(self) -> bool:
+        """Гарантирует, что порт открыт и рукопожатие выполнено"""
+        if not self.is_open:
+            return await self.open_async()
+        if self.handshake_required:
+            return await self.handshake_async()
+        return True
+
+    def close(self):
+        if self.stream:
+            # Обработчик готовности снимается до закрытия дескриптора
+            self.stream.close()
+        super().close()
+        self.stream = None
+
+    def _discard_stale_lines(self):
+        """Асинхронный аналог _discard_stale_input: строки до запроса отбрасываются"""
+        for _, raw_line in self.stream.drain_lines():
+            # Разбор только ради CONNECTION_LOST, данные устарели
+            self._classify_line(raw_line)
+        self.stream.reset_input_buffer()
+
+    async def _read_data_once_async(self, request: bool, max_attempts: int) -> Optional[str]:
+        if request:
+            self._discard_stale_lines()
+            if self.handshake_required:
+                return None
+            await self.stream.write(DATA_REQUEST.encode('utf-8'))
+
+        for attempt in range(max_attempts):
+            raw_line = await self.stream.readline(self.timeout)
+            if not raw_line:
+                continue
+            data = self._classify_line(raw_line)
+            if data:
+                return data
+            if self.handshake_required:
+                return None
+        return None
+
+    async def _read_burst_once_async(self, request: bool,
+                                     max_attempts: int) -> List[Tuple[datetime, str]]:
+        if request:
+            await self.stream.write(DATA_REQUEST.encode('utf-8'))
+
+        burst: List[Tuple[datetime, str]] = []
+        for attempt in range(max_attempts):
+            stamped = await self.stream.read_stamped_line(self.timeout)
+            if stamped:
+                self._collect_lines([stamped[1]], stamped[0], burst)
+            if burst or self.handshake_required:
+                break
+        if burst and not self.handshake_required:
+            # Строки, пришедшие между опросами, - со своим временем приема
+            for received_at, raw_line in self.stream.drain_lines():
+                self._collect_lines([raw_line], received_at, burst)
+        return burst
+
+    async def read_burst_async(self, request: bool = True,
+                               max_attempts: int = 5) -> List[Tuple[datetime, str]]:
+        """Асинхронный аналог read_burst"""
+        async with self._async_lock:
+            for retry in range(2):
+                if not await self.ensure_ready_async():
+                    return []
+                try:
+                    burst = await self._read_burst_once_async(request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if burst or not self.handshake_required:
+                    return burst
+            return []
+
+    async def read_data_async(self, request: bool = True, max_attempts: int = 5) -> Optional[str]:
+        """Асинхронный аналог read_data"""
+        async with self._async_lock:
+            for retry in range(2):
+                if not await self.ensure_ready_async():
+                    return None
+                try:
+                    data = await self._read_data_once_async(request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if data or not self.handshake_required:
+                    return data
+            return None
+
+    async def _read_frames_once_async(self, frame_spec, request: bool,
+                                      max_attempts: int) -> List[Tuple[datetime, bytes]]:
+        if request:
+            await self.stream.write(DATA_REQUEST.encode('utf-8'))
+
+        frames: List[Tuple[datetime, bytes]] = []
+        for attempt in range(max_attempts):
+            # Фрагменты, пришедшие между опросами, разбираются по одному со своим временем приема
+            for received_at, chunk in await self.stream.read_stamped_chunks(self.timeout):
+                self._extract_frames(frame_spec, chunk, received_at, frames)
+                if self.handshake_required:
+                    return []
+            if frames:
+                break
+        return frames
+
+    async def read_frames_async(self, frame_spec, request: bool = True,
+                                max_attempts: int = 5) -> List[Tuple[datetime, bytes]]:
+        """Асинхронный аналог read_frames"""
+        async with self._async_lock:
+            for retry in range(2):
+                if not await self.ensure_ready_async():
+                    return []
+                try:
+                    frames = await self._read_frames_once_async(frame_spec, request, max_attempts)
+                except (serial.SerialException, OSError) as e:
+                    logging.error(f"Ошибка ввода-вывода на порту {self.port_name}: {e}")
+                    self.close()
+                    continue
+
+                if frames or not self.handshake_required:
+                    return frames
+            return []
+
+
+_sessions: Dict[str, PortSession] = {}
+
+
+def get_port_session(port_name: str, baudrate: int = 115200,
+                     timeout: int = 1, handshake_timeout: int = 3,
+                     session_class: Type[PortSession] = PortSession) -> PortSession:
+    """
+    Возвращает сессию для порта, создавая её при первом обращении.
+    Класс сессии должен совпадать точно: AsyncPortSession - подкласс PortSession,
+    но её порт открыт в неблокирующем режиме и не годится для синхронного чтения
+    """
+    session = _sessions.get(port_name)
+    if type(session) is not session_class:
+        if session is not None:
+            session.close()
+        session = session_class(port_name, baudrate, timeout, handshake_timeout)
+        _sessions[port_name] = session
+    return session
+
+
+def close_all_sessions():
+    """Закрывает все открытые сессии портов"""
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
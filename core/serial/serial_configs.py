@@ -0,0 +1,17 @@
+from core.logger.logger import _Configs
+
+
+class SerialConfigs(_Configs):
+    _config_name = 'serial'
+
+    @classmethod
+    def detect_deadline(cls) -> float:
+        return float(cls._option('detect_deadline'))
+
+    @classmethod
+    def port_cache(cls) -> str:
+        return str(cls._option('port_cache'))
+
+    @classmethod
+    def rescan_interval(cls) -> float:
+        return float(cls._option('rescan_interval'))
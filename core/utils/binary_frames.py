@@ -0,0 +1,134 @@
+import binascii
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.parser.template_manager import TemplateConfig
+
+# Кадр: синхрослово | длина полезной нагрузки (1 байт) | нагрузка | CRC16 (по длине и нагрузке)
+MAX_PAYLOAD = 255
+
+
+def crc16(data: bytes) -> int:
+    """CRC-16/CCITT-FALSE (полином 0x1021, начальное значение 0xFFFF)"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _values_count(fmt: str) -> int:
+    """Сколько значений дает формат struct (строки 's' считаются одним значением)"""
+    return len(struct.unpack(fmt, bytes(struct.calcsize(fmt))))
+
+
+class FrameSpec:
+    """
+    Скомпилированное описание бинарного кадра шаблона.
+    Нагрузка разбирается одним заранее созданным struct.Struct,
+    пачка кадров одинаковой длины - одним iter_unpack
+    """
+
+    def __init__(self, sync_word: bytes, byte_order: str, crc: str,
+                 sensors: Sequence[Tuple[str, str]]):
+        if crc not in ('crc16', 'none'):
+            raise ValueError(f"Неподдерживаемый тип CRC: {crc}")
+        self.sync_word = sync_word
+        self.crc = crc
+        self.crc_size = 2 if crc == 'crc16' else 0
+        self.payload = struct.Struct(byte_order + ''.join(fmt for _, fmt in sensors))
+        if self.payload.size > MAX_PAYLOAD:
+            raise ValueError(f"Нагрузка кадра {self.payload.size} байт больше {MAX_PAYLOAD}")
+        self._crc_struct = struct.Struct(byte_order + 'H')
+
+        # sensor_id -> срез значений кадра
+        self.slices: List[Tuple[str, slice]] = []
+        offset = 0
+        for sensor_id, fmt in sensors:
+            count = _values_count(byte_order + fmt)
+            self.slices.append((sensor_id, slice(offset, offset + count)))
+            offset += count
+
+    @property
+    def frame_size(self) -> int:
+        return len(self.sync_word) + 1 + self.payload.size + self.crc_size
+
+    def encode(self, values: Sequence) -> bytes:
+        """Собирает кадр из значений (для симуляторов и тестов)"""
+        body = bytes([self.payload.size]) + self.payload.pack(*values)
+        frame = self.sync_word + body
+        if self.crc_size:
+            frame += self._crc_struct.pack(crc16(body))
+        return frame
+
+    def extract(self, buffer: bytearray,
+                errors: Optional[Dict[str, int]] = None) -> Tuple[List[bytes], bytes]:
+        """
+        Вырезает из буфера все целые кадры с верной CRC.
+        Возвращает (нагрузки, отброшенные байты); неполный кадр остается в буфере.
+        В errors считаются отброшенные кадры по причине: length, crc
+        """
+        payloads = []
+        noise = bytearray()
+        sync = self.sync_word
+        while True:
+            start = buffer.find(sync)
+            if start < 0:
+                # Хвост может быть началом синхрослова
+                keep = len(sync) - 1
+                cut = max(0, len(buffer) - keep)
+                noise += buffer[:cut]
+                del buffer[:cut]
+                break
+            noise += buffer[:start]
+            del buffer[:start]
+            if len(buffer) < self.frame_size:
+                break
+
+            length = buffer[len(sync)]
+            body_end = len(sync) + 1 + length
+            if length != self.payload.size:
+                # Ложное синхрослово в данных - ищем следующее
+                if errors is not None:
+                    errors['length'] = errors.get('length', 0) + 1
+                noise += buffer[:1]
+                del buffer[:1]
+                continue
+            if self.crc_size:
+                (received,) = self._crc_struct.unpack_from(buffer, body_end)
+                if received != crc16(bytes(buffer[len(sync):body_end])):
+                    if errors is not None:
+                        errors['crc'] = errors.get('crc', 0) + 1
+                    noise += buffer[:1]
+                    del buffer[:1]
+                    continue
+            payloads.append(bytes(buffer[len(sync) + 1:body_end]))
+            del buffer[:body_end + self.crc_size]
+        return payloads, bytes(noise)
+
+    def decode(self, payloads: List[bytes]) -> List[tuple]:
+        """Распаковывает нагрузки кадров в кортежи значений"""
+        if not payloads:
+            return []
+        return list(self.payload.iter_unpack(b''.join(payloads)))
+
+
+def compile_frame(template: TemplateConfig) -> Optional[FrameSpec]:
+    """Компилирует описание кадра шаблона или возвращает None для текстовых шаблонов"""
+    parsing = template.parsing
+    if parsing.format != 'binary':
+        return None
+    if parsing.binary is None or not parsing.binary.sensors:
+        raise ValueError(f"Шаблон {template.template_name}: для format: binary нужен раздел parsing.binary.sensors")
+
+    known_sensors = {sensor.sensor_id: sensor for sensor in template.sensors}
+    for sensor_id, fmt in parsing.binary.sensors.items():
+        sensor = known_sensors.get(sensor_id)
+        if sensor is None:
+            raise ValueError(f"Шаблон {template.template_name}: датчик {sensor_id} из кадра не описан")
+        if _values_count(parsing.binary.byte_order + fmt) > len(sensor.fields):
+            raise ValueError(f"Шаблон {template.template_name}: формат {fmt} датчика {sensor_id} "
+                             f"длиннее списка полей")
+
+    return FrameSpec(
+        sync_word=bytes.fromhex(parsing.binary.sync_word),
+        byte_order=parsing.binary.byte_order,
+        crc=parsing.binary.crc,
+        sensors=list(parsing.binary.sensors.items()),
+    )
@@ -0,0 +1,30 @@
+import threading
+from typing import Any, Callable
+
+
+class LazyObject:
+    """
+    Заместитель объекта, который создается фабрикой при первом обращении к атрибуту.
+    Позволяет связать представления с менеджерами при импорте, не открывая БД и порты
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _get_instance(self):
+        instance = object.__getattribute__(self, '_instance')
+        if instance is None:
+            with object.__getattribute__(self, '_lock'):
+                instance = object.__getattribute__(self, '_instance')
+                if instance is None:
+                    instance = object.__getattribute__(self, '_factory')()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    def __getattr__(self, name: str):
+        return getattr(self._get_instance(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._get_instance(), name, value)
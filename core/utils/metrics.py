@@ -0,0 +1,240 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Границы гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def dump(self) -> List[list]:
+        """Значения метрики для передачи в другой процесс: [[метки, значение], ...]"""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    @abstractmethod
+    def _combine(self, own, external):
+        """Объединяет значение процесса со значением из другого процесса"""
+
+    def _items(self, external: Optional[List[list]] = None) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            values = {key: self._copy(value) for key, value in self._values.items()}
+        for key, value in external or ():
+            key = tuple(key)
+            values[key] = self._combine(values[key], value) if key in values else value
+        return list(values.items())
+
+    def samples(self, external: Optional[List[list]] = None) -> List[str]:
+        return [f"{self.name}{self._labels_text(key)} {_format_value(value)}"
+                for key, value in self._items(external)]
+
+    def render(self, external: Optional[List[list]] = None) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"] + self.samples(external)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _combine(self, own, external):
+        return own + external
+
+
+class Gauge(_Metric):
+    """Текущее значение (глубина очереди и т.п.)"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _combine(self, own, external):
+        # Значение ставит процесс, который ведет метрику
+        return external
+
+
+class AgeGauge(Gauge):
+    """Сколько секунд прошло с последнего события; считается в момент запроса метрик"""
+
+    def touch(self, **labels):
+        self.set(time.time(), **labels)
+
+    def _combine(self, own, external):
+        return max(own, external)
+
+    def samples(self, external: Optional[List[list]] = None) -> List[str]:
+        now = time.time()
+        return [f"{self.name}{self._labels_text(key)} {_format_value(round(now - value, 3))}"
+                for key, value in self._items(external)]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [счетчики по корзинам, сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def _combine(self, own, external):
+        return [[a + b for a, b in zip(own[0], external[0])], own[1] + external[1], own[2] + external[2]]
+
+    def samples(self, external: Optional[List[list]] = None) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._items(external):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self._labels_text(key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels_text(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels_text(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def age_gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> AgeGauge:
+        return self.register(AgeGauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def dump(self) -> Dict[str, List[list]]:
+        """Значения всех метрик для передачи в другой процесс"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+    def render(self, external: Optional[Dict[str, List[list]]] = None) -> str:
+        """
+        Текст для /metrics. external - dump() реестра другого процесса
+        (процесса сбора данных): его значения объединяются со своими
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        external = external or {}
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(external.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+# Метрики процесса сбора данных
+metrics = MetricsRegistry()
+
+PORT_READS = metrics.counter(
+    "gateway_port_reads_total", "Опросы порта по результату (ok, no_data, timeout, error)",
+    ("port", "result"))
+LINES_RECEIVED = metrics.counter(
+    "gateway_lines_received_total", "Принятые строки или кадры данных", ("port", "template"))
+PARSE_FAILURES = metrics.counter(
+    "gateway_parse_failures_total", "Строки, которые не удалось разобрать по шаблону", ("port", "template"))
+FRAME_ERRORS = metrics.counter(
+    "gateway_frame_errors_total", "Отброшенные бинарные кадры по причине (length, crc)", ("port", "reason"))
+HANDSHAKES = metrics.counter(
+    "gateway_handshakes_total", "Рукопожатия (первичные и повторные) по результату", ("port", "kind", "result"))
+POLL_DURATION = metrics.histogram(
+    "gateway_port_poll_seconds", "Длительность опроса порта", ("port",))
+LAST_READING = metrics.age_gauge(
+    "gateway_seconds_since_last_reading", "Секунд с последнего принятого показания", ("port", "template"))
+QUEUE_DEPTH = metrics.gauge(
+    "gateway_write_queue_depth", "Строк в буфере отложенной записи")
+FLUSH_DURATION = metrics.histogram(
+    "gateway_db_flush_seconds", "Длительность пакетной записи в БД", ("template",))
+BATCH_ROWS = metrics.histogram(
+    "gateway_db_batch_rows", "Строк в одной пакетной записи", ("template",),
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000))
+ROWS_WRITTEN = metrics.counter(
+    "gateway_db_rows_written_total", "Записано строк в БД", ("template",))
+ROWS_LOST = metrics.counter(
+    "gateway_db_rows_lost_total", "Строк потеряно из-за ошибок записи", ("template",))
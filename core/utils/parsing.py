@@ -1,5 +1,7 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from datetime import datetime
 from core.parser.template_manager import TemplateManager, TemplateConfig
+from core.utils.binary_frames import compile_frame
 import logging
 
 def parse_sensor_data(data_string: str, template: TemplateConfig) -> Optional[Dict[str, Any]]:
@@ -41,4 +43,152 @@ def parse_sensor_data(data_string: str, template: TemplateConfig) -> Optional[Di
         
     except Exception as e:
         logging.error(f"Ошибка парсинга данных '{data_string}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+def _to_int(value: str) -> int:
+    return int(float(value)) if '.' in value else int(value)
+
+
+def _to_bool(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'on', 'yes')
+
+
+# Преобразователи значений по db_type поля шаблона
+TYPE_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'REAL': float,
+    'FLOAT': float,
+    'INTEGER': _to_int,
+    'BOOLEAN': _to_bool,
+    'TEXT': str,
+    'STRING': str,
+    'DATETIME': str,
+}
+
+# Служебные колонки, которые есть в каждой таблице датчика
+BASE_COLUMNS = ('timestamp', 'sensor_id', 'port_name')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class CompiledSensor:
+    """Предрассчитанное описание датчика: колонки, соответствие source→колонка и SQL вставки"""
+
+    __slots__ = ('template_name', 'sensor_id', 'table_name', 'columns', 'fields', 'insert_sql')
+
+    def __init__(self, template_name: str, sensor_config):
+        self.template_name = template_name
+        self.sensor_id = sensor_config.sensor_id
+        self.table_name = sensor_config.table_name
+        self.columns = BASE_COLUMNS + tuple(f.name for f in sensor_config.fields)
+        # source -> (индекс значения в строке, преобразователь типа)
+        self.fields: Dict[str, Tuple[int, Callable[[str], Any]]] = {
+            field.source: (index, TYPE_CONVERTERS.get(field.db_type.upper(), str))
+            for index, field in enumerate(sensor_config.fields)
+        }
+        column_list = ', '.join(f'"{column}"' for column in self.columns)
+        placeholders = ', '.join('?' for _ in self.columns)
+        self.insert_sql = f'INSERT INTO "{self.table_name}" ({column_list}) VALUES ({placeholders})'
+
+
+class CompiledTemplate:
+    """
+    Шаблон, подготовленный для горячего цикла: разбор строки за один проход
+    сразу в кортежи, готовые для executemany
+    """
+
+    def __init__(self, template: TemplateConfig):
+        self.template = template
+        self.template_name = template.template_name
+        self.delimiter = template.parsing.delimiter
+        self.key_value_separator = template.parsing.key_value_separator
+        self.sensors: Dict[str, CompiledSensor] = {
+            sensor.sensor_id: CompiledSensor(template.template_name, sensor)
+            for sensor in template.sensors
+        }
+        self.frame = compile_frame(template)
+
+    def parse_rows(self, data_string: str, timestamp: datetime,
+                   port_name: Optional[str] = None) -> List[Tuple[CompiledSensor, tuple]]:
+        """Превращает сырую строку в список (датчик, строка для вставки)"""
+        rows = []
+        if not data_string:
+            return rows
+
+        prefix = (timestamp.strftime(TIMESTAMP_FORMAT),)
+        separator = self.key_value_separator
+        sensor = None
+        values = None
+
+        for part in data_string.split(self.delimiter):
+            key, found, value = part.partition(separator)
+            if not found:
+                continue
+            key = key.strip()
+
+            if key == "Sensor":
+                if sensor is not None:
+                    rows.append((sensor, prefix + (sensor.sensor_id, port_name) + tuple(values)))
+                sensor_id = value.strip()
+                sensor = self.sensors.get(sensor_id)
+                if sensor is None:
+                    logging.warning(f"Неизвестный сенсор {sensor_id}")
+                    continue
+                values = [None] * len(sensor.fields)
+            elif sensor is not None:
+                field = sensor.fields.get(key)
+                if field is None:
+                    continue
+                index, convert = field
+                try:
+                    values[index] = convert(value.strip())
+                except (ValueError, TypeError):
+                    logging.debug(f"Некорректное значение {key}={value!r} датчика {sensor.sensor_id}")
+
+        if sensor is not None:
+            rows.append((sensor, prefix + (sensor.sensor_id, port_name) + tuple(values)))
+        return rows
+
+
+    def parse_frames(self, frames: List[Tuple[datetime, bytes]],
+                     port_name: Optional[str] = None) -> List[Tuple[CompiledSensor, tuple]]:
+        """Превращает бинарные кадры (время приема, нагрузка) в список (датчик, строка для вставки)"""
+        rows = []
+        layout = [(self.sensors[sensor_id], part) for sensor_id, part in self.frame.slices]
+        timestamps = [received_at.strftime(TIMESTAMP_FORMAT) for received_at, _ in frames]
+        decoded = self.frame.decode([payload for _, payload in frames])
+        for timestamp, values in zip(timestamps, decoded):
+            prefix = (timestamp,)
+            for sensor, part in layout:
+                sensor_values = values[part]
+                # Поля, которых нет в кадре, остаются пустыми
+                padding = (None,) * (len(sensor.fields) - len(sensor_values))
+                rows.append((sensor, prefix + (sensor.sensor_id, port_name) + sensor_values + padding))
+        return rows
+
+
+def compile_template(template: TemplateConfig) -> CompiledTemplate:
+    """Компилирует шаблон в объект разбора для горячего цикла"""
+    return CompiledTemplate(template)
+
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_interval(value: str) -> int:
+    """Переводит интервал вида '60', '30s', '1m', '1h', '1d' в секунды"""
+    value = str(value).strip().lower()
+    if value and value[-1] in INTERVAL_UNITS:
+        seconds = int(value[:-1]) * INTERVAL_UNITS[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds <= 0:
+        raise ValueError(f"Интервал должен быть положительным: {value}")
+    return seconds
+
+
+def format_interval(seconds: int) -> str:
+    """Обратное к parse_interval: 60 -> '1m', 3600 -> '1h', 90 -> '90s'"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
@@ -0,0 +1,193 @@
+"""
+Симулятор устройств на псевдотерминалах (Linux/macOS).
+
+Каждое виртуальное устройство ведет себя как скетч sketch/sketch_sep2a:
+рукопожатие HANDSHAKE_REQ/HANDSHAKE_ACK, ответ на DATA_REQUEST и PING,
+автономная отправка данных с заданной частотой при активном соединении,
+CONNECTION_LOST после паузы мастера и ARDUINO_WAITING без соединения.
+
+Пример:
+    python device_simulator.py --ports 4 --rate 50
+"""
+import argparse
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+from binascii import crc_hqx
+from typing import List, Optional
+
+CONNECTION_TIMEOUT = 3.0  # Как CONNECTION_TIMEOUT в скетче, секунды
+WAITING_INTERVAL = 5.0  # Период ARDUINO_WAITING без соединения, секунды
+FRAME_SYNC = b'\xaa\x55'
+FRAME_STRUCT = struct.Struct('<ffff')
+
+
+class SimulatedDevice:
+    """Одно виртуальное устройство на паре pty: master у симулятора, slave - порт для шлюза"""
+
+    def __init__(self, rate: float = 1.0, boot_delay: float = 0.0,
+                 stamp_field: Optional[str] = None, binary: bool = False):
+        self.rate = rate
+        self.boot_delay = boot_delay
+        self.stamp_field = stamp_field
+        self.binary = binary
+        import tty  # Только POSIX
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        # Запись не блокирует симулятор, если шлюз не читает порт
+        os.set_blocking(self.master, False)
+        self.port_name = os.ttyname(self.slave)
+        self.connection_active = False
+        self.sent = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sim:{self.port_name}", daemon=True)
+        self._values = {'0x76': [23.0, 100000.0], '0x77': [15.0, 100500.0]}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(1)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _write(self, data: bytes):
+        try:
+            os.write(self.master, data)
+        except OSError:
+            # Буфер pty переполнен (порт никто не читает) - данные теряются, как на UART
+            pass
+
+    def _println(self, line: str):
+        self._write((line + "\r\n").encode('utf-8'))
+
+    def _next_values(self):
+        for values in self._values.values():
+            values[0] += random.uniform(-0.05, 0.05)
+            values[1] += random.uniform(-5, 5)
+        return self._values
+
+    def send_sensor_data(self):
+        values = self._next_values()
+        if self.binary:
+            body = bytes([FRAME_STRUCT.size]) + FRAME_STRUCT.pack(*values['0x76'], *values['0x77'])
+            # CRC-16/CCITT-FALSE, как в скетче
+            self._write(FRAME_SYNC + body + struct.pack('<H', crc_hqx(body, 0xFFFF)))
+        else:
+            stamp = f"{self.stamp_field}:{time.time():.6f};" if self.stamp_field else ""
+            self._println(
+                f"Sensor:0x76;Temperature:{values['0x76'][0]:.2f};Pressure:{values['0x76'][1]:.2f};{stamp}"
+                f"Sensor:0x77;Temperature:{values['0x77'][0]:.2f};Pressure:{values['0x77'][1]:.2f};"
+            )
+        self.sent += 1
+
+    def _handle_request(self, request: str):
+        if request == "HANDSHAKE_REQ":
+            self._println("HANDSHAKE_ACK")
+            self.connection_active = True
+        elif request == "DATA_REQUEST":
+            self.send_sensor_data()
+        elif request == "PING":
+            self._println("PONG")
+
+    def _run(self):
+        time.sleep(self.boot_delay)
+        self._println("Sensor:0x76;Status:OK;")
+        self._println("Sensor:0x77;Status:OK;")
+        self._println("ARDUINO_READY")
+
+        buffer = b''
+        now = time.monotonic()
+        last_master_activity = now
+        next_send = now
+        next_waiting = now + WAITING_INTERVAL
+        period = 1.0 / self.rate if self.rate > 0 else None
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if self.connection_active and period:
+                wait = max(0.0, next_send - now)
+            else:
+                wait = max(0.0, next_waiting - now)
+            try:
+                readable, _, _ = select.select([self.master], [], [], min(wait, 0.5))
+            except (OSError, ValueError):
+                return
+
+            if readable:
+                try:
+                    chunk = os.read(self.master, 1024)
+                except OSError:
+                    return
+                buffer += chunk
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    last_master_activity = time.monotonic()
+                    self._handle_request(line.decode('utf-8', errors='ignore').strip())
+
+            now = time.monotonic()
+            if self.connection_active and now - last_master_activity > CONNECTION_TIMEOUT:
+                self.connection_active = False
+                self._println("CONNECTION_LOST")
+
+            if self.connection_active and period and now >= next_send:
+                self.send_sensor_data()
+                # Без накопления долга: при отставании следующая отправка через период
+                next_send = max(next_send + period, now)
+            elif not self.connection_active and now >= next_waiting:
+                self._println("ARDUINO_WAITING")
+                next_waiting = now + WAITING_INTERVAL
+
+
+def start_devices(count: int, rate: float, boot_delay: float = 0.0,
+                  stamp_field: Optional[str] = None, binary: bool = False) -> List[SimulatedDevice]:
+    """Создает и запускает count виртуальных устройств"""
+    devices = [SimulatedDevice(rate, boot_delay, stamp_field, binary) for _ in range(count)]
+    for device in devices:
+        device.start()
+    return devices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор устройств на псевдотерминалах")
+    parser.add_argument('--ports', type=int, default=1, help='Число виртуальных устройств')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='Частота автономной отправки данных, строк в секунду на устройство')
+    parser.add_argument('--boot-delay', type=float, default=2.0,
+                        help='Задержка перед ARDUINO_READY, как delay(2000) в скетче')
+    parser.add_argument('--stamp-field', default=None,
+                        help='Добавлять в строку поле с временем отправки (для замера задержки)')
+    parser.add_argument('--binary', action='store_true', help='Отправлять бинарные кадры')
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        print("Симулятор использует pty и работает только на Linux/macOS")
+        sys.exit(1)
+
+    devices = start_devices(args.ports, args.rate, args.boot_delay, args.stamp_field, args.binary)
+    # Первая строка вывода - список портов, ее читает benchmark_ingestion.py
+    print("SIMULATOR_PORTS " + " ".join(device.port_name for device in devices), flush=True)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.stop()
+        print(f"Отправлено строк: {sum(device.sent for device in devices)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,46 +2,73 @@ import logging
 import serial
 from pathlib import Path
 import asyncio
-from typing import Dict
+from typing import Dict, Optional
 import os
 import sys
 import subprocess
 import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from config import settings
-from core.logger.logger import start as logger_init
-from core.parser.template_manager import TemplateManager
+from core.logger.logger import start as logger_init, set_log_context
+from core.parser.template_manager import TemplateManager, TemplateConfig
 from core.database.migration_manager import MigrationManager
 from core.database.db_manager import DatabaseManager
-from core.serial.port_manager import PortTemplateManager
+from core.serial.port_manager import PortTemplateManager, PortMappingCache
+from core.serial.serial_configs import SerialConfigs
 from core.database.data_manager import DataManager
-from core.serial.async_port_operations import async_read_with_handshake
+from core.database.db_configs import DatabaseConfigs
+from core.database.startup_manifest import StartupManifest
+from core.database.engines import dispose_engines
+from core.database.rollup import RollupEngine
+from core.serial.async_port_operations import async_read_burst, async_read_frames
+from core.serial.port_session import close_all_sessions
 from core.serial.port_devices_functions import read_line_from_port
+from core.live.hub import reading_hub
+from core.live.latest_cache import latest_values
+from core.live.ring_buffer import SharedRingBuffer, follow_ring
+from core.live.supervisor import ProcessSupervisor
+from core.live.shared_metrics import SharedMetricsSnapshot
+from core.utils.metrics import metrics, PORT_READS, POLL_DURATION
 
 def setup_databases():
     """Настраивает базы данных на основе шаблонов"""
     template_manager = TemplateManager()
     migration_manager = MigrationManager()
-    db_manager = DatabaseManager()
+    manifest = StartupManifest(DatabaseConfigs.startup_manifest())
+    # Менеджер БД нужен только при изменениях
+    db_manager = None
     
     for template_name in template_manager.list_templates():
+        file_signature = template_manager.file_signature(template_name)
+        if manifest.is_unchanged(template_name, file_signature):
+            # Файл шаблона, миграция и схема БД те же - шаблон не читается и не хешируется
+            logging.info(f"Шаблон {template_name} без изменений")
+            continue
+        
         result = migration_manager.check_template_changes(template_name)
         
         if result['has_changes']:
             logging.info(f"Обнаружены изменения в шаблоне {template_name}")
             
             # Валидируем изменения
-            changes = migration_manager.validate_changes(result['template'])
+            changes = migration_manager.validate_changes(result['template'], result.get('old_template'))
             
             if changes:
-                # Создаем/обновляем базу данных
-                if db_manager.create_database(result['template']):
+                db_manager = db_manager or DatabaseManager()
+                # Сначала меняем существующие таблицы (в т.ч. переименовываем), затем создаем новые
+                if (db_manager.migrate_database(result['template'], changes)
+                        and db_manager.create_database(result['template'])):
                     # Сохраняем миграцию
-                    migration_manager.create_migration(
+                    migration_file = migration_manager.create_migration(
                         result['template'], 
                         changes, 
                         result['action']
                     )
+                    if migration_file:
+                        record_manifest(manifest, migration_manager, template_name, result['template'],
+                                        file_signature, migration_file)
                     logging.info(f"База данных для {template_name} успешно настроена")
                 else:
                     logging.error(f"Ошибка настройки БД для {template_name}")
@@ -49,24 +76,47 @@ def setup_databases():
                 logging.warning(f"Изменения в шаблоне {template_name} не прошли валидацию")
         else:
             logging.info(f"Шаблон {template_name} без изменений")
+            template = result.get('template')
+            migration_file = template and migration_manager.get_last_migration_file(template.template_name)
+            if migration_file:
+                record_manifest(manifest, migration_manager, template_name, template,
+                                file_signature, migration_file)
+    
+    manifest.save()
+
+def record_manifest(manifest: StartupManifest, migration_manager: MigrationManager, template_name: str,
+                    template: TemplateConfig, file_signature, migration_file: Path):
+    """Записывает в манифест запуска состояние настроенного шаблона (по имени файла шаблона)"""
+    if file_signature is None:
+        return
+    manifest.record(
+        template_name, file_signature,
+        template_hash=migration_manager.calculate_template_hash(template),
+        template_version=template.template_version,
+        db_name=template.database.db_name,
+        migration=migration_file.name,
+    )
 
 def setup_ports() -> Dict[str, str]:
     """Настраивает порты и привязывает шаблоны"""
     port_manager = PortTemplateManager()
-    available_ports = [port.device for port in serial.tools.list_ports.comports()]
+    available_ports = serial.tools.list_ports.comports()
     
-    logging.info(f"Доступные порты: {available_ports}")
+    logging.info(f"Доступные порты: {[port.device for port in available_ports]}")
     
-    port_templates = {}
+    port_templates = port_manager.detect_port_templates(
+        available_ports,
+        deadline=SerialConfigs.detect_deadline(),
+        cache=PortMappingCache(SerialConfigs.port_cache())
+    )
     
-    for port_name in available_ports:
-        template_name = port_manager.auto_detect_port_template(port_name)
+    for port in available_ports:
+        template_name = port_templates.get(port.device)
         if template_name:
-            port_manager.assign_template_to_port(port_name, template_name)
-            port_templates[port_name] = template_name
-            logging.info(f"Порт {port_name} → Шаблон: {template_name}")
+            port_manager.assign_template_to_port(port.device, template_name)
+            logging.info(f"Порт {port.device} → Шаблон: {template_name}")
         else:
-            logging.warning(f"Не удалось определить шаблон для порта {port_name}")
+            logging.warning(f"Не удалось определить шаблон для порта {port.device}")
     
     return port_templates
 
@@ -76,22 +126,25 @@ async def process_port_data(port_name: str, template_name: str,
     """Обрабатывает данные с одного порта"""
     try:
         # Загружаем шаблон
+        # Шаблон берется из кэша, диск читается только при изменении файла
         template = template_manager.load_template(template_name)
-        logging.info(template)
         if not template:
             logging.error(f"Шаблон {template_name} не найден")
             return False
         
-        # Читаем данные из порта
-        raw_data = await async_read_with_handshake(port_name)
-        if not raw_data:
+        if template.parsing.format == 'binary':
+            return await process_port_frames(port_name, template, data_manager)
+        
+        # Читаем из порта все накопленные строки, каждая со временем приема
+        burst = await async_read_burst(port_name)
+        if not burst:
             logging.debug(f"Нет данных с порта {port_name}")
             return False
         
-        # Записываем в БД
-        success = data_manager.insert_sensor_data(template, port_name, raw_data)
+        # Записываем в БД одной пачкой
+        success = data_manager.insert_sensor_burst(template, port_name, burst)
         if success:
-            logging.info(f"Данные с порта {port_name} записаны в БД: {raw_data}")
+            logging.info(f"Строк с порта {port_name} принято к записи в БД: {len(burst)}")
         else:
             logging.warning(f"Не удалось записать данные с порта {port_name}")
         
@@ -101,38 +154,151 @@ async def process_port_data(port_name: str, template_name: str,
         logging.error(f"Ошибка обработки порта {port_name}: {e}")
         return False
 
-async def data_processing_loop(port_templates: Dict[str, str]):
-    """Основной цикл обработки данных"""
-    logging.info("Запуск цикла обработки данных...")
-    
-    data_manager = DataManager()
-    template_manager = TemplateManager()
+async def process_port_frames(port_name: str, template, data_manager: DataManager):
+    """Обрабатывает бинарные кадры с порта"""
+    frame_spec = data_manager.get_frame_spec(template)
+    frames = await async_read_frames(port_name, frame_spec)
+    if not frames:
+        logging.debug(f"Нет кадров с порта {port_name}")
+        return False
     
+    success = data_manager.insert_sensor_frames(template, port_name, frames)
+    if success:
+        logging.info(f"Кадров с порта {port_name} принято к записи в БД: {len(frames)}")
+    else:
+        logging.warning(f"Не удалось записать кадры с порта {port_name}")
+    return success
+
+async def poll_port(port_name: str, template_name: str,
+                    data_manager: DataManager,
+                    template_manager: TemplateManager,
+                    timeout: float) -> bool:
+    """Опрашивает один порт с таймаутом, изолируя его ошибки от остальных портов"""
+    # У каждого порта своя задача, поэтому контекст журнала не смешивается между портами
+    set_log_context(port=port_name, template=template_name)
+    started = time.perf_counter()
+    result = "error"
+    try:
+        success = await asyncio.wait_for(
+            process_port_data(port_name, template_name, data_manager, template_manager),
+            timeout
+        )
+        result = "ok" if success else "no_data"
+        return success
+    except asyncio.TimeoutError:
+        result = "timeout"
+        logging.warning(f"Таймаут опроса порта {port_name} ({timeout} с)")
+        return False
+    except Exception as e:
+        logging.error(f"Критическая ошибка обработки порта {port_name}: {e}")
+        return False
+    finally:
+        PORT_READS.inc(port=port_name, result=result)
+        POLL_DURATION.observe(time.perf_counter() - started, port=port_name)
+
+async def rollup_loop(template_names, template_manager: TemplateManager,
+                      rollup_engine: RollupEngine, interval: float):
+    """Фоново обновляет агрегаты и применяет сроки хранения сырых данных"""
     while True:
-        processed_count = 0
-        error_count = 0
-        
-        for port_name, template_name in port_templates.items():
+        await asyncio.sleep(interval)
+        for template_name in set(template_names):
+            template = template_manager.load_template(template_name)
+            if not template:
+                continue
             try:
-                success = await process_port_data(port_name, template_name, 
-                                                data_manager, template_manager)
-                if success:
-                    processed_count += 1
-                else:
-                    error_count += 1
-                    
+                # Долгие запросы к БД выполняются вне цикла событий
+                await asyncio.to_thread(rollup_engine.run_once, template)
             except Exception as e:
-                logging.error(f"Критическая ошибка обработки порта {port_name}: {e}")
-                error_count += 1
-        
-        # Логируем статистику
-        if processed_count > 0:
-            logging.info(f"Обработано портов: {processed_count}, ошибок: {error_count}")
-        else:
-            logging.debug("Нет данных для обработки")
-        
-        # Пауза между циклами
-        await asyncio.sleep(2)
+                logging.error(f"Ошибка обновления агрегатов {template_name}: {e}")
+
+async def data_processing_loop(port_templates: Dict[str, str], port_timeout: float = 15,
+                               data_manager: Optional[DataManager] = None,
+                               template_manager: Optional[TemplateManager] = None,
+                               poll_interval: float = 2):
+    """Основной цикл обработки данных: все порты опрашиваются параллельно"""
+    logging.info("Запуск цикла обработки данных...")
+    
+    # Пул по умолчанию ограничен min(32, cpu + 4) потоками: на шлюзе с многими портами
+    # потоковые чтения (Windows) шли бы волнами. Поток на каждый порт плюс запас
+    # для агрегатов и служебных вызовов цикла событий
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=len(port_templates) + 4, thread_name_prefix="port-io")
+    )
+    
+    data_manager = data_manager or DataManager()
+    template_manager = template_manager or TemplateManager()
+    rollup_task = asyncio.create_task(
+        rollup_loop(port_templates.values(), template_manager,
+                    RollupEngine(data_manager.db_manager), DatabaseConfigs.rollup_interval()),
+        name="rollup"
+    )
+    
+    try:
+        while True:
+            # Отдельная задача на каждый порт: медленный порт не задерживает остальные
+            tasks = [
+                asyncio.create_task(
+                    poll_port(port_name, template_name, data_manager, 
+                              template_manager, port_timeout),
+                    name=f"poll:{port_name}"
+                )
+                for port_name, template_name in port_templates.items()
+            ]
+            results = await asyncio.gather(*tasks)
+            
+            processed_count = sum(1 for success in results if success)
+            error_count = len(results) - processed_count
+            
+            # Логируем статистику
+            if processed_count > 0:
+                logging.info(f"Обработано портов: {processed_count}, ошибок: {error_count}")
+            else:
+                logging.debug("Нет данных для обработки")
+            
+            # Сбрасываем буфер записи по времени, даже если новых данных мало
+            data_manager.flush_if_due()
+            
+            # Пауза между циклами
+            await asyncio.sleep(poll_interval)
+    finally:
+        rollup_task.cancel()
+        data_manager.close()
+        await dispose_engines()
+
+def prepare_data_processing() -> Dict[str, str]:
+    """Настраивает БД и порты, возвращает привязку порт → шаблон"""
+    # 1. Настройка баз данных
+    logging.info("Проверка шаблонов и настройка БД...")
+    setup_databases()
+    
+    # 2. Настройка портов
+    logging.info("Настройка COM-портов...")
+    port_templates = setup_ports()
+
+    logging.info('Доступные шаблоны:')
+    temp_list = TemplateManager()
+    logging.info(temp_list.list_templates())
+    return port_templates
+
+def wait_for_ports() -> Dict[str, str]:
+    """Повторяет поиск портов с шаблонами, пока не найдется хотя бы один"""
+    interval = SerialConfigs.rescan_interval()
+    while True:
+        logging.warning(f"Не найдено активных портов с шаблонами, повторный поиск через {interval:.0f} с")
+        time.sleep(interval)
+        port_templates = setup_ports()
+        if port_templates:
+            return port_templates
+
+def start_metrics_publisher() -> Optional[SharedMetricsSnapshot]:
+    """Публикует метрики сбора данных в общую память для /metrics процессов API"""
+    try:
+        shared_metrics = SharedMetricsSnapshot.create()
+        shared_metrics.start_publishing(metrics)
+        return shared_metrics
+    except Exception as e:
+        logging.warning(f"Метрики сбора данных не будут видны процессам API: {e}")
+        return None
 
 def start_data_processing():
     """
@@ -140,19 +306,10 @@ def start_data_processing():
     """
     logger_init()
     logging.info("Запуск процесса обработки данных с COM-портов")
+    shared_metrics = None
     
     try:
-        # 1. Настройка баз данных
-        logging.info("Проверка шаблонов и настройка БД...")
-        setup_databases()
-        
-        # 2. Настройка портов
-        logging.info("Настройка COM-портов...")
-        port_templates = setup_ports()
-
-        logging.info('Доступные шаблоны:')
-        temp_list = TemplateManager()
-        logging.info(temp_list.list_templates())
+        port_templates = prepare_data_processing()
 
         if not port_templates:
             logging.warning("Не найдено активных портов с шаблонами")
@@ -160,6 +317,7 @@ def start_data_processing():
         
         # 3. Запуск основного цикла
         logging.info("Запуск основного цикла обработки данных...")
+        shared_metrics = start_metrics_publisher()
         asyncio.run(data_processing_loop(port_templates))
         
     except KeyboardInterrupt:
@@ -167,6 +325,9 @@ def start_data_processing():
     except Exception as e:
         logging.error(f"Критическая ошибка в процессе обработки данных: {e}")
     finally:
+        close_all_sessions()
+        if shared_metrics is not None:
+            shared_metrics.close()
         logging.info("Процесс обработки данных завершен")
 
 def start_starlette_server():
@@ -178,6 +339,7 @@ def start_starlette_server():
     
     try:
         # Импортируем здесь чтобы избежать циклических импортов
+        from contextlib import asynccontextmanager
         from starlette.applications import Starlette
         from starlette.routing import Route
         from starlette.responses import JSONResponse
@@ -185,7 +347,13 @@ def start_starlette_server():
         
         from web.routers import routes
         
-        app = Starlette(routes=routes)
+        @asynccontextmanager
+        async def lifespan(app):
+            yield
+            # Соединения с БД закрываются при остановке сервера
+            await dispose_engines()
+        
+        app = Starlette(routes=routes, lifespan=lifespan)
         
         # Запускаем сервер
         uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
@@ -197,6 +365,127 @@ def start_starlette_server():
     finally:
         logging.info("Starlette сервер завершен")
 
+async def serve_with_data_processing(port_templates: Dict[str, str]):
+    """Сервер и цикл сбора данных в одном цикле событий: API видит кэш последних значений"""
+    from starlette.applications import Starlette
+    import uvicorn
+    
+    from web.routers import routes
+    
+    config = uvicorn.Config(Starlette(routes=routes), host="0.0.0.0", port=8000, log_level="info")
+    server = uvicorn.Server(config)
+    data_task = asyncio.create_task(data_processing_loop(port_templates), name="data_processing")
+    try:
+        await server.serve()
+    finally:
+        data_task.cancel()
+        await asyncio.gather(data_task, return_exceptions=True)
+
+def start_all_in_one():
+    """
+    Запускает сбор данных и Starlette сервер в одном процессе
+    """
+    logger_init()
+    logging.info("Запуск сбора данных и Starlette сервера в одном процессе")
+    
+    try:
+        port_templates = prepare_data_processing()
+        if not port_templates:
+            logging.warning("Не найдено активных портов с шаблонами, запускается только API")
+        
+        asyncio.run(serve_with_data_processing(port_templates))
+        
+    except KeyboardInterrupt:
+        logging.info("Процесс остановлен пользователем")
+    except Exception as e:
+        logging.error(f"Критическая ошибка: {e}")
+    finally:
+        close_all_sessions()
+        logging.info("Процесс сбора данных и сервер завершены")
+
+def run_ingestion_worker(ring_name: str):
+    """
+    Рабочий процесс сбора данных: публикует показания в общий кольцевой буфер
+    """
+    logger_init()
+    ring = SharedRingBuffer.attach(ring_name)
+    reading_hub.add_sink(ring.write)
+    shared_metrics = None
+    
+    try:
+        # Без портов процесс не завершается: штатный выход супервизор перезапускал бы по кругу
+        port_templates = prepare_data_processing() or wait_for_ports()
+        shared_metrics = start_metrics_publisher()
+        asyncio.run(data_processing_loop(port_templates))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_all_sessions()
+        if shared_metrics is not None:
+            shared_metrics.close()
+        ring.close()
+
+def run_api_worker(ring_name: str, sock):
+    """
+    Рабочий процесс API: общий слушающий сокет, живые данные из кольцевого буфера
+    """
+    logger_init()
+    from contextlib import asynccontextmanager
+    from starlette.applications import Starlette
+    import uvicorn
+    
+    from web.routers import routes
+    
+    ring = SharedRingBuffer.attach(ring_name)
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        follower = asyncio.create_task(follow_ring(ring, latest_values, reading_hub))
+        try:
+            yield
+        finally:
+            follower.cancel()
+            await dispose_engines()
+    
+    server = uvicorn.Server(uvicorn.Config(Starlette(routes=routes, lifespan=lifespan),
+                                           log_level="info"))
+    try:
+        server.run(sockets=[sock])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+def start_supervisor(api_workers: int = 2, host: str = "0.0.0.0", port: int = 8000):
+    """
+    Запускает процесс сбора данных и api_workers процессов API под супервизором.
+    Упавшие процессы перезапускаются, показания передаются через общую память
+    """
+    import socket
+    
+    logger_init()
+    logging.info(f"Запуск супервизора: сбор данных + {api_workers} процесс(ов) API на {host}:{port}")
+    
+    ring = SharedRingBuffer.create()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    
+    supervisor = ProcessSupervisor()
+    supervisor.add("ingestion", run_ingestion_worker, ring.name)
+    for number in range(api_workers):
+        supervisor.add(f"api-{number + 1}", run_api_worker, ring.name, sock)
+    
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        logging.info("Супервизор остановлен пользователем")
+    finally:
+        sock.close()
+        ring.close()
+        logging.info("Все рабочие процессы остановлены")
+
 def run_in_new_console(script_path, *args):
     """
     Запускает скрипт в новой консоли
@@ -219,7 +508,7 @@ def show_menu():
     print("=" * 50)
     print("1. Запуск обработки данных с COM-портов")
     print("2. Запуск Starlette сервера")
-    print("3. Запуск обоих процессов (в разных консолях)")
+    print("3. Запуск обоих процессов (под супервизором)")
     print("4. Выход")
     print("=" * 50)
     
@@ -252,20 +541,8 @@ def main():
             start_starlette_server()
             
         elif choice == '3':
-            print("Запуск обоих процессов в разных консолях...")
-            
-            # Получаем путь к текущему скрипту
-            current_script = os.path.abspath(__file__)
-            
-            # Запускаем обработку данных в новой консоли
-            run_in_new_console(current_script, "--mode", "data")
-            
-            # Запускаем сервер в новой консоли
-            run_in_new_console(current_script, "--mode", "server")
-            
-            print("Оба процесса запущены в отдельных консолях")
-            print("Нажмите Enter чтобы вернуться в меню...")
-            input()
+            print("Запуск обоих процессов под супервизором (Ctrl+C для остановки)...")
+            start_supervisor()
             
         elif choice == '4':
             print("Выход из программы")
@@ -278,8 +555,10 @@ if __name__ == "__main__":
     # Если есть аргументы командной строки
     if len(sys.argv) > 1:
         parser = argparse.ArgumentParser(description="Sensor Data Processing System")
-        parser.add_argument('--mode', choices=['data', 'server', 'menu'], 
+        parser.add_argument('--mode', choices=['data', 'server', 'all', 'supervisor', 'menu'], 
                            default='menu', help='Режим работы')
+        parser.add_argument('--workers', type=int, default=2,
+                           help='Число процессов API в режиме supervisor')
         
         args = parser.parse_args()
         
@@ -287,6 +566,10 @@ if __name__ == "__main__":
             start_data_processing()
         elif args.mode == 'server':
             start_starlette_server()
+        elif args.mode == 'all':
+            start_all_in_one()
+        elif args.mode == 'supervisor':
+            start_supervisor(api_workers=args.workers)
         else:
             main()
     else:
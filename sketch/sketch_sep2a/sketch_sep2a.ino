@@ -11,6 +11,10 @@ const String HANDSHAKE_RESPONSE = "HANDSHAKE_ACK";
 
 bool connectionActive = false;
 
+// 1 - данные отправляются бинарными кадрами (в шаблоне parsing.format: binary), 0 - текстом
+#define BINARY_FRAMES 0
+const uint8_t FRAME_SYNC[] = {0xAA, 0x55};
+
 void setup() {
   Serial.begin(115200);
   
@@ -92,7 +96,40 @@ void loop() {
   }
 }
 
+// CRC-16/CCITT-FALSE, как binascii.crc_hqx(data, 0xFFFF) на стороне шлюза
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Кадр: AA 55 | длина | float32 x4 (little-endian) | CRC16 (little-endian) по длине и данным
+void sendSensorFrame() {
+  float values[4] = {
+    bme.readTemperature(), bme.readPressure(),
+    bme1.readTemperature(), bme1.readPressure()
+  };
+  uint8_t body[1 + sizeof(values)];
+  body[0] = sizeof(values);
+  memcpy(body + 1, values, sizeof(values));
+  uint16_t crc = crc16(body, sizeof(body));
+
+  Serial.write(FRAME_SYNC, sizeof(FRAME_SYNC));
+  Serial.write(body, sizeof(body));
+  Serial.write((uint8_t)(crc & 0xFF));
+  Serial.write((uint8_t)(crc >> 8));
+}
+
 void sendSensorData() {
+#if BINARY_FRAMES
+  sendSensorFrame();
+  return;
+#endif
   String data76 = "Sensor:0x76;Temperature:" + String(bme.readTemperature(), 2) + 
                  ";Pressure:" + String(bme.readPressure(), 2) + ";";
   String data77 = "Sensor:0x77;Temperature:" + String(bme1.readTemperature(), 2) + 
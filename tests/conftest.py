@@ -0,0 +1,17 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from core.parser.template_manager import TemplateConfig
+
+TEMPLATE_FILE = Path(__file__).resolve().parent.parent / "templates" / "indoor_sensor.yaml"
+
+
+@pytest.fixture
+def load_template():
+    """Фабрика свежих копий шаблона indoor_sensor.yaml"""
+    def load() -> TemplateConfig:
+        with open(TEMPLATE_FILE, 'r', encoding='utf-8') as f:
+            return TemplateConfig(**yaml.safe_load(f))
+    return load
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from core.database.db_manager import DatabaseManager
+from core.database.rollup import RollupEngine
+
+
+def insert_rows(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO indoor_sensor (timestamp, sensor_id, temperature) "
+                          "VALUES (:timestamp, '0x76', :temperature)"), rows)
+
+
+def test_rollup_aggregates_include_rows_after_last_pass(tmp_path, load_template):
+    template = load_template()
+    template.template_name = 'rollup_test'
+    template.retention.rollups = ['1m']
+    db_manager = DatabaseManager(tmp_path)
+    assert db_manager.create_database(template)
+    engine = db_manager.get_engine(template.template_name)
+
+    insert_rows(engine, [{'timestamp': '2026-01-01 10:00:10.000000', 'temperature': 10.0},
+                         {'timestamp': '2026-01-01 10:00:20.000000', 'temperature': 20.0}])
+    RollupEngine(db_manager).run_once(template)
+    # Строки после прохода RollupEngine: в тот же интервал и в новый
+    insert_rows(engine, [{'timestamp': '2026-01-01 10:00:30.000000', 'temperature': 30.0},
+                         {'timestamp': '2026-01-01 10:01:05.000000', 'temperature': 5.0}])
+
+    buckets = db_manager.aggregate_table_data(template.template_name, 'indoor_sensor', 60, ['temperature'],
+                                              date_from=datetime(2026, 1, 1, 10))
+    raw = db_manager.aggregate_table_data(template.template_name, 'indoor_sensor', 60, ['temperature'],
+                                          date_from=datetime(2026, 1, 1, 10), use_rollups=False)
+
+    assert buckets == raw
+    assert [(item['bucket'], item['count'], item['temperature']) for item in buckets] == [
+        ('2026-01-01 10:00:00', 3, {'min': 10.0, 'max': 30.0, 'avg': 20.0}),
+        ('2026-01-01 10:01:00', 1, {'min': 5.0, 'max': 5.0, 'avg': 5.0}),
+    ]
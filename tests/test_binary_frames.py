@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from core.parser.template_manager import BinaryFrameConfig
+from core.utils.parsing import compile_template
+
+
+def test_parse_frames_keeps_each_frame_receive_time(load_template):
+    template = load_template()
+    template.parsing.format = 'binary'
+    template.parsing.binary = BinaryFrameConfig(sensors={'0x76': 'ff', '0x77': 'ff'})
+    compiled = compile_template(template)
+
+    first, second = datetime(2026, 1, 1, 10, 0, 0), datetime(2026, 1, 1, 10, 0, 5)
+    frames = [(first, compiled.frame.payload.pack(1.0, 2.0, 3.0, 4.0)),
+              (second, compiled.frame.payload.pack(5.0, 6.0, 7.0, 8.0))]
+    rows = compiled.parse_frames(frames, 'COM1')
+
+    assert [(sensor.sensor_id, row[0]) for sensor, row in rows] == [
+        ('0x76', '2026-01-01 10:00:00.000000'), ('0x77', '2026-01-01 10:00:00.000000'),
+        ('0x76', '2026-01-01 10:00:05.000000'), ('0x77', '2026-01-01 10:00:05.000000'),
+    ]
+    assert rows[2][1][3:5] == (5.0, 6.0)
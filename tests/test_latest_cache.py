@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+from core.live.hub import ReadingHub
+from core.live.latest_cache import LatestValueCache
+from core.live.ring_buffer import SharedRingBuffer, follow_ring
+
+
+def test_ring_warmup_keeps_ingestion_receive_time():
+    ring = SharedRingBuffer.create(capacity=8, slot_size=512)
+    try:
+        ring.write({'template_name': 't', 'sensor_id': 's', 'port_name': 'p',
+                    'timestamp': '2026-01-01 10:00:00', 'received_at': time.time() - 3600,
+                    'values': {'value': 1}})
+        cache = LatestValueCache(stale_after=10)
+
+        async def warm_up():
+            follower = asyncio.create_task(follow_ring(ring, cache, ReadingHub(), interval=0.01))
+            await asyncio.sleep(0.05)
+            follower.cancel()
+
+        asyncio.run(warm_up())
+        [reading] = cache.snapshot()
+        assert reading['stale'] is True
+        assert reading['age'] >= 3600
+    finally:
+        ring.close()
@@ -0,0 +1,32 @@
+import shutil
+from pathlib import Path
+
+from core.database.migration_manager import MigrationManager
+from core.parser.template_manager import TemplateManager
+
+TEMPLATE_FILE = Path(__file__).resolve().parent.parent / "templates" / "indoor_sensor.yaml"
+
+
+def test_validate_changes_detects_renamed_table(tmp_path, load_template):
+    old_template = load_template()
+    template = load_template()
+    template.sensors[0].table_name = 'indoor_climate'
+
+    changes = MigrationManager(tmp_path).validate_changes(template, old_template)
+
+    assert changes == [{'type': 'rename_table', 'old_name': 'indoor_sensor', 'table_name': 'indoor_climate'}]
+
+
+def test_check_template_changes_finds_migrations_by_template_name(tmp_path):
+    # Имя файла шаблона (indoor_sensor) отличается от template_name (weather_station)
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    shutil.copy(TEMPLATE_FILE, templates_dir)
+    manager = MigrationManager(tmp_path / "migrations")
+    manager.template_manager = TemplateManager(templates_dir)
+
+    first = manager.check_template_changes('indoor_sensor')
+    assert first['action'] == 'create'
+    manager.create_migration(first['template'], [], first['action'])
+
+    assert manager.check_template_changes('indoor_sensor')['has_changes'] is False
@@ -0,0 +1,70 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, create_engine, inspect, text
+
+from core.database.schema_migrator import SchemaMigrator
+
+
+def sensor_table(metadata: MetaData, value_type, name: str = 'sensor') -> Table:
+    return Table(
+        name, metadata,
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('timestamp', DateTime),
+        Column('sensor_id', String(50)),
+        Column('value', value_type),
+    )
+
+
+class InsertBeforeSwap(SchemaMigrator):
+    """Имитирует запись шлюза между последней пачкой копирования и заменой таблицы"""
+
+    def _swap_table(self, table, temp_name, column_list):
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO sensor (sensor_id, value) VALUES ('late', '2')"))
+        super()._swap_table(table, temp_name, column_list)
+
+
+def test_rebuild_keeps_rows_inserted_before_swap(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    sensor_table(MetaData(), String(255)).metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensor (sensor_id, value) VALUES ('first', '1')"))
+
+    InsertBeforeSwap(engine, batch_size=50000).rebuild_table(sensor_table(MetaData(), Float))
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, sensor_id, typeof(value) FROM sensor ORDER BY id")).fetchall()
+    assert [tuple(row) for row in rows] == [(1, 'first', 'real'), (2, 'late', 'real')]
+
+
+def test_rebuild_copies_all_batches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    sensor_table(MetaData(), String(255)).metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensor (sensor_id, value) VALUES ('s', :value)"),
+                     [{'value': str(i)} for i in range(25)])
+
+    SchemaMigrator(engine, batch_size=10).rebuild_table(sensor_table(MetaData(), Float))
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*), sum(value) FROM sensor")).fetchone() == (25, 300.0)
+
+
+def test_rename_replaces_empty_table_and_renames_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    old_table = sensor_table(MetaData(), Float)
+    Index('ix_sensor_timestamp_id', old_table.c.timestamp, old_table.c.id)
+    old_table.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO sensor (sensor_id, value) VALUES ('s', 1.5)"))
+
+    new_table = sensor_table(MetaData(), Float, name='renamed')
+    Index('ix_renamed_timestamp_id', new_table.c.timestamp, new_table.c.id)
+    # Пустая таблица с новым именем, как после create_all до миграции
+    new_table.metadata.create_all(engine)
+
+    SchemaMigrator(engine).rename_table('sensor', new_table)
+
+    inspector = inspect(engine)
+    assert not inspector.has_table('sensor')
+    assert [index['name'] for index in inspector.get_indexes('renamed')] == ['ix_renamed_timestamp_id']
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, sensor_id, value FROM renamed")).fetchall() == [(1, 's', 1.5)]
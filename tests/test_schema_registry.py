@@ -0,0 +1,27 @@
+import sqlite3
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_engine
+
+from core.database.schema_registry import SchemaRegistry
+
+
+def test_registry_sees_schema_changes_from_other_connections(tmp_path):
+    db_path = tmp_path / 'test.db'
+    engine = create_engine(f"sqlite:///{db_path}")
+    metadata = MetaData()
+    Table('sensor', metadata, Column('id', Integer, primary_key=True), Column('value', Float))
+    metadata.create_all(engine)
+
+    registry = SchemaRegistry()
+    assert list(registry.get_table('t', 'sensor', engine).c.keys()) == ['id', 'value']
+    assert registry.get_table('t', 'new_sensor', engine) is None
+
+    # Миграция в другом процессе
+    conn = sqlite3.connect(db_path)
+    conn.execute("ALTER TABLE sensor ADD COLUMN lux REAL")
+    conn.execute("CREATE TABLE new_sensor (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+
+    assert list(registry.get_table('t', 'sensor', engine).c.keys()) == ['id', 'value', 'lux']
+    assert registry.get_table('t', 'new_sensor', engine) is not None
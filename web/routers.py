@@ -1,4 +1,4 @@
-from starlette.routing import Route
+from starlette.routing import Route, WebSocketRoute
 
 from core.parser.template_manager import TemplateManager
 from core.serial.port_manager import PortTemplateManager
@@ -12,6 +12,19 @@ from web.views.get_tables import (
     create_get_tables,
     create_get_table_data,
 )
+from web.views.export_table import create_export_table_data
+from web.views.aggregate_table import create_aggregate_table_data
+from web.views.get_latest import create_get_latest
+from web.views.live_readings import create_readings_ws, create_readings_sse
+from web.views.metrics import create_metrics
+from web.views.get_logs import create_get_logs
+from core.live.latest_cache import latest_values
+from core.live.hub import reading_hub
+from core.utils.metrics import metrics
+from core.live.shared_metrics import SharedMetricsReader
+from core.logger.logger import LoggerConfigs
+from core.logger.info_sender import LogReader
+from core.utils.lazy import LazyObject
 # from views.health_check import health_check
 
 # from .get_templates import create_get_templates
@@ -19,10 +32,11 @@ from web.views.get_tables import (
 # from .root import create_root
 # from .health_check import create_health_check
 
-# Создаем экземпляры менеджеров
-template_manager = TemplateManager()
-port_manager = PortTemplateManager()
-db_manager = DatabaseManager()
+# Менеджеры создаются при первом запросе, а не при импорте: старт API не ждет БД и шаблоны
+template_manager = LazyObject(TemplateManager)
+port_manager = LazyObject(PortTemplateManager)
+db_manager = LazyObject(DatabaseManager)
+log_reader = LazyObject(lambda: LogReader(LoggerConfigs.db_file())) if LoggerConfigs.db_file() else None
 
 def create_views(template_manager, port_manager):
     return {
@@ -32,6 +46,13 @@ def create_views(template_manager, port_manager):
         "get_table_details":create_get_table_details(db_manager),
         "get_tables":create_get_tables(db_manager),
         "get_table_data": create_get_table_data(db_manager),
+        "export_table_data": create_export_table_data(db_manager),
+        "aggregate_table_data": create_aggregate_table_data(db_manager),
+        "get_latest": create_get_latest(latest_values),
+        "readings_ws": create_readings_ws(reading_hub),
+        "readings_sse": create_readings_sse(reading_hub),
+        "metrics": create_metrics(metrics, SharedMetricsReader()),
+        "get_logs": create_get_logs(log_reader),
     }
 
 
@@ -43,11 +64,24 @@ routes = [
     # Route("/health", views["health_check"]),
     Route("/templates", views["get_templates"]),
     Route("/ports", views["get_ports"]),
+    Route("/latest", views["get_latest"]),
+    WebSocketRoute("/ws", views["readings_ws"]),
+    Route("/sse", views["readings_sse"]),
+    Route("/metrics", views["metrics"]),
+    Route("/logs", views["get_logs"]),
     Route("/get_tables", views['get_tables']),
     Route(
         '/get_table_details/{table_name}/{template_name}', 
         views['get_table_details']
         ),
+    Route(
+        '/export/{table_name}/{template_name}',
+        views['export_table_data']
+        ),
+    Route(
+        '/aggregate/{table_name}/{template_name}',
+        views['aggregate_table_data']
+        ),
     Route(
         "/{table_name}/{template_name}",  
           views['get_table_data']
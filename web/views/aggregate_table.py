@@ -0,0 +1,47 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from core.utils.parsing import parse_interval
+from web.views.get_tables import parse_datetime
+
+
+def create_aggregate_table_data(db_manager):
+    async def aggregate_table_data(request):
+        """
+        Агрегаты таблицы по интервалам времени.
+        Параметры: bucket (60, 5m, 1h, 1d), from, to (ISO-время), fields (через запятую), sensor_id
+        """
+        try:
+            template_name = request.path_params.get('template_name')
+            table_name = request.path_params.get('table_name')
+            params = request.query_params
+            
+            try:
+                bucket_seconds = parse_interval(params.get('bucket', '1m'))
+                fields = [f.strip() for f in params.get('fields', '').split(',') if f.strip()]
+                # Запрос к SQLite блокирующий - выполняем вне цикла событий
+                buckets = await run_in_threadpool(
+                    db_manager.aggregate_table_data,
+                    template_name, table_name,
+                    bucket_seconds=bucket_seconds,
+                    fields=fields or None,
+                    date_from=parse_datetime(params.get('from')),
+                    date_to=parse_datetime(params.get('to')),
+                    sensor_id=params.get('sensor_id'),
+                )
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            
+            if buckets is None:
+                return JSONResponse({"error": f"Table {table_name} not found"}, status_code=404)
+            
+            return JSONResponse({
+                "template_name": template_name,
+                "table_name": table_name,
+                "bucket_seconds": bucket_seconds,
+                "buckets": buckets,
+                "count": len(buckets)
+            })
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+    return aggregate_table_data
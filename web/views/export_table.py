@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+
+from starlette.responses import JSONResponse, StreamingResponse
+
+from web.views.get_tables import parse_datetime
+
+
+def _to_json_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_chunks(columns, row_chunks):
+    for rows in row_chunks:
+        lines = [
+            json.dumps(dict(zip(columns, map(_to_json_value, row))), ensure_ascii=False)
+            for row in rows
+        ]
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def _csv_chunks(columns, row_chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for rows in row_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([map(_to_json_value, row) for row in rows])
+        yield buffer.getvalue().encode('utf-8')
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', _ndjson_chunks),
+    'csv': ('text/csv; charset=utf-8', _csv_chunks),
+}
+
+
+def create_export_table_data(db_manager, chunk_size: int = 1000):
+    async def export_table_data(request):
+        """
+        Потоковая выгрузка таблицы в NDJSON или CSV.
+        Параметры: format (ndjson|csv), from, to (ISO-время), sensor_id
+        """
+        template_name = request.path_params.get('template_name')
+        table_name = request.path_params.get('table_name')
+        params = request.query_params
+        
+        export_format = params.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return JSONResponse({"error": f"Unsupported format: {export_format}"}, status_code=400)
+        try:
+            date_from = parse_datetime(params.get('from'))
+            date_to = parse_datetime(params.get('to'))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        
+        table = db_manager.get_table(template_name, table_name)
+        if table is None:
+            return JSONResponse({"error": f"Table {table_name} not found"}, status_code=404)
+        
+        media_type, encode = EXPORT_FORMATS[export_format]
+        row_chunks = db_manager.iter_table_rows(
+            template_name, table_name,
+            date_from=date_from,
+            date_to=date_to,
+            sensor_id=params.get('sensor_id'),
+            chunk_size=chunk_size,
+        )
+        filename = f"{template_name}_{table_name}.{export_format}"
+        return StreamingResponse(
+            encode(list(table.c.keys()), row_chunks),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    return export_table_data
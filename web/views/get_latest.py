@@ -0,0 +1,22 @@
+from starlette.responses import JSONResponse
+
+
+def create_get_latest(latest_values):
+    async def get_latest(request):
+        """
+        Последние значения датчиков из памяти процесса сбора данных.
+        Параметры: template, sensor_id, stale_after (секунды)
+        """
+        params = request.query_params
+        try:
+            stale_after = float(params['stale_after']) if 'stale_after' in params else None
+        except ValueError:
+            return JSONResponse({"error": "stale_after must be a number"}, status_code=400)
+        
+        readings = latest_values.snapshot(
+            template_name=params.get('template'),
+            sensor_id=params.get('sensor_id'),
+            stale_after=stale_after,
+        )
+        return JSONResponse({"readings": readings, "count": len(readings)})
+    return get_latest
@@ -0,0 +1,43 @@
+from starlette.responses import JSONResponse
+
+from core.logger.info_sender import parse_level
+from web.views.get_tables import parse_datetime
+
+
+def create_get_logs(log_reader, default_limit: int = 100, max_limit: int = 1000):
+    async def get_logs(request):
+        """
+        Поиск по журналу шлюза, от новых записей к старым.
+        Параметры: level (минимальный), module, port, template, q (подстрока сообщения),
+        from, to (ISO-время), limit, cursor (токен next_cursor)
+        """
+        if log_reader is None:
+            return JSONResponse({"error": "Журнал в БД отключен (logging.db в configs.yaml)"}, status_code=404)
+
+        params = request.query_params
+        try:
+            limit = min(int(params.get('limit', default_limit)), max_limit)
+            if limit <= 0:
+                raise ValueError("limit должен быть положительным")
+            page = log_reader.query(
+                level=parse_level(params.get('level')),
+                module=params.get('module'),
+                port=params.get('port'),
+                template=params.get('template'),
+                search=params.get('q'),
+                date_from=parse_datetime(params.get('from')),
+                date_to=parse_datetime(params.get('to')),
+                limit=limit,
+                cursor=params.get('cursor'),
+            )
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        return JSONResponse({
+            "data": page['data'],
+            "count": len(page['data']),
+            "next_cursor": page['next_cursor']
+        })
+    return get_logs
@@ -1,8 +1,9 @@
 from starlette.responses import JSONResponse
-import serial
 
 def get_all_devices_ports():
     """Возвращает список всех доступных COM-портов"""
+    import serial.tools.list_ports
+    
     ports = list(serial.tools.list_ports.comports())
     port_list = [p.device for p in ports]
     # logging.debug(f"Доступные порты: {port_list}")
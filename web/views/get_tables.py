@@ -1,12 +1,16 @@
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
 
 from sqlalchemy import create_engine, MetaData, Table, select, inspect
-from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, Integer, String, Float, DateTime
+from datetime import datetime
+from typing import Optional
 
 
 def get_all_table_data_orm(self, template_name: str, table_name: str):
     """Возвращает все данные из таблицы с использованием ORM"""
+    from sqlalchemy.orm import sessionmaker, declarative_base
+    
     try:
         engine = self.get_engine(template_name)
         if not engine:
@@ -55,7 +59,7 @@ def create_get_tables(db_manager):
     async def get_tables(request):
         """Возвращает список всех таблиц во всех базах данных"""
         try:
-            tables_info = db_manager.get_all_databases_info()
+            tables_info = await run_in_threadpool(db_manager.get_all_databases_info)
             
             return JSONResponse({"databases": tables_info})
         except Exception as e:
@@ -72,15 +76,24 @@ def create_get_table_details(db_manager):
             if not template_name or not table_name:
                 return JSONResponse({"error": "Template name and table name are required"}, status_code=400)
             
-            table_info = db_manager.get_table_info(template_name, table_name)
+            table_info = await run_in_threadpool(db_manager.get_table_info, template_name, table_name)
             return JSONResponse(table_info)
         except Exception as e:
             return JSONResponse({"error": str(e)}, status_code=500)
     return get_table_details
 
-def create_get_table_data(db_manager):
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Разбирает ISO-дату из параметра запроса"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+def create_get_table_data(db_manager, default_limit: int = 100, max_limit: int = 1000):
     async def get_table_data(request):
-        """Возвращает все данные из таблицы"""
+        """
+        Возвращает страницу данных таблицы.
+        Параметры: from, to (ISO-время), sensor_id, limit, cursor (токен next_cursor)
+        """
         try:
             template_name = request.path_params.get('template_name')
             table_name = request.path_params.get('table_name')
@@ -88,13 +101,37 @@ def create_get_table_data(db_manager):
             if not template_name or not table_name:
                 return JSONResponse({"error": "Template name and table name are required"}, status_code=400)
             
-            table_data = db_manager.get_all_table_data_orm(template_name=template_name, table_name=table_name)
+            params = request.query_params
+            try:
+                date_from = parse_datetime(params.get('from'))
+                date_to = parse_datetime(params.get('to'))
+                limit = min(int(params.get('limit', default_limit)), max_limit)
+                if limit <= 0:
+                    raise ValueError("limit должен быть положительным")
+                # Запрос к SQLite блокирующий - выполняем вне цикла событий
+                page = await run_in_threadpool(
+                    db_manager.get_table_data_page,
+                    template_name=template_name,
+                    table_name=table_name,
+                    date_from=date_from,
+                    date_to=date_to,
+                    sensor_id=params.get('sensor_id'),
+                    limit=limit,
+                    cursor=params.get('cursor'),
+                )
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            
+            if page is None:
+                return JSONResponse({"error": f"Table {table_name} not found"}, status_code=404)
+            
             return JSONResponse({
                 "template_name": template_name,
                 "table_name": table_name,
-                "data": table_data,
-                "count": len(table_data)
+                "data": page['data'],
+                "count": len(page['data']),
+                "next_cursor": page['next_cursor']
             })
         except Exception as e:
             return JSONResponse({"error": str(e)}, status_code=500)
-    return get_table_data
\ No newline at end of file
+    return get_table_data
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from starlette.responses import StreamingResponse
+from starlette.websockets import WebSocketDisconnect
+
+
+def _subscribe(hub, params):
+    return hub.subscribe(template_name=params.get('template'),
+                         sensor_id=params.get('sensor_id'))
+
+
+def create_readings_ws(hub):
+    async def readings_ws(websocket):
+        """
+        WebSocket с новыми показаниями датчиков.
+        Параметры: template, sensor_id
+        """
+        await websocket.accept()
+        subscription = _subscribe(hub, websocket.query_params)
+
+        async def wait_disconnect():
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+
+        disconnected = asyncio.create_task(wait_disconnect())
+        try:
+            while True:
+                reading = asyncio.create_task(subscription.get())
+                done, _ = await asyncio.wait({reading, disconnected},
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    reading.cancel()
+                    break
+                await websocket.send_json(reading.result())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            disconnected.cancel()
+            hub.unsubscribe(subscription)
+    return readings_ws
+
+
+def create_readings_sse(hub, keepalive: float = 15.0):
+    async def readings_sse(request):
+        """
+        Server-Sent Events с новыми показаниями датчиков.
+        Параметры: template, sensor_id
+        """
+        subscription = _subscribe(hub, request.query_params)
+
+        async def events():
+            try:
+                while not await request.is_disconnected():
+                    reading = await subscription.get(keepalive)
+                    if reading is None:
+                        # Комментарий, чтобы прокси не закрыли простаивающее соединение
+                        yield ": keepalive\n\n"
+                        continue
+                    yield f"event: reading\ndata: {json.dumps(reading, ensure_ascii=False)}\n\n"
+            finally:
+                hub.unsubscribe(subscription)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+    return readings_sse
@@ -0,0 +1,13 @@
+from starlette.responses import PlainTextResponse
+
+
+def create_metrics(registry, shared_metrics=None):
+    async def get_metrics(request):
+        """
+        Метрики в текстовом формате Prometheus: свои метрики процесса
+        и снимок метрик процесса сбора данных из общей памяти, если он запущен отдельно
+        """
+        external = shared_metrics.read() if shared_metrics is not None else None
+        return PlainTextResponse(registry.render(external),
+                                 media_type="text/plain; version=0.0.4; charset=utf-8")
+    return get_metrics